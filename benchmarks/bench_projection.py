@@ -0,0 +1,104 @@
+# benchmarks/bench_projection.py
+# Compare full json.loads decoding with storage.json_store.project_snapshot()
+# on a synthetic snapshots file shaped like the ones `crypto track` writes.
+#
+#   python benchmarks/bench_projection.py --lines 2000000
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import json_store as js  # noqa: E402
+
+COINS = ["bitcoin", "ethereum", "cardano", "solana", "dogecoin"]
+
+
+def _snapshot(i: int, rnd: random.Random, start: datetime) -> dict:
+    prices = {c: rnd.uniform(0.1, 70000.0) for c in COINS}
+    positions = []
+    for c in COINS:
+        qty = rnd.uniform(0.1, 10.0)
+        value = qty * prices[c]
+        positions.append(
+            {
+                "symbol": c[:3].upper(),
+                "price": prices[c],
+                "value": value,
+                "pnl": value * 0.1,
+                "pnl_pct": 10.0,
+            }
+        )
+    return {
+        "ts": (start + timedelta(minutes=10 * i)).isoformat(),
+        "prices": prices,
+        "total_value": sum(p["value"] for p in positions),
+        "positions": positions,
+        "vs_currency": "usd",
+    }
+
+
+def generate(path: str, lines: int, ordered: bool) -> None:
+    rnd = random.Random(42)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(lines):
+            obj = _snapshot(i, rnd, start)
+            if ordered:
+                obj = js._ordered_snapshot(obj)
+            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+
+def _scan(path: str, decode) -> tuple[float, float]:
+    total = 0.0
+    t0 = time.perf_counter()
+    with open(path, "rb") as f:
+        for raw in f:
+            row = decode(raw)
+            if row is not None:
+                total += float(row.get("total_value", 0.0))
+    return time.perf_counter() - t0, total
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark field-projection snapshot decoding")
+    ap.add_argument("--lines", type=int, default=2_000_000)
+    ap.add_argument("--keep", action="store_true", help="Keep the generated files")
+    args = ap.parse_args()
+
+    fields = ("ts", "total_value")
+    tmp = tempfile.mkdtemp(prefix="bench-projection-")
+    ordered = os.path.join(tmp, "ordered.jsonl")
+    legacy = os.path.join(tmp, "legacy.jsonl")
+    generate(ordered, args.lines, ordered=True)
+    generate(legacy, args.lines, ordered=False)
+    size_mb = os.path.getsize(ordered) / (1024 * 1024)
+    print(f"{args.lines:,} lines, {size_mb:,.1f} MB per file")
+
+    runs = [
+        ("json.loads (current)", ordered, json.loads),
+        ("projection, head-first layout", ordered, lambda raw: js.project_snapshot(raw, fields)),
+        ("projection, legacy layout", legacy, lambda raw: js.project_snapshot(raw, fields)),
+    ]
+    baseline = None
+    for label, path, decode in runs:
+        secs, checksum = _scan(path, decode)
+        baseline = baseline or secs
+        print(
+            f"{label:<32} {secs:8.2f} s  {args.lines / secs:>12,.0f} lines/s  "
+            f"x{baseline / secs:5.2f}  (sum={checksum:.6e})"
+        )
+
+    if not args.keep:
+        for path in (ordered, legacy):
+            os.remove(path)
+        os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+# benchmarks/bench_store.py
+# Time the snapshot and rollup store on generated histories (benchmarks/datagen.py)
+# of several sizes, write the results as JSON, and flag regressions against a
+# stored baseline as well as scaling cliffs between sizes.
+#
+#   python benchmarks/bench_store.py --rows 10k,1m --out bench.json
+#   python benchmarks/bench_store.py --rows 10k,1m --save-baseline
+#   python benchmarks/bench_store.py --rows 10k,1m
+#
+# Timings depend on the machine, so no baseline is committed: record one with
+# --save-baseline (written to benchmarks/baseline.json unless a path is given)
+# on the machine that runs the comparison, e.g. from the last release's tree,
+# and keep it there. Later runs compare against benchmarks/baseline.json when
+# it exists, or against --baseline PATH; without one only cliffs are checked.
+#
+# Generated histories are kept in --data-dir (reset to their generated state
+# after each run), so large sizes are only written once. Exits with status 1
+# when a regression or a cliff is found.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli  # noqa: E402
+from benchmarks import datagen  # noqa: E402
+from core import portfolio  # noqa: E402
+from storage import json_store as js  # noqa: E402
+
+_KEEP = {"snapshots.jsonl", "portfolio.json", "config.json", "snapshot_portfolios.jsonl", "meta"}
+
+# name -> expected growth with history size: "1" (flat) or "n" (linear)
+COMPLEXITY = {
+    "read_last_snapshots": "1",
+    "rebuild_daily_rollups": "n",
+    "read_daily_all": "n",
+    "cmd_stats": "1",
+    "cmd_export": "1",
+    "upsert_daily_from_snapshot": "1",
+    "guarded_append_snapshot_line": "1",
+}
+
+
+def _redirect(home: str) -> None:
+    """Point storage (and the portfolio module) at `home`, as the tests do."""
+    js.HOME_DIR = home
+    for name, file in (
+        ("CACHE_PATH", "cache.json"),
+        ("SNAPSHOTS_PATH", "snapshots.jsonl"),
+        ("CONFIG_PATH", "config.json"),
+        ("PORTFOLIO_PATH", "portfolio.json"),
+        ("ALERTS_PATH", "alerts.json"),
+        ("SNAPSHOTS_DAY_PATH", "snapshots_day.jsonl"),
+        ("SNAPSHOTS_BAD_PATH", "snapshots_bad.jsonl"),
+    ):
+        setattr(js, name, os.path.join(home, file))
+    portfolio.PORTFOLIO_PATH = js.PORTFOLIO_PATH
+    js._backend_cache.clear()
+
+
+def _prepare(data_dir: str, rows: int, coins: int, seed: int) -> dict:
+    """Generate (or reuse) the history for one size; returns its meta."""
+    home = os.path.join(data_dir, f"{rows}-rows-{coins}-coins-{seed}")
+    meta_path = os.path.join(home, "meta")
+    if os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if os.path.getsize(os.path.join(home, "snapshots.jsonl")) >= meta["bytes"]:
+            _reset(home, meta)
+            return meta
+    shutil.rmtree(home, ignore_errors=True)
+    t0 = time.perf_counter()
+    meta = datagen.generate(home, rows, coins, seed)
+    meta.update({"home": home, "coins": coins, "seed": seed})
+    meta["generate_s"] = time.perf_counter() - t0
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    return meta
+
+
+def _reset(home: str, meta: dict) -> None:
+    """Back to the generated state: drop appended rows and every derived file."""
+    with open(os.path.join(home, "snapshots.jsonl"), "r+b") as f:
+        f.truncate(meta["bytes"])
+    for name in os.listdir(home):
+        if name not in _KEEP:
+            path = os.path.join(home, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+
+def _best(fn, ops: int, repeat: int) -> float:
+    """Best-of-`repeat` seconds per op of calling fn(i) for i in range(ops)."""
+    best = None
+    for r in range(repeat):
+        t0 = time.perf_counter()
+        for i in range(ops):
+            fn(r * ops + i)
+        secs = (time.perf_counter() - t0) / ops
+        best = secs if best is None else min(best, secs)
+    return best
+
+
+def _later_snapshots(meta: dict, n: int) -> list[dict]:
+    """`n` snapshots continuing after the generated history."""
+    start = datetime.fromisoformat(meta["last_ts"]) + timedelta(minutes=10)
+    return [
+        snap
+        for snap, _ in datagen.iter_snapshots(
+            n, meta["coins"], meta["seed"] + 1, repeat_ratio=0.0, start=start
+        )
+    ]
+
+
+def run_size(meta: dict, repeat: int, ops: int) -> dict:
+    home = meta["home"]
+    _redirect(home)
+    parser = cli.build_parser()
+    out_csv = os.path.join(tempfile.gettempdir(), f"bench-export-{os.getpid()}.csv")
+    export_args = parser.parse_args(["export", "--last", "1000", "--out", out_csv])
+    stats_args = parser.parse_args(["stats", "--last", "30"])
+    later = _later_snapshots(meta, 2 * ops * repeat)
+    upserts, appends = later[: ops * repeat], later[ops * repeat :]
+    cases = {}
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    def case(name, fn, n):
+        cases[name] = {"per_op_s": _best(fn, n, repeat), "ops": n}
+
+    case("read_last_snapshots", lambda i: js.read_last_snapshots(10), ops)
+    case("rebuild_daily_rollups", lambda i: js.rebuild_daily_rollups(), 1)
+    case("read_daily_all", lambda i: js.read_daily_all(), 1)
+    with quiet:
+        cli.cmd_export(export_args)  # untimed: builds the columnar store once
+        case("cmd_export", lambda i: cli.cmd_export(export_args), 1)
+        case("cmd_stats", lambda i: cli.cmd_stats(stats_args), 1)
+    case("upsert_daily_from_snapshot", lambda i: js.upsert_daily_from_snapshot(upserts[i]), ops)
+    case("guarded_append_snapshot_line", lambda i: js.guarded_append_snapshot_line(appends[i]), ops)
+
+    if os.path.exists(out_csv):
+        os.remove(out_csv)
+    _reset(home, meta)
+    return {"rows": meta["rows"], "coins": meta["coins"], "bytes": meta["bytes"], "cases": cases}
+
+
+def compare_baseline(results: dict, baseline: dict, threshold: float, floor_s: float) -> list:
+    """Cases slower than `threshold` x the baseline (and by more than `floor_s`)."""
+    out = []
+    for size, rec in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base or base.get("coins") != rec["coins"]:
+            continue
+        for name, m in rec["cases"].items():
+            b = base["cases"].get(name)
+            if b is None:
+                continue
+            cur, ref = m["per_op_s"], b["per_op_s"]
+            if cur > ref * threshold and cur - ref > floor_s:
+                out.append(f"{size} {name}: {cur * 1e3:.3f} ms vs baseline {ref * 1e3:.3f} ms")
+    return out
+
+
+def find_cliffs(results: dict, threshold: float, floor_s: float) -> list:
+    """Cases growing faster between consecutive sizes than their COMPLEXITY allows."""
+    out = []
+    sizes = sorted(results["sizes"].items(), key=lambda kv: kv[1]["rows"])
+    for (s0, small), (s1, big) in zip(sizes, sizes[1:]):
+        growth = big["rows"] / small["rows"]
+        for name, m in big["cases"].items():
+            if name not in small["cases"]:
+                continue
+            ref = small["cases"][name]["per_op_s"]
+            allowed = ref * (growth if COMPLEXITY.get(name) == "n" else 1.0)
+            cur = m["per_op_s"]
+            if cur > allowed * threshold and cur - allowed > floor_s:
+                out.append(
+                    f"{name}: {s0} -> {s1} took {cur / ref:.1f}x longer "
+                    f"(expected {'~linear' if COMPLEXITY.get(name) == 'n' else 'flat'})"
+                )
+    return out
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark the snapshot and rollup store")
+    ap.add_argument("--rows", default="10k,1m", help="Comma-separated sizes, e.g. 10k,1m,10m")
+    ap.add_argument("--coins", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--repeat", type=int, default=3, help="Best of N timings per case")
+    ap.add_argument("--ops", type=int, default=50, help="Calls per timing for per-call cases")
+    ap.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "crypto-bench"))
+    ap.add_argument("--out", help="Write results JSON here")
+    ap.add_argument(
+        "--baseline", help="Compare with this results JSON (default: benchmarks/baseline.json)"
+    )
+    ap.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=DEFAULT_BASELINE,
+        help="Also write the results as the baseline (default: benchmarks/baseline.json)",
+    )
+    ap.add_argument("--threshold", type=float, default=1.5, help="Allowed slowdown factor")
+    ap.add_argument(
+        "--floor-ms", type=float, default=1.0, help="Ignore slowdowns smaller than this"
+    )
+    args = ap.parse_args()
+
+    results = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "coins": args.coins,
+            "seed": args.seed,
+            "when": datetime.now().isoformat(timespec="seconds"),
+        },
+        "sizes": {},
+    }
+    for label in [s.strip() for s in args.rows.split(",") if s.strip()]:
+        meta = _prepare(args.data_dir, datagen.parse_rows(label), args.coins, args.seed)
+        rec = run_size(meta, args.repeat, args.ops)
+        results["sizes"][label] = rec
+        print(f"{label}: {rec['rows']:,} rows, {rec['bytes'] / (1024 * 1024):,.1f} MB")
+        for name, m in rec["cases"].items():
+            print(f"  {name:<30} {m['per_op_s'] * 1e3:12.3f} ms/op  (x{m['ops']})")
+
+    for path in (args.out, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+
+    floor = args.floor_ms / 1000.0
+    problems = find_cliffs(results, args.threshold, floor)
+    baseline = args.baseline
+    if baseline is None and os.path.exists(DEFAULT_BASELINE) and not args.save_baseline:
+        baseline = DEFAULT_BASELINE
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            problems += compare_baseline(results, json.load(f), args.threshold, floor)
+    elif not args.save_baseline:
+        print("No baseline to compare with; only scaling cliffs were checked (--save-baseline).")
+    for line in problems:
+        print(f"REGRESSION {line}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
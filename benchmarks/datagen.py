@@ -0,0 +1,157 @@
+# benchmarks/datagen.py
+# Deterministic synthetic history for the storage benchmarks: a portfolio of
+# `coins` positions, random-walk prices, and a snapshots.jsonl laid out the way
+# `crypto track` writes it (v2 full lines with a portfolio ref, plus repeat
+# lines for ticks that served cached prices; or v1 lines with positions).
+#
+#   python benchmarks/datagen.py ~/bench-home --rows 1m --coins 20
+import argparse
+import json
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import snapshot_codec  # noqa: E402
+
+START = datetime(2015, 1, 1, tzinfo=timezone.utc)
+_NAMED = ["bitcoin", "ethereum", "cardano", "solana", "dogecoin", "ripple", "polkadot", "tron"]
+
+
+def parse_rows(text: str) -> int:
+    """'10k' / '1m' / '2500' -> row count."""
+    text = str(text).strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def portfolio(coins: int, seed: int = 42) -> list[dict]:
+    rnd = random.Random(seed)
+    out = []
+    for i in range(coins):
+        cid = _NAMED[i] if i < len(_NAMED) else f"coin-{i:04d}"
+        out.append(
+            {
+                "id": cid,
+                "symbol": cid[:3] if i < len(_NAMED) else f"c{i}",
+                "qty": round(rnd.uniform(0.1, 50.0), 4),
+                "cost_basis": round(rnd.uniform(0.05, 40000.0), 2),
+            }
+        )
+    return out
+
+
+def iter_snapshots(
+    rows: int,
+    coins: int,
+    seed: int = 42,
+    every_sec: int = 600,
+    repeat_ratio: float = 0.05,
+    start: datetime = START,
+):
+    """
+    Yield (snapshot, repeat) pairs. `repeat` marks a tick whose prices equal the
+    previous one (a cached price served again), which the v2 writer stores as a
+    repeat line.
+    """
+    rnd = random.Random(seed)
+    positions = portfolio(coins, seed)
+    prices = {p["id"]: p["cost_basis"] * rnd.uniform(0.5, 2.0) for p in positions}
+    for i in range(rows):
+        repeat = i > 0 and rnd.random() < repeat_ratio
+        if not repeat:
+            for cid, price in prices.items():
+                prices[cid] = max(1e-6, price * (1.0 + rnd.gauss(0.0, 0.002)))
+        report = []
+        total = 0.0
+        for p in positions:
+            price = prices[p["id"]]
+            value = p["qty"] * price
+            pnl = value - p["qty"] * p["cost_basis"]
+            cost = p["qty"] * p["cost_basis"]
+            report.append(
+                {
+                    "symbol": p["symbol"],
+                    "price": price,
+                    "value": value,
+                    "pnl": pnl,
+                    "pnl_pct": pnl / cost * 100.0 if cost else 0.0,
+                }
+            )
+            total += value
+        snap = {
+            "ts": (start + timedelta(seconds=every_sec * i)).isoformat(),
+            "total_value": total,
+            "vs_currency": "usd",
+            "prices": dict(prices),
+            "positions": report,
+        }
+        yield snap, repeat
+
+
+def generate(
+    home: str,
+    rows: int,
+    coins: int = 5,
+    seed: int = 42,
+    every_sec: int = 600,
+    fmt: int = 2,
+    repeat_ratio: float = 0.05,
+) -> dict:
+    """
+    Write portfolio.json, config.json and snapshots.jsonl (plus the v2 portfolio
+    refs) into `home`. Returns {"rows", "bytes", "last_ts"}.
+    """
+    os.makedirs(home, exist_ok=True)
+    positions = portfolio(coins, seed)
+    ref = snapshot_codec.portfolio_ref(positions)
+    with open(os.path.join(home, "portfolio.json"), "w", encoding="utf-8") as f:
+        json.dump({"positions": positions}, f)
+    with open(os.path.join(home, "config.json"), "w", encoding="utf-8") as f:
+        json.dump({"storage_backend": "jsonl", "snapshot_format": fmt}, f)
+    if fmt == snapshot_codec.FORMAT_VERSION:
+        with open(os.path.join(home, "snapshot_portfolios.jsonl"), "w", encoding="utf-8") as f:
+            f.write(json.dumps({"ref": ref, "positions": positions}) + "\n")
+
+    dumps = json.dumps
+    last_ts = None
+    path = os.path.join(home, "snapshots.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        for snap, repeat in iter_snapshots(rows, coins, seed, every_sec, repeat_ratio):
+            last_ts = snap["ts"]
+            head = {"ts": snap["ts"], "total_value": snap["total_value"], "vs_currency": "usd"}
+            if fmt != snapshot_codec.FORMAT_VERSION:
+                line = {**head, "prices": snap["prices"], "positions": snap["positions"]}
+            elif repeat:
+                line = {**head, "v": snapshot_codec.FORMAT_VERSION, "rep": 1}
+            else:
+                # as storage.json_store writes it: positions re-derive from the "pf" ref
+                line = {
+                    **head,
+                    "prices": snap["prices"],
+                    "v": snapshot_codec.FORMAT_VERSION,
+                    "pf": ref,
+                }
+            f.write(dumps(line) + "\n")
+    return {"rows": rows, "bytes": os.path.getsize(path), "last_ts": last_ts}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Write a synthetic crypto-tracker home directory")
+    ap.add_argument("home", help="Directory to (over)write")
+    ap.add_argument("--rows", default="10k", help="Snapshot count, e.g. 10k, 1m, 10m")
+    ap.add_argument("--coins", type=int, default=5)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--every-sec", type=int, default=600, help="Seconds between snapshots")
+    ap.add_argument("--format", type=int, choices=(1, 2), default=2, dest="fmt")
+    args = ap.parse_args()
+    res = generate(
+        args.home, parse_rows(args.rows), args.coins, args.seed, args.every_sec, args.fmt
+    )
+    print(f"{res['rows']:,} snapshots, {res['bytes'] / (1024 * 1024):,.1f} MB -> {args.home}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 # cli.py
 import argparse
 import time
+from datetime import datetime, timedelta, timezone
 from statistics import mean, pstdev
 
 import services.coingecko_client as cg
@@ -13,16 +14,37 @@ from core.portfolio import (
     valuate,
 )
 from scheduler.runner import run_daemon
+from services import http_session, metrics
 from services.notify import send_webhook
 from storage.json_store import (
+    ROLLUP_TIERS,
+    SEGMENT_CODECS,
+    STORAGE_BACKENDS,
+    OutlierGuard,
+    SnapshotWriter,
+    apply_retention,
+    compact_segments,
+    compress_sealed_segments,
     ensure_config_exists,
+    get_backend,
     guarded_append_snapshot_line,
+    import_jsonl_into_sqlite,
+    migrate_to_segments,
+    pick_rollup_tier,
     read_cache,
+    read_coin_daily,
     read_config,
-    read_daily_all,
+    read_last_coin_daily,
     read_last_daily,
+    read_last_rollups,
+    read_last_snapshot_points,
     read_last_snapshots,
+    read_rollups,
+    read_segment_manifest,
+    read_snapshot_points_range,
     rebuild_daily_rollups,
+    refresh_daily_rollups,
+    snapshot_at,
     write_cache,
     write_config,
 )
@@ -77,7 +99,7 @@ def _print_report(report: dict):
         print(f"Total Value: ${report['total_value']:,.2f}")
 
 
-def _snapshot_and_cache(ids, prices_resp, vs_currency, report):
+def _snapshot_and_cache(ids, prices_resp, vs_currency, report, guard=None):
     last_fetch_ts = utc_now_iso()
     snapshot_obj = {
         "ts": last_fetch_ts,
@@ -86,14 +108,20 @@ def _snapshot_and_cache(ids, prices_resp, vs_currency, report):
         "positions": report["positions"],
         "vs_currency": vs_currency,
     }
-    saved = guarded_append_snapshot_line(snapshot_obj)
+    # flag prices that did not come from CoinGecko (HTML fallback, hedge or cache)
+    fallback = sorted(
+        pid for pid in ids if prices_resp.get(pid, {}).get("source", "coingecko") != "coingecko"
+    )
+    if fallback:
+        snapshot_obj["fallback"] = fallback
+    saved = guarded_append_snapshot_line(snapshot_obj, guard=guard)
     if not saved:
         print("Warning: snapshot skipped as outlier (logged to snapshots_bad.jsonl).")
     flat_prices = {pid: prices_resp.get(pid, {}).get(vs_currency, 0.0) for pid in ids}
     write_cache(flat_prices, last_fetch_ts)
 
 
-def one_cycle(vs_currency: str):
+def one_cycle(vs_currency: str, guard: OutlierGuard | None = None):
     port = load_portfolio()
     ids = [p["id"] for p in port["positions"]]
     if not ids:
@@ -105,11 +133,13 @@ def one_cycle(vs_currency: str):
     except Exception as e:
         log.warning("Price fetch failed (%s). Falling back to cache.", e)
         cache = read_cache()
-        prices_resp = {k: {vs_currency: v} for k, v in cache.get("last_prices", {}).items()}
+        prices_resp = {
+            k: {vs_currency: v, "source": "cache"} for k, v in cache.get("last_prices", {}).items()
+        }
 
     report = valuate(port, prices_resp, vs_currency)
     _print_report(report)
-    _snapshot_and_cache(ids, prices_resp, vs_currency, report)
+    _snapshot_and_cache(ids, prices_resp, vs_currency, report, guard=guard)
 
 
 # -------- Commands --------
@@ -126,11 +156,32 @@ def cmd_daemon(args: argparse.Namespace):
     vs = args.fiat or cfg.get("vs_currency", "usd")
     interval = args.interval or int(cfg.get("update_interval_sec", 600))
     jitter = args.jitter
+    # keep the outlier window in memory between cycles instead of re-reading the file,
+    # and group-commit snapshots (flushed by count/age, and on SIGTERM)
+    writer = SnapshotWriter()
+    guard = OutlierGuard(writer=writer)
 
     def job():
-        one_cycle(vs_currency=vs)
+        try:
+            one_cycle(vs_currency=vs, guard=guard)
+        finally:
+            metrics.flush()  # this cycle's external calls
+        try:
+            compress_sealed_segments()  # segments sealed by this cycle's appends
+        except Exception as e:
+            log.warning("Compressing sealed segments failed (%s); will retry.", e)
 
-    run_daemon(job_fn=job, interval_sec=interval, jitter_sec=jitter)
+    try:
+        run_daemon(
+            job_fn=job,
+            interval_sec=interval,
+            jitter_sec=jitter,
+            flush_fn=writer.flush,
+            tick_fn=writer.flush_if_due,
+        )
+    finally:
+        writer.close()
+        http_session.close_session()
 
 
 def cmd_add(args: argparse.Namespace):
@@ -227,77 +278,139 @@ def cmd_price(args: argparse.Namespace):
         print(f"{s.upper():<6} ${p:,.4f}")
 
 
+# rollup tier -> (label, period noun, periods per year for annualising)
+_TIER_INFO = {
+    "1h": ("Hourly", "hour", 252 * 24),
+    "1d": ("Daily", "day", 252),
+    "1w": ("Weekly", "week", 52),
+    "1M": ("Monthly", "month", 12),
+}
+
+
+def _print_rollups(rows: list[dict], title: str, table: bool) -> None:
+    """Print OHLC rollup rows (portfolio totals or one coin's prices)."""
+    if table:
+        try:
+            from rich.console import Console
+            from rich.table import Table
+
+            t = Table(title=f"{title} ({rows[0]['date']} → {rows[-1]['date']})")
+            t.add_column("Date", justify="left")
+            t.add_column("Open", justify="right")
+            t.add_column("Close", justify="right")
+            t.add_column("High", justify="right")
+            t.add_column("Low", justify="right")
+            t.add_column("Avg", justify="right")
+            t.add_column("Count", justify="right")
+            for r in rows:
+                t.add_row(
+                    r["date"],
+                    f"${r['open']:,.2f}",
+                    f"${r['close']:,.2f}",
+                    f"${r['high']:,.2f}",
+                    f"${r['low']:,.2f}",
+                    f"${r['avg']:,.2f}",
+                    str(r["count"]),
+                )
+            Console().print(t)
+            return
+        except Exception:
+            pass
+    else:
+        print(f"{title} ({rows[0]['date']} → {rows[-1]['date']}):")
+    for r in rows:
+        print(
+            f"{r['date']}  "
+            f"O:{r['open']:,.2f}  "
+            f"C:{r['close']:,.2f}  "
+            f"H:{r['high']:,.2f}  "
+            f"L:{r['low']:,.2f}  "
+            f"Avg:{r['avg']:,.2f}  "
+            f"n={r['count']}"
+        )
+
+
+def _coin_id_arg(value: str, cfg: dict) -> str:
+    """--coin accepts a configured symbol (btc) or a CoinGecko id (bitcoin)."""
+    return cfg.get("symbols_map", {}).get(value.lower()) or value.lower()
+
+
+def _coin_daily_rows(coin: str, args: argparse.Namespace, last: int | None) -> list[dict]:
+    if args.from_date or args.to_date:
+        rows = read_coin_daily(coin, args.from_date, args.to_date)
+        return rows[-last:] if last else rows
+    return read_last_coin_daily(coin, last or 10**9)
+
+
 def cmd_history(args: argparse.Namespace):
-    if args.daily:
+    try:
+        _show_history(args)
+    except ValueError as e:  # a bad --at/--from/--to
+        print(str(e))
+        return 1
+
+
+def _show_history(args: argparse.Namespace):
+    if getattr(args, "coin", None):
+        coin = _coin_id_arg(args.coin, read_config())
+        rows = _coin_daily_rows(coin, args, args.last)
+        if not rows:
+            print(f"No daily prices for '{coin}' in the requested range.")
+            return
+        _print_rollups(rows, f"{coin} daily prices", args.table)
+        return
+
+    tier = getattr(args, "rollup", None) or ("1d" if args.daily else "raw")
+    if tier == "auto":
+        # coarsest tier that still gives about --last rows over --from/--to; raw
+        # snapshots for a plain tail, --at, or a range too short for hourly rows
+        tier = "raw"
+        if (args.from_date or args.to_date) and not getattr(args, "at", None):
+            tier = pick_rollup_tier(
+                args.from_date, args.to_date, points=args.last, allow_raw=True
+            )
+        if tier != "raw":
+            print(f"Using {tier} rollups.")
+    if tier != "raw":
+        label = _TIER_INFO[tier][0]
         # If a date filter is provided, we prefer full data then filter.
         # Otherwise keep the old --last behavior.
         if args.from_date or args.to_date:
-            rows = _filter_daily_by_date(read_daily_all(), args.from_date, args.to_date)
+            rows = read_rollups(tier, args.from_date, args.to_date)
             # If user still provided --last, apply it after filtering (tail)
             if args.last:
                 rows = rows[-args.last :]
-        else:
+        elif tier == "1d":
             rows = read_last_daily(args.last)
+        else:
+            rows = read_last_rollups(tier, args.last)
 
         if not rows:
             print(
-                "No daily rollups in the requested range."
+                f"No {label.lower()} rollups in the requested range."
                 "Try `crypto rollup` or broaden your dates."
             )
             return
+        _print_rollups(rows, f"{label} rollups", args.table)
+        return
 
-        if args.table:
-            try:
-                from rich.console import Console
-                from rich.table import Table
-
-                t = Table(title=f"Daily rollups ({rows[0]['date']} → {rows[-1]['date']})")
-                t.add_column("Date", justify="left")
-                t.add_column("Open", justify="right")
-                t.add_column("Close", justify="right")
-                t.add_column("High", justify="right")
-                t.add_column("Low", justify="right")
-                t.add_column("Avg", justify="right")
-                t.add_column("Count", justify="right")
-                for r in rows:
-                    t.add_row(
-                        r["date"],
-                        f"${r['open']:,.2f}",
-                        f"${r['close']:,.2f}",
-                        f"${r['high']:,.2f}",
-                        f"${r['low']:,.2f}",
-                        f"${r['avg']:,.2f}",
-                        str(r["count"]),
-                    )
-                Console().print(t)
-            except Exception:
-                for r in rows:
-                    print(
-                        f"{r['date']}  "
-                        f"O:{r['open']:,.2f}  "
-                        f"C:{r['close']:,.2f}  "
-                        f"H:{r['high']:,.2f}  "
-                        f"L:{r['low']:,.2f}  "
-                        f"Avg:{r['avg']:,.2f}  "
-                        f"n={r['count']}"
-                    )
-        else:
-            print(f"Daily rollups ({rows[0]['date']} → {rows[-1]['date']}):")
-            for r in rows:
-                print(
-                    f"{r['date']}  "
-                    f"O:{r['open']:,.2f}  "
-                    f"C:{r['close']:,.2f}  "
-                    f"H:{r['high']:,.2f}  "
-                    f"L:{r['low']:,.2f}  "
-                    f"Avg:{r['avg']:,.2f}  "
-                    f"n={r['count']}"
-                )
+    # --- point-in-time lookup via the sparse snapshot index ---
+    if getattr(args, "at", None):
+        row = snapshot_at(args.at)
+        if not row:
+            print(f"No snapshot at or before {args.at}.")
+            return
+        total = float(row.get("total_value", 0.0))
+        print(f"{row['ts']}  total={total:,.2f} {row.get('vs_currency','usd').upper()}")
         return
 
-    # --- existing intra-day history path (unchanged) ---
-    rows = read_last_snapshots(args.last)
-    ...
+    # --- intra-day history path ---
+    if args.from_date or args.to_date:
+        rows = read_snapshot_points_range(args.from_date, args.to_date)
+        if args.last:
+            rows = rows[-args.last :]
+    else:
+        rows = read_last_snapshots(args.last)
     if not rows:
         print("No snapshots yet. Run `crypto track` or start the daemon.")
         return
@@ -429,8 +542,18 @@ def cmd_config(args: argparse.Namespace):
                     raise ValueError("update_interval_sec must be >= 30.")
                 cfg["update_interval_sec"] = sec
                 did_change = True
+            elif k == "storage_backend":
+                if v.lower() not in STORAGE_BACKENDS:
+                    raise ValueError(
+                        f"storage_backend must be one of: {', '.join(STORAGE_BACKENDS)}."
+                    )
+                cfg["storage_backend"] = v.lower()
+                did_change = True
             else:
-                raise ValueError(f"Unknown key '{k}'. Allowed: vs_currency, update_interval_sec")
+                raise ValueError(
+                    f"Unknown key '{k}'. Allowed: vs_currency, update_interval_sec, "
+                    "storage_backend"
+                )
 
     # --add-symbol supports entries like btc=bitcoin
     if args.add_symbol:
@@ -557,6 +680,7 @@ def cmd_alert(args: argparse.Namespace):
         while True:
             if _run_once():
                 return
+            metrics.flush()
             time.sleep(15)
     except KeyboardInterrupt:
         print("Stopped.")
@@ -635,6 +759,11 @@ def cmd_watch(args: argparse.Namespace):
     above = _parse_symbol_thresholds(args.above)
     below = _parse_symbol_thresholds(args.below)
 
+    # Live loop over the resolved symbols; its first tick is served from the
+    # price cache filled by the fetch above
+    syms = [s for s in syms if ids_map.get(s)]
+    ids = [ids_map[s] for s in syms]
+
     # Lazy import rich (fallback to plain loop if unavailable)
     try:
         from rich.console import Console
@@ -663,6 +792,7 @@ def cmd_watch(args: argparse.Namespace):
                 prices_resp = cg.get_prices(ids, vs_currency=vs)
                 flat = {cid: prices_resp.get(cid, {}).get(vs, 0.0) for cid in ids}
                 console.print(render_table(flat), justify="left")
+                metrics.flush()
                 time.sleep(args.every)
     except Exception:
         # Plain fallback (prints each tick)
@@ -681,21 +811,148 @@ def cmd_watch(args: argparse.Namespace):
                         tag = f"  ALERT <= {below[s]:,.2f}"
                     print(f"{s.upper():<6} ${p:>12,.2f}{tag}")
                 print("-" * 40)
+                metrics.flush()
                 time.sleep(args.every)
         except KeyboardInterrupt:
             print("\nStopped.")
 
 
 def cmd_rollup(args: argparse.Namespace):
-    res = rebuild_daily_rollups()
+    res = rebuild_daily_rollups()  # the hourly/weekly/monthly tiers in the same pass
     print(f"Rebuilt daily rollups from {res['snapshots']} snapshots into {res['days']} day(s).")
+    tiers = {tier: len(read_rollups(tier)) for tier in ("1h", "1w", "1M")}
+    print(
+        f"Rebuilt hourly/weekly/monthly rollups: "
+        f"{tiers['1h']} hour(s), {tiers['1w']} week(s), {tiers['1M']} month(s)."
+    )
+
+
+def cmd_segments(args: argparse.Namespace):
+    if args.migrate:
+        try:
+            res = migrate_to_segments(args.period)
+        except ValueError as e:
+            print(str(e))
+            return
+        print(
+            f"Migrated {res['rows']} snapshots into {res['segments']} sealed "
+            f"{res['period']} segment(s)."
+        )
+        return
+
+    manifest = read_segment_manifest()
+    if manifest is None:
+        print("Snapshot history is a single file. Run `crypto segments --migrate` to partition it.")
+        return
+    segs = manifest.get("segments", [])
+    if not segs:
+        print(f"No sealed segments yet (period: {manifest.get('period', 'month')}).")
+        return
+    print(f"Sealed segments (period: {manifest.get('period', 'month')}):")
+    for seg in segs:
+        ohlc = ""
+        if seg.get("open") is not None:
+            ohlc = (
+                f"  O:{seg['open']:,.2f}  H:{seg['high']:,.2f}  "
+                f"L:{seg['low']:,.2f}  C:{seg['close']:,.2f}"
+            )
+        print(
+            f"{seg['file']:<28} {seg.get('rows', 0):>8} rows  "
+            f"{seg.get('start')} → {seg.get('end')}{ohlc}"
+        )
+
+
+def _mb(nbytes: int) -> str:
+    return f"{nbytes / (1024 * 1024):,.2f} MB"
+
+
+def _scan_rate(scan: dict) -> str:
+    secs = max(scan["seconds"], 1e-9)
+    return f"{scan['rows'] / secs:,.0f} rows/s ({scan['bytes'] / secs / (1024 * 1024):,.1f} MB/s)"
+
+
+def cmd_compact(args: argparse.Namespace):
+    try:
+        res = compact_segments(args.codec)
+    except ValueError as e:
+        print(str(e))
+        return
+    if not res["segments"]:
+        print("Nothing to compact: all sealed segments are already compressed.")
+        return
+    saved = res["bytes_before"] - res["bytes_after"]
+    pct = saved / res["bytes_before"] * 100 if res["bytes_before"] else 0.0
+    print(
+        f"Compressed {res['segments']} segment(s) with {res['codec']}: "
+        f"{_mb(res['bytes_before'])} → {_mb(res['bytes_after'])} "
+        f"(saved {_mb(saved)}, {pct:.1f}%)"
+    )
+    print(f"Full scan before: {_scan_rate(res['scan_before'])}")
+    print(f"Full scan after:  {_scan_rate(res['scan_after'])}")
+
+
+def cmd_retention(args: argparse.Namespace):
+    try:
+        res = apply_retention(dry_run=args.dry_run)
+    except ValueError as e:
+        print(str(e))
+        return
+    if not res["segments"]:
+        print("Nothing to downsample (no retention steps, or no segment old enough).")
+        return
+    verb = "Would downsample" if args.dry_run else "Downsampled"
+    print(
+        f"{verb} {res['segments']} segment(s): {res['rows_before']:,} → "
+        f"{res['rows_after']:,} lines"
+        + ("" if args.dry_run else f", {_mb(res['bytes_before'])} → {_mb(res['bytes_after'])}")
+    )
+
+
+def cmd_metrics(args: argparse.Namespace):
+    if args.reset:
+        metrics.reset_metrics()
+        print("Metrics reset.")
+        return
+    res = metrics.read_metrics()
+    if not res["series"]:
+        print("No external calls recorded yet.")
+        return
+    print(f"External calls since {res['since']}:")
+    print(
+        f"  {'endpoint':<10} {'outcome':<9} {'count':>7} {'mean':>9} "
+        f"{'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}"
+    )
+    for r in res["series"]:
+        print(
+            f"  {r['endpoint']:<10} {r['outcome']:<9} {r['count']:>7,} "
+            + " ".join(
+                f"{r[k]:>7.0f}ms" for k in ("mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+            )
+        )
+
+
+def cmd_storage(args: argparse.Namespace):
+    if args.import_jsonl:
+        res = import_jsonl_into_sqlite()
+        print(
+            f"Imported {res['imported']} snapshots into SQLite "
+            f"({res['skipped']} skipped, {res['days']} daily rows)."
+        )
+        if get_backend().name != "sqlite":
+            print("Switch with `crypto config --set storage_backend=sqlite`.")
+        return
+
+    backend = get_backend()
+    print(f"Storage backend: {backend.name}")
+    if backend.name == "sqlite":
+        print(f"Database: {backend.path}")
 
 
 def cmd_export(args: argparse.Namespace):
     import csv
     import os
 
-    rows = read_last_snapshots(args.last)
+    rows = read_last_snapshot_points(args.last)
     if not rows:
         print("No snapshots to export. Run `crypto track` first.")
         return
@@ -744,19 +1001,57 @@ def _daily_pct_changes(days: list[dict]) -> list[float]:
     return rets
 
 
+# auto tier for `stats`: coarsest one that still gives this many periods
+STATS_MIN_PERIODS = 60
+
+
 def cmd_stats(args: argparse.Namespace):
-    # Ensure daily rollups exist/up-to-date
-    rebuild_daily_rollups()
+    try:
+        _show_stats(args)
+    except ValueError as e:  # a bad --from/--to
+        print(str(e))
+        return 1
+
+
+def _show_stats(args: argparse.Namespace):
+    # Ensure daily rollups exist/up-to-date (incremental from the last checkpoint)
+    refresh_daily_rollups()
 
     # Window selection
-    if args.from_date or args.to_date:
-        days = _filter_daily_by_date(read_daily_all(), args.from_date, args.to_date)
+    N = (10**9) if args.all else max(2, int(args.last or 120))
+    coin = _coin_id_arg(args.coin, read_config()) if getattr(args, "coin", None) else None
+    tier = getattr(args, "tier", None) or "auto"
+    if coin is not None and tier == "auto":
+        tier = "1d"
+    start, end = args.from_date, args.to_date
+    if tier == "auto":
+        # --last counts days here; the tier is the coarsest that still covers them
+        if not (start or end) and not args.all:
+            start = (datetime.now(timezone.utc) - timedelta(days=N)).date().isoformat()
+        if start is None:
+            first = read_last_rollups("1M", N)
+            start = f"{first[0]['date']}-01" if first else None
+        tier = pick_rollup_tier(start, end, points=STATS_MIN_PERIODS)
+    label, unit, periods_per_year = _TIER_INFO[tier]
+    if coin is not None:
+        if tier != "1d":
+            print("Per-coin stats use daily rollups; drop --tier or use --tier 1d.")
+            return
+        days = _coin_daily_rows(coin, args, None if args.all else N)
+    elif tier != "1d" and (start or end):
+        days = read_rollups(tier, start, end)
+    elif tier != "1d":
+        days = read_last_rollups(tier, N)  # an explicit tier: --last N of its own buckets
+    elif args.from_date or args.to_date:
+        days = read_rollups("1d", args.from_date, args.to_date)
     else:
-        N = (10**9) if args.all else max(2, int(args.last or 120))
         days = read_last_daily(N)
 
     if len(days) < 2:
-        print("Not enough daily data in the requested range. Try broadening --from/--to.")
+        print(
+            f"Not enough {label.lower()} data in the requested range. "
+            "Try broadening --from/--to."
+        )
         return
 
     # compute stats, sharpe, max drawdown, CAGR, optional CSV, print
@@ -772,7 +1067,7 @@ def cmd_stats(args: argparse.Namespace):
     first_val = opens[0] if opens[0] > 0 else closes[0]
     last_val = closes[-1]
 
-    # Daily % changes from close-to-close (in percent)
+    # Per-period % changes from close-to-close (in percent)
     rets = _daily_pct_changes(days)
 
     total_return_pct = ((last_val / first_val) - 1.0) * 100.0 if first_val else 0.0
@@ -792,14 +1087,15 @@ def cmd_stats(args: argparse.Namespace):
         best_val = worst_val = 0.0
         best_day_date = worst_day_date = days[-1]["date"]
 
-    # Sharpe-like ratio (daily): mean / stdev (if stdev>0). Annualize by sqrt(252).
+    # Sharpe-like ratio (per period): mean / stdev (if stdev>0). Annualize by
+    # sqrt(periods per year), e.g. sqrt(252) for daily rows.
     sharpe_daily = None
     sharpe_annual = None
     if len(rets) >= 2:
         vol = pstdev(rets)
         if vol > 0:
             sharpe_daily = mean(rets) / vol
-            sharpe_annual = sharpe_daily * (252**0.5)
+            sharpe_annual = sharpe_daily * (periods_per_year**0.5)
 
     # Max drawdown from close series (in percent, negative)
     max_dd_pct = _max_drawdown(closes)
@@ -813,19 +1109,17 @@ def cmd_stats(args: argparse.Namespace):
         cum = _cum_return_series(closes)
         with open(out_path, "w", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
-            w.writerow(["date", "close", "daily_return_pct", "cum_return_pct"])
+            w.writerow(["date", "close", f"{label.lower()}_return_pct", "cum_return_pct"])
             for i, d in enumerate(days):
                 ret = "" if i == 0 else f"{rets[i-1]:.6f}"
                 w.writerow([d["date"], f"{closes[i]:.2f}", ret, f"{cum[i]:.6f}"])
-        print(f"Exported daily returns → {out_path}")
+        print(f"Exported {label.lower()} returns → {out_path}")
 
     # Optional CAGR-ish metric (calendar days between first and last)
-    from datetime import datetime
-
     fmt = "%Y-%m-%d"
     try:
-        d0 = datetime.strptime(days[0]["date"], fmt)
-        d1 = datetime.strptime(days[-1]["date"], fmt)
+        d0 = datetime.strptime(_period_start_date(days[0]["date"]), fmt)
+        d1 = datetime.strptime(_period_start_date(days[-1]["date"]), fmt)
         elapsed_days = max(1, (d1 - d0).days)
     except Exception:
         elapsed_days = period_days
@@ -840,25 +1134,27 @@ def cmd_stats(args: argparse.Namespace):
         from rich.table import Table
 
         console = Console()
-        hdr = f"Crypto Stats — {'ALL' if args.all else f'last {period_days} day(s)'}"
+        hdr = f"Crypto Stats — {'ALL' if args.all else f'last {period_days} {unit}(s)'}"
+        if coin is not None:
+            hdr += f" — {coin}"
         t = Table(title=hdr)
         t.add_column("Metric", justify="left")
         t.add_column("Value", justify="right")
 
-        t.add_row("Days", str(period_days))
+        t.add_row(f"{unit.title()}s", str(period_days))
         t.add_row("Start Value", f"${first_val:,.2f}")
         t.add_row("End Value", f"${last_val:,.2f}")
         t.add_row("Total Return", f"{total_return_pct:+.2f}%")
-        t.add_row("Avg Daily Return", f"{avg_daily_pct:+.3f}%")
-        t.add_row("Daily Volatility", f"{vol_daily_pct:.3f}% (stdev)")
-        t.add_row("Best Day", f"{best_day_date}  ({best_val:+.2f}%)")
-        t.add_row("Worst Day", f"{worst_day_date} ({worst_val:+.2f}%)")
+        t.add_row(f"Avg {label} Return", f"{avg_daily_pct:+.3f}%")
+        t.add_row(f"{label} Volatility", f"{vol_daily_pct:.3f}% (stdev)")
+        t.add_row(f"Best {unit.title()}", f"{best_day_date}  ({best_val:+.2f}%)")
+        t.add_row(f"Worst {unit.title()}", f"{worst_day_date} ({worst_val:+.2f}%)")
         t.add_row(
             "CAGR (approx.)",
             f"{(cagr if cagr is not None else float('nan')):+.2f}%" if cagr is not None else "N/A",
         )
         t.add_row(
-            "Sharpe (daily)",
+            f"Sharpe ({label.lower()})",
             (
                 f"{(sharpe_daily if sharpe_daily is not None else float('nan')):.3f}"
                 if sharpe_daily is not None
@@ -877,16 +1173,17 @@ def cmd_stats(args: argparse.Namespace):
 
         console.print(t)
     except Exception:
-        print(f"Days: {period_days}")
+        print(f"{unit.title()}s: {period_days}")
         print(f"Start Value: ${first_val:,.2f}")
         print(f"End Value:   ${last_val:,.2f}")
         print(f"Total Return: {total_return_pct:+.2f}%")
-        print(f"Avg Daily Return: {avg_daily_pct:+.3f}%")
-        print(f"Daily Volatility: {vol_daily_pct:.3f}% (stdev)")
-        print(f"Best Day:  {best_day_date}  ({best_val:+.2f}%)")
-        print(f"Worst Day: {worst_day_date} ({worst_val:+.2f}%)")
+        print(f"Avg {label} Return: {avg_daily_pct:+.3f}%")
+        print(f"{label} Volatility: {vol_daily_pct:.3f}% (stdev)")
+        print(f"Best {unit.title()}:  {best_day_date}  ({best_val:+.2f}%)")
+        print(f"Worst {unit.title()}: {worst_day_date} ({worst_val:+.2f}%)")
         print(f"CAGR (approx.): {(f'{cagr:+.2f}%' if cagr is not None else 'N/A')}")
-        print(f"Sharpe (daily): {(f'{sharpe_daily:.3f}' if sharpe_daily is not None else 'N/A')}")
+        sharpe_s = f"{sharpe_daily:.3f}" if sharpe_daily is not None else "N/A"
+        print(f"Sharpe ({label.lower()}): {sharpe_s}")
         print(
             "Sharpe (annualized): "
             f"{(f'{sharpe_annual:.3f}' if sharpe_annual is not None else 'N/A')}"
@@ -920,30 +1217,9 @@ def _cum_return_series(closes: list[float]) -> list[float]:
     return [((c / base) - 1.0) * 100.0 for c in closes]
 
 
-from datetime import datetime
-
-
-def _parse_date_ymd(s: str | None) -> datetime | None:
-    if not s:
-        return None
-    return datetime.strptime(s, "%Y-%m-%d")
-
-
-def _filter_daily_by_date(rows: list[dict], from_s: str | None, to_s: str | None) -> list[dict]:
-    dfrom = _parse_date_ymd(from_s)
-    dto = _parse_date_ymd(to_s)
-    out = []
-    for r in rows:
-        try:
-            d = datetime.strptime(r["date"], "%Y-%m-%d")
-        except Exception:
-            continue
-        if dfrom and d < dfrom:
-            continue
-        if dto and d > dto:
-            continue
-        out.append(r)
-    return out
+def _period_start_date(key: str) -> str:
+    """YYYY-MM-DD start of a rollup bucket key (hour, day, week or month)."""
+    return f"{key}-01" if len(key) == 7 else key[:10]
 
 
 # -------- Parser --------
@@ -998,8 +1274,20 @@ def build_parser():
         action="store_true",
         help="Show daily (not raw) snapshots",
     )
-    p_hist.add_argument("--from", dest="from_date", help="Filter from date (YYYY-MM-DD)")
-    p_hist.add_argument("--to", dest="to_date", help="Filter to date (YYYY-MM-DD)")
+    p_hist.add_argument(
+        "--from", dest="from_date", help="Filter from date (YYYY-MM-DD or ISO timestamp)"
+    )
+    p_hist.add_argument("--to", dest="to_date", help="Filter to date (YYYY-MM-DD or ISO timestamp)")
+    p_hist.add_argument("--at", help="Show the snapshot at a point in time, e.g. 2025-10-08T06:00Z")
+    p_hist.add_argument(
+        "--coin", help="Show daily OHLC of one coin's price (symbol or CoinGecko id)"
+    )
+    p_hist.add_argument(
+        "--rollup",
+        choices=["auto", "raw", *ROLLUP_TIERS],
+        help="Show OHLC rollups of this tier instead of raw snapshots; auto picks the "
+        "coarsest that still gives about --last rows over --from/--to",
+    )
     p_hist.set_defaults(func=cmd_history)
 
     p_exp = sub.add_parser("export", help="Export last N snapshots to CSV")
@@ -1014,7 +1302,7 @@ def build_parser():
         "--set",
         nargs="*",
         help=(
-            "Set key=value (vs_currency, update_interval_sec). "
+            "Set key=value (vs_currency, update_interval_sec, storage_backend). "
             "Ex: --set vs_currency=usd update_interval_sec=600"
         ),
     )
@@ -1029,23 +1317,12 @@ def build_parser():
     p_cfg.add_argument("--path", action="store_true", help="Print the config file path and exit")
     p_cfg.set_defaults(func=cmd_config)
 
-    p_alert = sub.add_parser("alert", help="Check/watch price alerts")
-    p_alert.add_argument("--above", nargs="*", help="Symbol thresholds like btc=70000 eth=5000")
-    p_alert.add_argument("--below", nargs="*", help="Symbol thresholds like btc=60000 eth=3000")
-    p_alert.add_argument("--every", type=int, help="Poll every N seconds (omit for one-shot)")
-    p_alert.add_argument("--fiat", help="Fiat currency (default from config)")
-    # saved sets
-    p_alert.add_argument("--save", help="Save the provided thresholds under a name")
-    p_alert.add_argument("--use", help="Use a saved threshold set by name")
-    p_alert.add_argument("--list", action="store_true", help="List saved alert sets")
-    p_alert.add_argument("--delete", help="Delete a saved alert set by name")
-    p_alert.set_defaults(func=cmd_alert)
-
     p_alert = sub.add_parser("alert", help="Check/watch price alerts")
     p_alert.add_argument("--above", nargs="*", help="Alerts like btc=70000 eth=3000 ...")
     p_alert.add_argument("--below", nargs="*", help="Alerts like btc=50000 ...")
     p_alert.add_argument("--watch", action="store_true", help="Keep watching until triggered")
     p_alert.add_argument("--webhook", help="Webhook URL (overrides config)")
+    p_alert.add_argument("--fiat", help="Fiat currency (default from config)")
     p_alert.set_defaults(func=cmd_alert)
 
     p_watch = sub.add_parser("watch", help="Live-updating price table")
@@ -1060,15 +1337,68 @@ def build_parser():
     p_watch.add_argument("--below", nargs="*", help="Alert thresholds like btc=60000 eth=3000")
     p_watch.set_defaults(func=cmd_watch)
 
-    p_roll = sub.add_parser("rollup", help="Rebuild daily rollups from all snapshots")
+    p_roll = sub.add_parser(
+        "rollup", help="Rebuild daily (and 1h/1w/1M) rollups from all snapshots"
+    )
     p_roll.set_defaults(func=cmd_rollup)
 
+    p_seg = sub.add_parser("segments", help="List or migrate time-partitioned snapshot segments")
+    p_seg.add_argument(
+        "--migrate",
+        action="store_true",
+        help="One-time split of a single snapshots.jsonl into sealed segments",
+    )
+    p_seg.add_argument(
+        "--period", choices=["day", "month", "year"], help="Segment period (default: month)"
+    )
+    p_seg.set_defaults(func=cmd_segments)
+
+    p_store = sub.add_parser("storage", help="Show the storage backend or import history into it")
+    p_store.add_argument(
+        "--import-jsonl",
+        action="store_true",
+        help="Copy snapshots.jsonl history into the SQLite database (safe to re-run)",
+    )
+    p_store.set_defaults(func=cmd_storage)
+
+    p_compact = sub.add_parser("compact", help="Compress sealed snapshot segments")
+    p_compact.add_argument(
+        "--codec",
+        choices=sorted(SEGMENT_CODECS),
+        help="gzip or xz (default: config segment_compression, else gzip)",
+    )
+    p_compact.set_defaults(func=cmd_compact)
+
+    p_ret = sub.add_parser(
+        "retention", help="Downsample old sealed segments per config retention steps"
+    )
+    p_ret.add_argument(
+        "--dry-run", action="store_true", help="Only report what would be downsampled"
+    )
+    p_ret.set_defaults(func=cmd_retention)
+
+    p_metrics = sub.add_parser(
+        "metrics", help="Show call counts and p50/p90/p99 latency of external calls"
+    )
+    p_metrics.add_argument("--reset", action="store_true", help="Clear the recorded metrics")
+    p_metrics.set_defaults(func=cmd_metrics)
+
     p_stats = sub.add_parser("stats", help="Show performance statistics from daily rollups")
-    p_stats.add_argument("--last", type=int, help="Use last N days (default 120)")
+    p_stats.add_argument(
+        "--last", type=int, help="Use last N days, or N buckets of an explicit --tier (default 120)"
+    )
     p_stats.add_argument("--all", action="store_true", help="Use all available days")
     p_stats.add_argument("--from", dest="from_date", help="Filter from date (YYYY-MM-DD)")
     p_stats.add_argument("--to", dest="to_date", help="Filter to date (YYYY-MM-DD)")
     p_stats.add_argument("--csv", help="Export daily returns to CSV at this path")
+    p_stats.add_argument("--coin", help="Stats on one coin's daily price instead of the portfolio")
+    p_stats.add_argument(
+        "--tier",
+        choices=["auto", *ROLLUP_TIERS],
+        default="auto",
+        help="Rollup tier to compute returns on; auto (default) picks the coarsest that "
+        f"still gives {STATS_MIN_PERIODS} periods (1d with --coin)",
+    )
     p_stats.set_defaults(func=cmd_stats)
 
     return p
@@ -1077,8 +1407,8 @@ def build_parser():
 def main():
     parser = build_parser()
     args = parser.parse_args()
-    args.func(args)
+    return args.func(args)
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
@@ -1,17 +1,17 @@
 # core/portfolio.py
-import json
-import os
 from typing import Dict, List, Optional
 
-from storage.json_store import PORTFOLIO_PATH, write_json
+from storage.json_store import PORTFOLIO_PATH, read_json_cached, write_json
 
 
 def load_portfolio() -> Dict:
-    """Load or initialize the portfolio file."""
-    if not os.path.exists(PORTFOLIO_PATH):
-        return {"positions": []}
-    with open(PORTFOLIO_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+    """Load or initialize the portfolio file (re-parsed only when it changed)."""
+    data = read_json_cached(PORTFOLIO_PATH, {"positions": []})
+    # the cached dict is shared: copy the levels the editing helpers change
+    port = dict(data)
+    if "positions" in data:
+        port["positions"] = [dict(p) for p in data["positions"]]
+    return port
 
 
 def save_portfolio(data: Dict) -> None:
@@ -12,19 +12,43 @@ log = get_logger("scheduler")
 
 class _StopFlag:
     stop = False
+    flush_fn: Callable[[], None] | None = None
+
+
+def _flush(reason: str) -> None:
+    if _StopFlag.flush_fn is None:
+        return
+    try:
+        _StopFlag.flush_fn()
+    except Exception as e:
+        log.exception("Flush on %s failed: %s", reason, e)
 
 
 def _handle_sig(signum, frame):
     log.info("Received signal %s — stopping after current cycle.", signum)
     _StopFlag.stop = True
+    # don't leave buffered snapshots behind if we get killed before the loop exits
+    _flush(f"signal {signum}")
 
 
-def run_daemon(job_fn: Callable[[], None], interval_sec: int = 600, jitter_sec: int = 30):
+def run_daemon(
+    job_fn: Callable[[], None],
+    interval_sec: int = 600,
+    jitter_sec: int = 30,
+    flush_fn: Callable[[], None] | None = None,
+    tick_fn: Callable[[], None] | None = None,
+):
+    """
+    Run `job_fn` every `interval_sec` (± jitter) until SIGINT/SIGTERM.
+    `flush_fn` is called on a stop signal and on exit; `tick_fn` about once a
+    second while idle (e.g. time-based flushing of buffered writes).
+    """
     lock = SingleInstanceLock()
     if not lock.acquire():
         log.error("Another crypto daemon is already running (lock present). Exiting.")
         return
 
+    _StopFlag.flush_fn = flush_fn
     try:
         signal.signal(signal.SIGINT, _handle_sig)
         signal.signal(signal.SIGTERM, _handle_sig)
@@ -48,7 +72,14 @@ def run_daemon(job_fn: Callable[[], None], interval_sec: int = 600, jitter_sec:
                 chunk = min(1, sleep_for - slept)
                 time.sleep(chunk)
                 slept += chunk
+                if tick_fn is not None:
+                    try:
+                        tick_fn()
+                    except Exception as e:
+                        log.exception("Tick failed: %s", e)
 
         log.info("Daemon stopped.")
     finally:
+        _flush("exit")
+        _StopFlag.flush_fn = None
         lock.release()
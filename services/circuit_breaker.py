@@ -0,0 +1,88 @@
+# services/circuit_breaker.py
+# Circuit breaker whose state is shared by every process through a small JSON
+# file (flock-guarded), so once CoinGecko is down the daemon, watch loops and
+# one-off commands all skip straight to their fallback instead of each waiting
+# out the request timeout.
+#
+#   closed     requests go through; `threshold` consecutive failures open it
+#   open       requests are refused until `cooldown` seconds have passed
+#   half_open  one caller probes; success closes the breaker, failure reopens
+#              it (a probe that never reports back is replaced after `cooldown`)
+from __future__ import annotations
+
+import logging
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger("coingecko.breaker")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(RuntimeError):
+    """The breaker is open: the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, path: str, threshold: int = 3, cooldown: float = 60.0, name: str = ""):
+        self.path = str(path)
+        self.threshold = max(1, int(threshold))
+        self.cooldown = max(0.0, float(cooldown))
+        self.name = name or "circuit"
+
+    @contextmanager
+    def _state(self):
+        """Yield the persisted state (defaults filled in); saved on clean exit."""
+        from storage.json_store import read_json, write_json
+        from utils.lock import file_lock
+
+        with file_lock(self.path + ".lock"):
+            try:
+                st = read_json(self.path, {})
+            except ValueError:
+                st = {}
+            st.setdefault("state", CLOSED)
+            st.setdefault("failures", 0)
+            before = dict(st)
+            yield st
+            if st != before:
+                write_json(self.path, st)
+
+    def _move(self, st: dict, state: str, now: float, why: str) -> None:
+        if st["state"] != state:
+            level = logging.INFO if state == CLOSED else logging.WARNING
+            log.log(level, "%s breaker %s -> %s (%s).", self.name, st["state"], state, why)
+            st["state"] = state
+            st["since"] = now
+
+    def allow(self) -> bool:
+        """True if a call may go out now (in half-open, only the single probe)."""
+        now = time.time()
+        with self._state() as st:
+            if st["state"] == CLOSED:
+                return True
+            if now - float(st.get("since", 0.0)) < self.cooldown:
+                return False
+            # cooldown over (or a half-open probe went silent): this caller probes
+            self._move(st, HALF_OPEN, now, "probing")
+            st["since"] = now
+            return True
+
+    def record_success(self) -> None:
+        with self._state() as st:
+            st["failures"] = 0
+            self._move(st, CLOSED, time.time(), "call succeeded")
+
+    def record_failure(self) -> None:
+        now = time.time()
+        with self._state() as st:
+            st["failures"] = int(st["failures"]) + 1
+            if st["state"] == HALF_OPEN:
+                self._move(st, OPEN, now, "probe failed")
+            elif st["state"] == CLOSED and st["failures"] >= self.threshold:
+                self._move(st, OPEN, now, f"{st['failures']} consecutive failures")
+
+    def status(self) -> dict:
+        """{"state", "failures", "since"} as persisted."""
+        with self._state() as st:
+            return dict(st)
@@ -1,10 +1,18 @@
 # services/coingecko_client.py
 import logging
+import os
+import threading
 import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime, timezone
 from email.utils import parsedate_to_datetime
 
-import requests  # keep module import so tests can monkeypatch requests.get
+import requests
+
+from services import http_session, metrics, price_cache
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+from services.rate_limit import RateLimited, TokenBucket
 
 log = logging.getLogger("coingecko")
 
@@ -43,14 +51,343 @@ def _parse_retry_after(value: str | None) -> float:
         return 0.0
 
 
-def get_prices(ids, vs_currency: str = "usd", timeout: int = 10) -> dict:
+DEFAULT_CHUNK_SIZE = 50
+DEFAULT_MAX_WORKERS = 4
+
+
+def _chunk_settings() -> tuple[int, int]:
+    """(ids per request, parallel requests) from config, with safe defaults."""
+    try:
+        from storage.json_store import read_config
+
+        cfg = read_config()
+        size = int(cfg.get("coingecko_chunk_size", DEFAULT_CHUNK_SIZE))
+        workers = int(cfg.get("coingecko_max_workers", DEFAULT_MAX_WORKERS))
+    except Exception:
+        size, workers = DEFAULT_CHUNK_SIZE, DEFAULT_MAX_WORKERS
+    return max(1, size), max(1, workers)
+
+
+def _cached_prices(vs_currency: str) -> dict:
+    """Last prices from cache.json ({id: price}), if they are in `vs_currency`."""
+    try:
+        from storage.json_store import read_cache, read_config
+
+        if str(read_config().get("vs_currency", "usd")).lower() != str(vs_currency).lower():
+            return {}
+        prices = read_cache().get("last_prices") or {}
+    except Exception:
+        return {}
+    return {k: v for k, v in prices.items() if isinstance(v, (int, float)) and v > 0}
+
+
+DEFAULT_RATE_PER_MIN = 10
+DEFAULT_BURST = 3
+DEFAULT_MAX_WAIT_SEC = 30
+
+
+def _rate_limit_path() -> str:
+    from storage.json_store import HOME_DIR
+
+    return os.path.join(HOME_DIR, "coingecko.ratelimit")
+
+
+def _limiter() -> TokenBucket | None:
+    """
+    The bucket every CoinGecko request draws from, shared across processes.
+    Config "coingecko_rate_per_min" (default 10; 0 disables) and
+    "coingecko_burst" (default 3) size it.
+    """
+    try:
+        from storage.json_store import read_config
+
+        cfg = read_config()
+        per_min = float(cfg.get("coingecko_rate_per_min", DEFAULT_RATE_PER_MIN))
+        burst = float(cfg.get("coingecko_burst", DEFAULT_BURST))
+    except Exception:
+        per_min, burst = DEFAULT_RATE_PER_MIN, DEFAULT_BURST
+    if per_min <= 0:
+        return None
+    return TokenBucket(_rate_limit_path(), per_min / 60.0, burst)
+
+
+def _max_wait() -> float:
+    """Longest a fetch waits for the bucket (config "coingecko_max_wait_sec")."""
+    try:
+        from storage.json_store import read_config
+
+        return max(0.0, float(read_config().get("coingecko_max_wait_sec", DEFAULT_MAX_WAIT_SEC)))
+    except Exception:
+        return float(DEFAULT_MAX_WAIT_SEC)
+
+
+def expected_wait() -> float:
+    """Seconds until the next CoinGecko request may go out (0.0 if it can go now)."""
+    bucket = _limiter()
+    return bucket.expected_wait() if bucket is not None else 0.0
+
+
+DEFAULT_BREAKER_FAILURES = 3
+DEFAULT_BREAKER_COOLDOWN_SEC = 60
+
+
+def _breaker_path() -> str:
+    from storage.json_store import HOME_DIR
+
+    return os.path.join(HOME_DIR, "coingecko.breaker")
+
+
+def _breaker() -> CircuitBreaker | None:
+    """
+    Breaker shared across processes: "coingecko_breaker_failures" consecutive
+    failures (default 3; 0 disables) open it for "coingecko_breaker_cooldown_sec"
+    (default 60), after which a single request probes CoinGecko.
+    """
+    try:
+        from storage.json_store import read_config
+
+        cfg = read_config()
+        failures = int(cfg.get("coingecko_breaker_failures", DEFAULT_BREAKER_FAILURES))
+        cooldown = float(cfg.get("coingecko_breaker_cooldown_sec", DEFAULT_BREAKER_COOLDOWN_SEC))
+    except Exception:
+        failures, cooldown = DEFAULT_BREAKER_FAILURES, DEFAULT_BREAKER_COOLDOWN_SEC
+    if failures <= 0:
+        return None
+    return CircuitBreaker(_breaker_path(), failures, cooldown, name="CoinGecko")
+
+
+def _limited_get(bucket: TokenBucket | None, max_wait: float, params: dict, timeout, hedge=None):
+    """
+    (response, None) for one /simple/price request once the bucket allows it,
+    or (None, prices) when `hedge` (a _Hedge) answered first. The hedge
+    deadline starts here, after the token: rate-limit waits never trigger it.
+    """
+    if bucket is not None:
+        waited = bucket.acquire(max_wait)
+        if waited > 0:
+            log.info("Waited %.1f s for the CoinGecko rate limit.", waited)
+    if hedge is not None and not hedge.ran:
+        return hedge.race(lambda: _timed_get(params, timeout))
+    return _timed_get(params, timeout), None
+
+
+def _timed_get(params: dict, timeout):
+    t0 = time.perf_counter()
+    with metrics.timed("coingecko") as rec:
+        resp = http_session.get(COINGECKO_SIMPLE_PRICE, params=params, timeout=timeout)
+        rec["status"] = resp.status_code
+    if resp.status_code == 200:
+        with _latency_lock:
+            _latencies_ms.append((time.perf_counter() - t0) * 1000.0)
+    return resp
+
+
+def _html_fallback(ids, vs_currency: str) -> dict | None:
+    """Prices from the HTML scraper (USD only), also written to the cache; else None."""
+    t0 = time.perf_counter()
+    try:
+        if str(vs_currency).lower() == "usd":
+            from services.html_fallback import get_prices_html
+            from storage.json_store import read_cache, write_cache
+
+            alt = get_prices_html(ids)
+            if alt:
+                log.warning("Using HTML fallback for %d id(s).", len(alt))
+
+                # Persist to cache so offline mode & future runs have a last-known price set;
+                # this chunk's ids are merged into the prices other chunks cached
+                try:
+                    prices = dict(read_cache().get("last_prices") or {})
+                    prices.update({k: v.get("usd") for k, v in alt.items()})
+                    write_cache(prices, datetime.now(timezone.utc).isoformat())
+                except Exception:
+                    # cache write is best-effort; do not block returning prices
+                    pass
+
+                metrics.observe("coingecko", "fallback", (time.perf_counter() - t0) * 1000.0)
+                return _tag(alt, "html")
+    except Exception:
+        # ignore; the caller raises its original error
+        pass
+
+    return None
+
+
+def _tag(prices: dict, source: str) -> dict:
+    """{id: {vs: price}} with "source" recorded on each entry."""
+    return {cid: {**p, "source": source} for cid, p in prices.items() if isinstance(p, dict)}
+
+
+# Hedging: latencies (ms) of recent successful CoinGecko requests in this process
+DEFAULT_HEDGE_MIN_MS = 300.0
+DEFAULT_HEDGE_INITIAL_MS = 2000.0
+_HEDGE_MIN_SAMPLES = 20
+_latency_lock = threading.Lock()
+_latencies_ms: deque = deque(maxlen=200)
+# provider name -> fn(ids, vs_currency) returning tagged prices or None
+HEDGE_PROVIDERS = {"html": lambda ids, vs: _html_fallback(ids, vs)}
+
+
+def _hedge_settings() -> tuple[float | None, str]:
+    """(deadline in seconds or None when hedging is off, provider name)."""
+    try:
+        from storage.json_store import read_config
+
+        cfg = read_config()
+        pct = float(cfg.get("hedge_percentile") or 0)
+        floor_ms = float(cfg.get("hedge_min_ms", DEFAULT_HEDGE_MIN_MS))
+        provider = str(cfg.get("hedge_provider", "html"))
+    except Exception:
+        return None, "html"
+    if not 0 < pct < 100 or provider not in HEDGE_PROVIDERS:
+        return None, provider
+    with _latency_lock:
+        samples = sorted(_latencies_ms)
+    if len(samples) < _HEDGE_MIN_SAMPLES:
+        deadline_ms = DEFAULT_HEDGE_INITIAL_MS
+    else:
+        deadline_ms = samples[min(len(samples) - 1, int(len(samples) * pct / 100.0))]
+    return max(floor_ms, deadline_ms) / 1000.0, provider
+
+
+class _Hedge:
+    """
+    Hedging for one chunk: a CoinGecko request still running after `deadline`
+    seconds races the hedge provider. The hedge runs at most once; a partial
+    answer from it is kept for when CoinGecko fails.
+    """
+
+    def __init__(self, ids: list, vs_currency: str, deadline: float, provider: str):
+        self.ids = ids
+        self.vs_currency = vs_currency
+        self.deadline = deadline
+        self.provider = provider
+        self.ran = False
+        self.partial: dict | None = None
+
+    def race(self, send):
+        """(response, None), or (None, prices) when the provider has every id first."""
+        pool = ThreadPoolExecutor(max_workers=2)
+        t0 = time.perf_counter()
+        try:
+            primary = pool.submit(send)
+            done, _ = wait([primary], timeout=self.deadline)
+            if done:
+                return primary.result(), None
+            self.ran = True
+            hedge = pool.submit(HEDGE_PROVIDERS[self.provider], self.ids, self.vs_currency)
+            pending = {primary, hedge}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                if primary in done and primary.exception() is None:
+                    if primary.result().status_code == 200 or hedge not in pending:
+                        self._log_winner("coingecko", t0)
+                        return primary.result(), None
+                if hedge in done and hedge.exception() is None and hedge.result():
+                    res = hedge.result()
+                    if all(cid in res for cid in self.ids):
+                        self._log_winner(self.provider, t0)
+                        return None, res
+                    self.partial = res
+            return primary.result(), None  # CoinGecko's error or failed response
+        finally:
+            pool.shutdown(wait=False)
+
+    def _log_winner(self, winner: str, t0: float) -> None:
+        log.info(
+            "Hedged fetch of %d id(s): %s answered first after %.1f ms.",
+            len(self.ids),
+            winner,
+            (time.perf_counter() - t0) * 1000.0,
+        )
+
+
+def _fallback(ids, vs_currency: str, hedge: _Hedge | None) -> dict | None:
+    """The HTML fallback, unless a hedge already ran: then its partial answer, if any."""
+    if hedge is None or not hedge.ran:
+        return _html_fallback(ids, vs_currency)
+    if hedge.partial:
+        log.warning(
+            "CoinGecko failed; using %s prices for %d id(s).", hedge.provider, len(hedge.partial)
+        )
+    return hedge.partial
+
+
+def get_prices(ids, vs_currency: str = "usd", timeout: int = 10, max_age=None) -> dict:
     """
     Fetch prices via CoinGecko /simple/price.
 
     - Accepts a list/tuple or comma-separated string of ids.
     - Returns {id: {vs_currency: price}}
-    - Retries once on HTTP 429, honoring Retry-After header (seconds or HTTP-date).
+    - Prices fetched within "price_ttl_sec" (default 60; `max_age` overrides
+      it) by this or another process are served from services/price_cache
+      without a request, and concurrent fetches of the same ids are coalesced.
+    - Every request draws from a token bucket shared by all processes (see
+      _limiter); a 429 slows the bucket down and is retried once after its
+      Retry-After (seconds or HTTP-date). If the wait exceeds
+      "coingecko_max_wait_sec" (default 30), the HTML fallback is tried and
+      RateLimited is raised otherwise.
+    - While the circuit breaker is open (see _breaker), requests go straight to
+      the HTML fallback, else raise CircuitOpen, without waiting on CoinGecko.
+    - With "hedge_percentile" set, a request slower than that percentile of
+      recent CoinGecko latencies (timed from when the rate limit lets it go)
+      races the "hedge_provider" (see _Hedge); the first complete answer wins.
+    - Every price carries a "source" ("coingecko", "html" or "cache") next to
+      its vs_currency value.
+    - More ids than config "coingecko_chunk_size" (default 50) are fetched in
+      chunks, up to "coingecko_max_workers" (default 4) at a time, and merged.
+      A failed chunk falls back to the HTML scraper, then to cached prices;
+      the call raises only if no chunk got any prices.
     """
+    if isinstance(ids, (list, tuple)):
+        id_list = [str(x) for x in ids]
+    else:
+        id_list = str(ids).split(",")
+    return price_cache.get_or_fetch(
+        id_list, vs_currency, lambda missing: _fetch_prices(missing, vs_currency, timeout), max_age
+    )
+
+
+def _fetch_prices(id_list: list, vs_currency: str, timeout) -> dict:
+    """Live prices for `id_list`, chunked; recorded in the TTL cache."""
+    size, workers = _chunk_settings()
+    if len(id_list) <= size:
+        data = _get_chunk(id_list, vs_currency, timeout)
+        price_cache.store(data, vs_currency)
+        return data
+
+    chunks = [id_list[i : i + size] for i in range(0, len(id_list), size)]
+    results: list = []
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = [
+            pool.submit(_get_chunk, chunk, vs_currency, timeout) for chunk in chunks
+        ]
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                results.append(e)
+    if all(isinstance(r, Exception) for r in results):
+        raise results[0]
+
+    out: dict = {}
+    cached = None
+    for chunk, res in zip(chunks, results):
+        if not isinstance(res, Exception):
+            price_cache.store(res, vs_currency)
+        else:
+            if cached is None:
+                cached = _cached_prices(vs_currency)
+            log.warning("Chunk of %d id(s) failed (%s); using cached prices.", len(chunk), res)
+            res = {
+                cid: {vs_currency: cached[cid], "source": "cache"} for cid in chunk if cid in cached
+            }
+        out.update(res)
+    return out
+
+
+def _get_chunk(ids, vs_currency: str, timeout) -> dict:
+    """One /simple/price request (with the 429 retry, hedging and HTML fallback)."""
     if isinstance(ids, (list, tuple)):
         ids_param = ",".join(str(x) for x in ids)
     else:
@@ -62,57 +399,71 @@ def get_prices(ids, vs_currency: str = "usd", timeout: int = 10) -> dict:
         "include_last_updated_at": "false",
     }
 
-    t0 = time.perf_counter()
-    resp = requests.get(COINGECKO_SIMPLE_PRICE, params=params, timeout=timeout)
+    breaker = _breaker()
+    if breaker is not None and not breaker.allow():
+        log.warning("CoinGecko circuit is open; skipping the request.")
+        alt = _html_fallback(ids, vs_currency)
+        if alt:
+            return alt
+        raise CircuitOpen("CoinGecko circuit is open")
 
-    if resp.status_code == 429:
-        delay = _parse_retry_after(resp.headers.get("Retry-After"))
-        if delay > 0:
-            time.sleep(delay)
-        # retry once
-        resp = requests.get(COINGECKO_SIMPLE_PRICE, params=params, timeout=timeout)
+    deadline, provider = _hedge_settings()
+    hedge = None
+    if deadline is not None:
+        hedge = _Hedge(ids_param.split(","), vs_currency, deadline, provider)
+    bucket = _limiter()
+    max_wait = _max_wait()
+    t0 = time.perf_counter()
+    try:
+        resp, hedged = _limited_get(bucket, max_wait, params, timeout, hedge)
+        if resp is not None and resp.status_code == 429:
+            delay = _parse_retry_after(resp.headers.get("Retry-After"))
+            if bucket is not None:
+                bucket.penalize(delay)  # the retry waits for the bucket instead
+            elif delay > 0:
+                time.sleep(delay)
+            # retry once
+            resp, hedged = _limited_get(bucket, max_wait, params, timeout, hedge)
+    except RateLimited as e:
+        log.warning("Skipping CoinGecko: %s.", e)
+        alt = _fallback(ids, vs_currency, hedge)
+        if alt:
+            return alt
+        raise
+    except requests.RequestException as e:
+        if breaker is not None:
+            breaker.record_failure()
+        log.warning("Fetch failed in %.1f ms (%s).", (time.perf_counter() - t0) * 1000.0, e)
+        alt = _fallback(ids, vs_currency, hedge)
+        if alt:
+            return alt
+        raise
+    if hedged is not None:
+        return hedged  # CoinGecko is still in flight; the breaker and bucket hear nothing
 
     elapsed_ms = (time.perf_counter() - t0) * 1000.0
     status = resp.status_code
+    if breaker is not None:
+        if status == 200:
+            breaker.record_success()
+        elif status >= 500:
+            breaker.record_failure()
+    if bucket is not None:
+        if status == 429:
+            bucket.penalize(_parse_retry_after(resp.headers.get("Retry-After")))
+        elif status == 200:
+            bucket.reward()
 
     if status != 200:
         log.warning("Fetch failed in %.1f ms (status %s).", elapsed_ms, status)
-
-        # --- Fallback to HTML scraper before raising ---
-        # --- Fallback to HTML scraper before raising (writes cache) ---
-        try:
-            if str(vs_currency).lower() == "usd":
-                from services.html_fallback import get_prices_html
-                from storage.json_store import write_cache  # <-- added import
-
-                alt = get_prices_html(ids)
-                if alt:
-                    log.warning("Using HTML fallback for %d id(s).", len(alt))
-
-                    # Persist to cache so offline mode & future runs have a last-known price set
-                    try:
-                        from datetime import datetime, timezone
-                        cache_obj = {
-                            "ts": datetime.now(timezone.utc).isoformat(),
-                            "vs_currency": "usd",
-                            # flatten: {"bitcoin": 12345.67, ...}
-                            "prices": {k: v.get("usd") for k, v in alt.items()},
-                        }
-                        write_cache(cache_obj)
-                    except Exception:
-                        # cache write is best-effort; do not block returning prices
-                        pass
-
-                    return alt
-        except Exception:
-            # ignore; we'll raise the original error below
-            pass
-
+        alt = _fallback(ids, vs_currency, hedge)
+        if alt:
+            return alt
         resp.raise_for_status()
 
     data = resp.json()
     log.info(
         "Fetched %d ids in %.1f ms (status %s).", len(ids_param.split(",")), elapsed_ms, status
     )
-    return data
+    return _tag(data, "coingecko")
 
@@ -2,7 +2,8 @@
 from __future__ import annotations
 import re
 from typing import Dict, Sequence, Any
-import requests
+
+from services import http_session, metrics
 
 UA = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -26,7 +27,9 @@ RE_PRICE_2 = re.compile(r'"currentPrice"\s*:\s*\{"raw"\s*:\s*([0-9]+(?:\.[0-9]+)
 
 def _fetch_yahoo_symbol(symbol: str, timeout: tuple[float, float] = (3.0, 10.0)) -> float | None:
     url = f"https://finance.yahoo.com/quote/{symbol}/"
-    r = requests.get(url, headers={"User-Agent": UA}, timeout=timeout)
+    with metrics.timed("yahoo") as rec:
+        r = http_session.get(url, headers={"User-Agent": UA}, timeout=timeout)
+        rec["status"] = r.status_code
     r.raise_for_status()
     html = r.text
     m = RE_PRICE_1.search(html) or RE_PRICE_2.search(html)
@@ -0,0 +1,99 @@
+# services/http_session.py
+# One keep-alive requests.Session shared by the CoinGecko client, the HTML
+# fallback and webhooks, so long-running commands (daemon, watch, alert polls)
+# reuse pooled connections instead of a new TCP/TLS handshake per call.
+#
+# Optional config.json keys (read when the session is first created):
+#   http_pool_connections  hosts kept in the pool (default 4)
+#   http_pool_maxsize      connections kept per host (default 8)
+#   http_timeouts          {"api.coingecko.com": [3.05, 10], "default": 15}:
+#                          seconds (or [connect, read]) per host; a listed host
+#                          overrides the timeout the caller passed
+from __future__ import annotations
+
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+_lock = threading.Lock()
+_session: requests.Session | None = None
+_timeouts: dict = {}
+
+
+def _config() -> dict:
+    try:
+        from storage.json_store import read_config
+
+        return read_config()
+    except Exception:
+        return {}
+
+
+def _positive_int(value, default: int) -> int:
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse_timeouts(raw) -> dict:
+    out = {}
+    for host, value in (raw or {}).items() if isinstance(raw, dict) else ():
+        try:
+            if isinstance(value, (list, tuple)):
+                out[str(host).lower()] = (float(value[0]), float(value[1]))
+            else:
+                out[str(host).lower()] = float(value)
+        except (TypeError, ValueError, IndexError):
+            continue
+    return out
+
+
+def get_session() -> requests.Session:
+    """The shared session, created (from config) on first use."""
+    global _session, _timeouts
+    with _lock:
+        if _session is None:
+            cfg = _config()
+            adapter = HTTPAdapter(
+                pool_connections=_positive_int(cfg.get("http_pool_connections"), 4),
+                pool_maxsize=_positive_int(cfg.get("http_pool_maxsize"), 8),
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _timeouts = _parse_timeouts(cfg.get("http_timeouts"))
+            _session = session
+        return _session
+
+
+def close_session() -> None:
+    """Close pooled connections; the next request opens a fresh session."""
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def host_timeout(url: str, default):
+    """Configured timeout for `url`'s host (else "default", else `default`)."""
+    host = (urlsplit(url).hostname or "").lower()
+    return _timeouts.get(host, _timeouts.get("default", default))
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send through the shared session, with the host's configured timeout."""
+    session = get_session()
+    kwargs["timeout"] = host_timeout(url, kwargs.get("timeout"))
+    return session.request(method.upper(), url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("get", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("post", url, **kwargs)
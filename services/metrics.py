@@ -0,0 +1,181 @@
+# services/metrics.py
+# Counters and fixed-bucket latency histograms for every external call
+# (CoinGecko, the Yahoo HTML fallback, webhooks), keyed by endpoint and
+# outcome ("200", "2xx", "429", "4xx", "5xx", "timeout", "error", "fallback").
+# Observations are counted in memory, and flush() merges them into
+# ~/.crypto_tracker/metrics.json under a file lock once per daemon or watch
+# cycle and at exit. Daemon cycles, watch loops and one-off commands thus add
+# up to one record that `crypto metrics` reports as counts and p50/p90/p99
+# latencies, with no file I/O on the calls being measured.
+from __future__ import annotations
+
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# upper bounds (ms) of the histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_lock = threading.Lock()
+_pending: dict = {}  # "endpoint|outcome" -> series not yet merged into the file
+
+
+def _metrics_path() -> str:
+    from storage.json_store import HOME_DIR
+
+    return os.path.join(HOME_DIR, "metrics.json")
+
+
+def outcome_for(status: int | None = None, exc: BaseException | None = None) -> str:
+    """Outcome label for an HTTP status or the exception a call raised."""
+    if exc is not None:
+        import requests
+
+        return "timeout" if isinstance(exc, requests.Timeout) else "error"
+    if status in (200, 429):
+        return str(status)
+    if status is not None and 200 <= status < 300:
+        return "2xx"
+    if status is not None and 500 <= status < 600:
+        return "5xx"
+    if status is not None and 400 <= status < 500:
+        return "4xx"
+    return str(status)
+
+
+def _empty_series() -> dict:
+    return {"count": 0, "sum_ms": 0.0, "max_ms": 0.0, "buckets": [0] * (len(BUCKETS_MS) + 1)}
+
+
+def _bucket(ms: float) -> int:
+    for i, bound in enumerate(BUCKETS_MS):
+        if ms <= bound:
+            return i
+    return len(BUCKETS_MS)
+
+
+def observe(endpoint: str, outcome: str, ms: float) -> None:
+    """Count one call to `endpoint` that ended in `outcome` after `ms` milliseconds."""
+    with _lock:
+        s = _pending.setdefault(f"{endpoint}|{outcome}", _empty_series())
+        s["count"] += 1
+        s["sum_ms"] += ms
+        s["max_ms"] = max(s["max_ms"], ms)
+        s["buckets"][_bucket(ms)] += 1
+
+
+def flush() -> None:
+    """Merge the observations counted so far into metrics.json."""
+    from storage.json_store import read_json, write_json
+    from utils.lock import file_lock
+
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+    if not pending:
+        return
+    path = _metrics_path()
+    try:
+        with file_lock(path + ".lock"):
+            try:
+                data = read_json(path, {})
+            except ValueError:
+                data = {}
+            if data.get("buckets_ms") != list(BUCKETS_MS):  # new file or new layout
+                data = {"since": datetime.now(timezone.utc).isoformat(), "series": {}}
+                data["buckets_ms"] = list(BUCKETS_MS)
+            for key, add in pending.items():
+                _merge_series(data["series"].setdefault(key, _empty_series()), add)
+            write_json(path, data)
+    except OSError:
+        # metrics are best-effort; keep the counts for the next flush
+        with _lock:
+            for key, add in pending.items():
+                _merge_series(_pending.setdefault(key, _empty_series()), add)
+
+
+def _merge_series(s: dict, add: dict) -> None:
+    s["count"] += add["count"]
+    s["sum_ms"] += add["sum_ms"]
+    s["max_ms"] = max(s["max_ms"], add["max_ms"])
+    s["buckets"] = [a + b for a, b in zip(s["buckets"], add["buckets"])]
+
+
+atexit.register(flush)
+
+
+@contextmanager
+def timed(endpoint: str):
+    """
+    Time the block as a call to `endpoint`. Set `rec["status"]` (or
+    `rec["outcome"]`) inside it; an exception is recorded as timeout/error.
+    """
+    rec: dict = {}
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException as e:
+        observe(endpoint, outcome_for(exc=e), (time.perf_counter() - t0) * 1000.0)
+        raise
+    ms = (time.perf_counter() - t0) * 1000.0
+    observe(endpoint, rec.get("outcome") or outcome_for(rec.get("status")), ms)
+
+
+def percentile(series: dict, pct: float) -> float:
+    """Approximate `pct` percentile (ms), interpolated inside its bucket."""
+    count = series["count"]
+    if not count:
+        return 0.0
+    rank = count * pct / 100.0
+    seen = 0
+    for i, n in enumerate(series["buckets"]):
+        if n and seen + n >= rank:
+            lo = BUCKETS_MS[i - 1] if i > 0 else 0.0
+            hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else series["max_ms"]
+            return min(series["max_ms"], lo + (hi - lo) * (rank - seen) / n)
+        seen += n
+    return series["max_ms"]
+
+
+def read_metrics() -> dict:
+    """
+    {"since", "series": [{"endpoint", "outcome", "count", "mean_ms", "p50_ms",
+    "p90_ms", "p99_ms", "max_ms"}]} sorted by endpoint and outcome.
+    """
+    from storage.json_store import read_json
+
+    flush()
+    try:
+        data = read_json(_metrics_path(), {})
+    except ValueError:
+        data = {}
+    if data.get("buckets_ms") != list(BUCKETS_MS):
+        return {"since": None, "series": []}
+    rows = []
+    for key, s in sorted(data["series"].items()):
+        endpoint, _, outcome = key.partition("|")
+        rows.append(
+            {
+                "endpoint": endpoint,
+                "outcome": outcome,
+                "count": s["count"],
+                "mean_ms": s["sum_ms"] / s["count"] if s["count"] else 0.0,
+                "p50_ms": percentile(s, 50),
+                "p90_ms": percentile(s, 90),
+                "p99_ms": percentile(s, 99),
+                "max_ms": s["max_ms"],
+            }
+        )
+    return {"since": data.get("since"), "series": rows}
+
+
+def reset_metrics() -> None:
+    with _lock:
+        _pending.clear()
+    try:
+        os.remove(_metrics_path())
+    except FileNotFoundError:
+        pass
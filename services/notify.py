@@ -1,6 +1,7 @@
 # services/notify.py
 from __future__ import annotations
-import requests
+
+from services import http_session, metrics
 
 def send_webhook(url: str, text: str, timeout: tuple[float, float] = (3.0, 10.0)) -> bool:
     """
@@ -20,7 +21,9 @@ def send_webhook(url: str, text: str, timeout: tuple[float, float] = (3.0, 10.0)
         payload = {"content": text}
 
     try:
-        r = requests.post(url, json=payload, headers=headers, timeout=timeout)
+        with metrics.timed("webhook") as rec:
+            r = http_session.post(url, json=payload, headers=headers, timeout=timeout)
+            rec["status"] = r.status_code
         r.raise_for_status()
         return  True
     except Exception:
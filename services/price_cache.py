@@ -0,0 +1,168 @@
+# services/price_cache.py
+# TTL cache in front of CoinGecko /simple/price. CoinGecko refreshes simple
+# prices about once a minute, so `watch`, `alert --watch`, `price` and the
+# daemon share what any of them fetched recently instead of each hitting the
+# network. Entries live in memory and in ~/.crypto_tracker/price_cache.json
+# ({vs: {id: [price, fetched_at, source]}}), so other processes see them too.
+# Only CoinGecko's own prices are cached: a scraped fallback price is served
+# to the caller that fetched it and nobody else.
+#
+# Concurrent requests are coalesced: threads asking for the same missing id
+# set wait on one in-flight fetch, and processes take a file lock per
+# (currency, id set) around fetch-and-store, re-checking the disk cache once
+# they hold it (or once FETCH_LOCK_TIMEOUT_SEC has passed).
+#
+# Optional config.json key:
+#   price_ttl_sec   seconds a price stays fresh (default 60), or per currency:
+#                   {"usd": 30, "eur": 120, "default": 60}; 0 disables caching
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import ExitStack
+
+DEFAULT_TTL_SEC = 60.0
+FETCH_LOCK_TIMEOUT_SEC = 10.0
+
+_lock = threading.Lock()
+_mem: dict = {}  # vs -> {id: (price, fetched_at, source)}
+_inflight: dict = {}  # (vs, ids) -> Future
+
+
+def _cache_path() -> str:
+    from storage.json_store import HOME_DIR
+
+    return os.path.join(HOME_DIR, "price_cache.json")
+
+
+def ttl_for(vs_currency: str) -> float:
+    """Freshness window in seconds for prices in `vs_currency`."""
+    try:
+        from storage.json_store import read_config
+
+        raw = read_config().get("price_ttl_sec", DEFAULT_TTL_SEC)
+        if isinstance(raw, dict):
+            raw = raw.get(str(vs_currency).lower(), raw.get("default", DEFAULT_TTL_SEC))
+        return max(0.0, float(raw))
+    except Exception:
+        return DEFAULT_TTL_SEC
+
+
+def _cacheable(source) -> bool:
+    return source in (None, "coingecko")
+
+
+def _lookup(ids: list, vs: str, ttl: float, now: float) -> tuple[dict, list]:
+    """({id: {vs: price}} fresh within `ttl`, ids still missing); memory first, then disk."""
+    from storage.json_store import read_json_cached
+
+    with _lock:
+        mem = _mem.setdefault(vs, {})
+        fresh, missing = {}, []
+        disk = None
+        for cid in ids:
+            hit = mem.get(cid)
+            if hit is None or now - hit[1] > ttl:
+                if disk is None:
+                    disk = read_json_cached(_cache_path(), {}).get(vs) or {}
+                entry = disk.get(cid)
+                if isinstance(entry, list) and len(entry) in (2, 3):
+                    hit = (entry[0], entry[1], entry[2] if len(entry) == 3 else None)
+                    mem[cid] = hit
+            if hit is not None and not _cacheable(hit[2]):
+                hit = None  # fallback prices are never served from the cache
+            if hit is not None and now - hit[1] <= ttl:
+                fresh[cid] = {vs: hit[0], "source": hit[2]} if hit[2] else {vs: hit[0]}
+            else:
+                missing.append(cid)
+    return fresh, missing
+
+
+def store(prices: dict, vs_currency: str, now: float | None = None) -> None:
+    """Record freshly fetched {id: {vs: price}} from CoinGecko in memory and on disk."""
+    from storage.json_store import read_json_cached, write_json
+    from utils.lock import file_lock
+
+    vs = str(vs_currency).lower()
+    now = time.time() if now is None else now
+    fetched = {
+        cid: (p[vs], now, p.get("source"))
+        for cid, p in prices.items()
+        if isinstance(p, dict)
+        and isinstance(p.get(vs), (int, float))
+        and _cacheable(p.get("source"))
+    }
+    if not fetched:
+        return
+    with _lock:
+        _mem.setdefault(vs, {}).update(fetched)
+    path = _cache_path()
+    try:
+        with file_lock(path + ".lock"):
+            data = {k: dict(v) for k, v in read_json_cached(path, {}).items()}
+            data.setdefault(vs, {}).update({cid: list(hit) for cid, hit in fetched.items()})
+            write_json(path, data)
+    except OSError:
+        pass  # the in-memory copy still serves this process
+
+
+def get_or_fetch(ids: list, vs_currency: str, fetch, max_age: float | None = None) -> dict:
+    """
+    {id: {vs: price}} for `ids`: fresh cached prices plus fetch(missing_ids)
+    for the rest. `fetch` must store() what it got live. `max_age` overrides
+    the configured TTL (0 always fetches).
+    """
+    vs = str(vs_currency).lower()
+    ttl = ttl_for(vs) if max_age is None else max(0.0, float(max_age))
+    if ttl <= 0:
+        return fetch(list(ids))
+    fresh, missing = _lookup(ids, vs, ttl, time.time())
+    if not missing:
+        return fresh
+
+    key = (vs, tuple(sorted(missing)))
+    with _lock:
+        fut = _inflight.get(key)
+        owner = fut is None
+        if owner:
+            fut = _inflight[key] = Future()
+    if not owner:
+        return {**fresh, **fut.result()}
+
+    try:
+        res = _fetch_locked(missing, vs, ttl, fetch)
+        fut.set_result(res)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+    return {**fresh, **res}
+
+
+def _fetch_lock_path(vs: str, ids: list) -> str:
+    key = hashlib.sha1(f"{vs}|{','.join(sorted(ids))}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(os.path.dirname(_cache_path()), "locks", f"prices-{key}.lock")
+
+
+def _fetch_locked(missing: list, vs: str, ttl: float, fetch) -> dict:
+    """
+    fetch(missing) under a cross-process lock for this (vs, id set), skipping
+    ids another process just stored. The lock is waited on for at most
+    FETCH_LOCK_TIMEOUT_SEC; after that the fetch goes ahead uncoalesced.
+    """
+    from utils.lock import file_lock
+
+    with ExitStack() as stack:
+        try:
+            stack.enter_context(
+                file_lock(_fetch_lock_path(vs, missing), timeout=FETCH_LOCK_TIMEOUT_SEC)
+            )
+        except OSError:  # TimeoutError, or an unwritable home
+            pass
+        fresh, still = _lookup(missing, vs, ttl, time.time())
+        return {**fresh, **fetch(still)} if still else fresh
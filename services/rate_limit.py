@@ -0,0 +1,101 @@
+# services/rate_limit.py
+# Token bucket shared by every process on the machine (daemon, watch loops,
+# alert polls, one-off commands) through a small JSON state file guarded by
+# utils.lock.file_lock. A waiting caller reserves its token up front (the
+# balance may go negative), so concurrent processes queue in arrival order,
+# one slot apart, instead of polling the file.
+#
+# The rate adapts AIMD-style: a 429 halves it (down to `min_rate`) and holds
+# every caller until Retry-After has passed, with no tokens accruing meanwhile,
+# so the queue drains at the reduced rate rather than all at once. Each
+# success adds back a tenth of the configured rate.
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from utils.lock import file_lock
+
+
+class RateLimited(RuntimeError):
+    """The next request slot is further away than the caller is willing to wait."""
+
+    def __init__(self, wait: float):
+        super().__init__(f"rate limited: next request slot in {wait:.1f}s")
+        self.wait = wait
+
+
+class TokenBucket:
+    def __init__(self, path: str, rate: float, burst: float = 1.0, min_rate: float | None = None):
+        """`rate` in tokens per second; `burst` is the bucket capacity."""
+        self.path = str(path)
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.min_rate = min(self.rate, float(min_rate) if min_rate else self.rate / 8)
+
+    @contextmanager
+    def _state(self):
+        """Yield (state, now) with the bucket refilled to `now`; saved on clean exit."""
+        with file_lock(self.path + ".lock"):
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    raw = json.load(f)
+            except (OSError, ValueError):
+                raw = {}
+            now = time.time()
+            st = self._refill(raw if isinstance(raw, dict) else {}, now)
+            yield st, now
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(st, f)
+
+    def _refill(self, raw: dict, now: float) -> dict:
+        try:
+            rate = float(raw.get("rate", self.rate))
+            tokens = float(raw.get("tokens", self.burst))
+            updated = float(raw.get("updated", now))
+            blocked = float(raw.get("blocked_until", 0.0))
+        except (TypeError, ValueError):
+            rate, tokens, updated, blocked = self.rate, self.burst, now, 0.0
+        rate = min(self.rate, max(self.min_rate, rate))  # config may have changed
+        accrued = max(0.0, now - max(updated, blocked))  # nothing accrues while blocked
+        tokens = min(self.burst, tokens + accrued * rate)
+        return {"rate": rate, "tokens": tokens, "updated": now, "blocked_until": blocked}
+
+    @staticmethod
+    def _wait(st: dict, now: float) -> float:
+        deficit = max(0.0, 1.0 - st["tokens"]) / st["rate"]
+        return max(0.0, st["blocked_until"] - now) + deficit
+
+    def expected_wait(self) -> float:
+        """Seconds until a request could go out, without taking a token."""
+        with self._state() as (st, now):
+            return self._wait(st, now)
+
+    def acquire(self, max_wait: float | None = None) -> float:
+        """
+        Take a token, sleeping until it is due; returns the seconds waited.
+        Raises RateLimited (taking nothing) if that would exceed `max_wait`.
+        """
+        with self._state() as (st, now):
+            wait = self._wait(st, now)
+            if max_wait is not None and wait > max_wait:
+                raise RateLimited(wait)
+            st["tokens"] -= 1.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, retry_after: float = 0.0) -> None:
+        """Record a 429: halve the rate and hold everyone until Retry-After."""
+        with self._state() as (st, now):
+            st["rate"] = max(self.min_rate, st["rate"] / 2)
+            st["tokens"] = min(st["tokens"], 1.0)  # one caller goes first, the rest queue
+            st["blocked_until"] = max(st["blocked_until"], now + max(0.0, retry_after))
+
+    def reward(self) -> None:
+        """Record a success: step the rate back towards the configured one."""
+        with self._state() as (st, now):
+            st["rate"] = min(self.rate, st["rate"] + self.rate / 10)
+
@@ -0,0 +1,87 @@
+# storage/backend.py
+# Interface shared by the snapshot storage engines.
+#
+# storage.json_store keeps its module-level API (append_snapshot_line,
+# read_last_snapshots, rebuild_daily_rollups, ...) and forwards each call to
+# the engine selected by "storage_backend" in config.json:
+#   "jsonl"  -> json_store.JsonlBackend (default; snapshots.jsonl + sidecars)
+#   "sqlite" -> sqlite_store.SqliteBackend (WAL-mode snapshots.db)
+from abc import ABC, abstractmethod
+
+
+class SnapshotBackend(ABC):
+    """Snapshot + daily-rollup storage engine. Time bounds are epoch milliseconds."""
+
+    name = "base"
+
+    @abstractmethod
+    def append_snapshots(self, objs: list[dict]) -> None:
+        """Persist snapshots (in order) and fold them into the daily rollups."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_last_snapshots(self, n: int) -> list[dict]:
+        raise NotImplementedError
+
+    def read_last_totals(self, n: int) -> list[float]:
+        return [float(r.get("total_value", 0.0)) for r in self.read_last_snapshots(n)]
+
+    @abstractmethod
+    def read_snapshots_range(self, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def snapshot_at(self, at_ms: int) -> dict | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def rebuild_daily_rollups(self) -> dict:
+        """Recompute daily rollups, and the other tiers with them; returns {"days", "snapshots"}."""
+        raise NotImplementedError
+
+    def refresh_daily_rollups(self) -> dict:
+        """Bring rollups up to date; engines may do less than a full rebuild."""
+        return {**self.rebuild_daily_rollups(), "incremental": False}
+
+    @abstractmethod
+    def read_last_daily(self, n: int) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_daily_all(self) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_rollups(self, tier: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        """Rows of rollup `tier` (see storage/rollup_tiers.py) overlapping the bounds."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_last_rollups(self, tier: str, n: int) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def rebuild_rollup_tiers(self) -> dict:
+        """Recompute the non-daily tiers; returns {"snapshots", <tier>: rows, ...}."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_coin_daily(self, coin: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        """Daily price rollups of one coin id (rebuild_daily_rollups() maintains them too)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_last_coin_daily(self, coin: str, n: int) -> list[dict]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def rollup_coins(self) -> list[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def change_token(self):
+        """Cheap value that changes whenever snapshots are appended (e.g. by another process)."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,187 @@
+# storage/columnar.py
+# Binary columnar companion store for snapshot analytics.
+#
+# One fixed-width file per column, in native byte order:
+#   ts.i64          epoch microseconds (int64)
+#   total.f64       total_value (float64)
+#   vs.u8           index into meta["currencies"]
+#   price.<n>.f64   one float64 column per coin id (NaN where the coin is absent)
+#
+# meta.json maps coin ids to column files and records which JSONL position the
+# columns are synced to. The ts column is written last, so its length is the
+# committed row count; longer columns are trimmed on the next append.
+import array
+import io
+import json
+import math
+import mmap
+import os
+import sys
+import tempfile
+
+META_NAME = "meta.json"
+TS_NAME = "ts.i64"
+TOTAL_NAME = "total.f64"
+VS_NAME = "vs.u8"
+_VERSION = 1
+_NAN = float("nan")
+
+
+def _path(base: str, name: str) -> str:
+    return os.path.join(base, name)
+
+
+def read_meta(base: str) -> dict | None:
+    path = _path(base, META_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except Exception:
+        return None
+    if meta.get("v") != _VERSION or meta.get("byteorder") != sys.byteorder:
+        return None
+    return meta
+
+
+def write_meta(base: str, meta: dict) -> None:
+    os.makedirs(base, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=base, prefix=".tmp-", text=True)
+    try:
+        with io.open(fd, "w", encoding="utf-8") as f:
+            f.write(json.dumps(meta))
+        os.replace(tmp, _path(base, META_NAME))
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def new_meta() -> dict:
+    return {"v": _VERSION, "byteorder": sys.byteorder, "coins": {}, "currencies": []}
+
+
+def row_count(base: str) -> int:
+    try:
+        return os.path.getsize(_path(base, TS_NAME)) // 8
+    except OSError:
+        return 0
+
+
+def _fit(path: str, nbytes: int, fill: bytes) -> None:
+    """Make `path` exactly `nbytes` long: trim torn appends or pad new columns."""
+    size = os.path.getsize(path) if os.path.exists(path) else -1
+    if size == nbytes:
+        return
+    with open(path, "ab" if size >= 0 else "wb") as f:
+        if size > nbytes:
+            f.truncate(nbytes)
+        elif size < nbytes:
+            pad = max(0, size)
+            f.write(fill * ((nbytes - pad) // len(fill)))
+
+
+def append_rows(base: str, meta: dict, rows: list[tuple[int, float, str, dict]]) -> dict:
+    """
+    Append rows of (ts_us, total, vs_currency, {coin_id: price}) to the columns.
+    Coins seen for the first time get a new column back-filled with NaN.
+    Returns the (mutated) meta; the caller persists it with write_meta().
+    """
+    os.makedirs(base, exist_ok=True)
+    n = row_count(base)
+    nan_bytes = array.array("d", [_NAN]).tobytes()
+
+    coins: dict = meta.setdefault("coins", {})
+    currencies: list = meta.setdefault("currencies", [])
+    for _, _, vs, prices in rows:
+        if vs not in currencies:
+            currencies.append(vs)
+        for cid in prices or {}:
+            if cid not in coins:
+                coins[cid] = f"price.{len(coins)}.f64"
+
+    # bring every column to the committed length before appending
+    _fit(_path(base, TOTAL_NAME), n * 8, nan_bytes)
+    _fit(_path(base, VS_NAME), n, b"\0")
+    for fname in coins.values():
+        _fit(_path(base, fname), n * 8, nan_bytes)
+
+    for cid, fname in coins.items():
+        col = array.array("d")
+        for _, _, _, prices in rows:
+            val = (prices or {}).get(cid)
+            try:
+                col.append(_NAN if val is None else float(val))
+            except (TypeError, ValueError):
+                col.append(_NAN)
+        with open(_path(base, fname), "ab") as f:
+            col.tofile(f)
+    with open(_path(base, TOTAL_NAME), "ab") as f:
+        array.array("d", [r[1] for r in rows]).tofile(f)
+    with open(_path(base, VS_NAME), "ab") as f:
+        f.write(bytes(currencies.index(r[2]) for r in rows))
+    # ts last: it commits the rows
+    with open(_path(base, TS_NAME), "ab") as f:
+        array.array("q", [r[0] for r in rows]).tofile(f)
+    return meta
+
+
+class ColumnSet:
+    """
+    Read-only, zero-copy view of the columns via mmap.
+
+    Attributes are memoryviews (`ts`: int64, `total`: float64, `vs`: uint8 codes,
+    `prices[coin_id]`: float64), all exactly `rows` long. Use as a context
+    manager, or call close(), before the files are rewritten.
+    """
+
+    def __init__(self, base: str, meta: dict, coins: list[str] | None = None):
+        self.base = base
+        self.meta = meta
+        self.rows = row_count(base)
+        self.currencies = list(meta.get("currencies", []))
+        self._held: list = []
+        self.ts = self._map(TS_NAME, "q", 8)
+        self.total = self._map(TOTAL_NAME, "d", 8)
+        self.vs = self._map(VS_NAME, "B", 1)
+        wanted = meta.get("coins", {}) if coins is None else coins
+        self.prices = {
+            cid: self._map(meta["coins"][cid], "d", 8) for cid in wanted if cid in meta["coins"]
+        }
+
+    def _map(self, name: str, fmt: str, itemsize: int) -> memoryview:
+        nbytes = self.rows * itemsize
+        if nbytes == 0:
+            return memoryview(b"").cast(fmt)
+        with open(_path(self.base, name), "rb") as f:
+            mm = mmap.mmap(f.fileno(), nbytes, access=mmap.ACCESS_READ)
+        raw = memoryview(mm)
+        view = raw.cast(fmt)
+        self._held.append((mm, raw, view))
+        return view
+
+    def numpy(self, view: memoryview):
+        """Wrap a column as a NumPy array without copying (requires numpy)."""
+        import numpy as np
+
+        return np.frombuffer(view, dtype=view.format)
+
+    def coin_has_data(self, cid: str, lo: int = 0, hi: int | None = None) -> bool:
+        col = self.prices.get(cid)
+        if col is None:
+            return False
+        return any(not math.isnan(v) for v in col[lo:hi])
+
+    def close(self) -> None:
+        for mm, raw, view in reversed(self._held):
+            view.release()
+            raw.release()
+            mm.close()
+        self._held = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
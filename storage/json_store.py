@@ -1,10 +1,22 @@
 # storage/json_store.py
+import bisect
+import copy
+import gzip
 import io
 import json
+import lzma
 import os
+import re
+import shutil
 import tempfile
-from datetime import datetime, timezone
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from typing import Any, Dict
+from urllib.parse import quote, unquote
+
+from storage import columnar, rollup_tiers, snapshot_codec
+from storage.backend import SnapshotBackend
 
 HOME_DIR = os.path.expanduser("~/.crypto_tracker")
 CACHE_PATH = os.path.join(HOME_DIR, "cache.json")
@@ -36,6 +48,7 @@ def _atomic_write_text(path: str, text: str):
 
 def write_json(path: str, data: Dict[str, Any]):
     _atomic_write_text(path, json.dumps(data, ensure_ascii=False))
+    _json_cache.pop(os.fspath(path), None)
 
 
 def read_json(path: str, default: Dict[str, Any] | None = None) -> Dict[str, Any]:
@@ -45,34 +58,173 @@ def read_json(path: str, default: Dict[str, Any] | None = None) -> Dict[str, Any
         return json.load(f)
 
 
+# Config, portfolio, alerts and cache.json are read on every command and
+# daemon cycle. read_json_cached() keeps each file's parsed contents, checked
+# against (st_mtime_ns, st_size, st_ino) on every call: an edit, or an atomic
+# replace by another process, is seen on the next read. The parsed object is
+# shared between callers; copy it before changing it.
+_json_cache: Dict[str, tuple] = {}
+
+
+def read_json_cached(path, default: Dict[str, Any] | None = None) -> Dict[str, Any]:
+    """read_json() that only re-parses `path` after it changed on disk."""
+    key = os.fspath(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        _json_cache.pop(key, None)
+        return default or {}
+    stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+    hit = _json_cache.get(key)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    data = read_json(key, default)
+    _json_cache[key] = (stamp, data)
+    return data
+
+
 def write_cache(last_prices: Dict[str, Any], last_fetch_ts: str):
     write_json(CACHE_PATH, {"last_prices": last_prices, "last_fetch_ts": last_fetch_ts})
 
 
 def read_cache() -> Dict[str, Any]:
-    return read_json(CACHE_PATH, {"last_prices": {}, "last_fetch_ts": None})
+    return dict(read_json_cached(CACHE_PATH, {"last_prices": {}, "last_fetch_ts": None}))
 
 
 def append_snapshot_line(obj: dict) -> None:
-    """Append a single JSON line to snapshots.jsonl (atomic best-effort)."""
+    """Append a snapshot via the configured storage backend (best-effort)."""
     ensure_home()
-    # write the snapshot
-    line = json.dumps(obj, ensure_ascii=False)
     try:
-        # create parent dir
-        os.makedirs(os.path.dirname(SNAPSHOTS_PATH), exist_ok=True)
-        with open(SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
-            f.write(line + "\n")
+        get_backend().append_snapshots([obj])
     except Exception:
         # swallow errors to avoid crashing the caller; snapshot loss is acceptable
         pass
 
-    # NEW: incrementally update today's daily rollup
+
+def _jsonl_append_snapshot_line(obj: dict) -> None:
+    """Append a single JSON line to snapshots.jsonl (atomic best-effort)."""
+    appender = _HotFileAppender()
+    try:
+        _jsonl_append_snapshots([obj], appender, _snapshot_durability())
+    finally:
+        appender.close()
+
+
+DURABILITY_POLICIES = ("none", "batch", "line")
+
+
+def _snapshot_durability() -> str:
+    """fsync policy for snapshot appends (config "snapshot_durability"; default "batch")."""
+    try:
+        policy = str(read_config().get("snapshot_durability", "batch")).lower()
+    except Exception:
+        policy = "batch"
+    return policy if policy in DURABILITY_POLICIES else "batch"
+
+
+class _HotFileAppender:
+    """One long-lived append handle on the hot file, reopened if it was sealed or replaced."""
+
+    def __init__(self):
+        self._f = None
+        self._key = None
+
+    def handle(self):
+        path = str(SNAPSHOTS_PATH)
+        key = (path, _file_ino(path))
+        if self._f is None or key != self._key:
+            self.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # unbuffered: the roll/encode checks below read the file between writes
+            self._f = open(path, "ab", buffering=0)
+            self._key = (path, _file_ino(path))
+        return self._f
+
+    def close(self) -> None:
+        if self._f is not None:
+            try:
+                self._f.close()
+            except Exception:
+                pass
+        self._f = None
+        self._key = None
+
+
+def _jsonl_append_snapshots(objs: list[dict], appender: _HotFileAppender, durability: str) -> None:
+    """
+    Append snapshots to snapshots.jsonl through `appender` (best-effort).
+    Consecutive snapshots of the same UTC day go out in a single write; with
+    durability "line" every line is fsynced, with "batch" every such write.
+    """
+    written = []  # (obj, record, offset, end)
+    run: list[dict] = []
+    for obj in objs:
+        if run and _date_utc(str(obj.get("ts", ""))) != _date_utc(str(run[-1].get("ts", ""))):
+            written += _jsonl_write_run(run, appender, durability)
+            run = []
+        run.append(obj)
+    if run:
+        written += _jsonl_write_run(run, appender, durability)
+
+    # keep the sparse timestamp index and the columnar store in step with the file
+    for obj, record, offset, end in written:
+        try:
+            if snapshot_codec.is_full(record):
+                # repeat lines can't be decoded on their own, so never index them
+                _index_note_append(SNAPSHOTS_PATH, offset, obj.get("ts"))
+        except Exception:
+            pass
+        try:
+            _columns_note_append(obj, offset, end)
+        except Exception:
+            pass
+
+    # incrementally update the daily rollup
+    for obj in objs:
+        try:
+            upsert_daily_from_snapshot(obj)
+        except Exception:
+            # do not fail the caller if rollup update has an issue
+            pass
+
+
+def _jsonl_write_run(run: list[dict], appender: _HotFileAppender, durability: str) -> list:
+    """Write snapshots of one UTC day; returns (obj, record, offset, end) per line written."""
     try:
-        upsert_daily_from_snapshot(obj)
+        _maybe_roll_segment(run[0])
     except Exception:
-        # do not fail the caller if rollup update has an issue
+        # partitioning is an optimisation; keep appending to the hot file regardless
         pass
+    records = list(run)
+    try:
+        if _snapshot_format() >= snapshot_codec.FORMAT_VERSION:
+            records = _encode_run_for_hot(run)
+    except Exception:
+        records = list(run)  # fall back to plain v1 lines
+    # write the snapshots, head fields first so scans can use project_snapshot()'s fast path
+    lines = [
+        (json.dumps(_ordered_snapshot(rec), ensure_ascii=False) + "\n").encode("utf-8")
+        for rec in records
+    ]
+    out = []
+    try:
+        f = appender.handle()
+        offset = f.seek(0, os.SEEK_END)
+        if durability == "line":
+            for data in lines:
+                f.write(data)
+                os.fsync(f.fileno())
+        else:
+            f.write(b"".join(lines))
+            if durability == "batch":
+                os.fsync(f.fileno())
+        for obj, rec, data in zip(run, records, lines):
+            out.append((obj, rec, offset, offset + len(data)))
+            offset += len(data)
+    except Exception:
+        # swallow errors to avoid crashing the caller; snapshot loss is acceptable
+        appender.close()
+    return out
 
 
 def read_config() -> Dict[str, Any]:
@@ -82,282 +234,2816 @@ def read_config() -> Dict[str, Any]:
         "update_interval_sec": 600,
         "symbols_map": {"btc": "bitcoin", "eth": "ethereum", "ada": "cardano"},
     }
-    disk = read_json(CONFIG_PATH, {})
+    # fresh top level; nested values are the cached ones, so replace rather than edit them
+    disk = read_json_cached(CONFIG_PATH, {})
     cfg.update(disk)
     return cfg
 
 
-def read_last_snapshots(n: int = 10):
-    ensure_home()
-    path = SNAPSHOTS_PATH
-    if not os.path.exists(path):
+# ---- Tail reads ----
+
+TAIL_BLOCK_SIZE = 64 * 1024
+
+# sealed segments may be stored compressed (see compact_segments); the codec is
+# recognised from the file extension so readers stream them transparently
+SEGMENT_CODECS = {"gzip": ".gz", "xz": ".xz"}
+
+
+def _codec_of(path) -> str | None:
+    p = str(path)
+    for codec, ext in SEGMENT_CODECS.items():
+        if p.endswith(ext):
+            return codec
+    return None
+
+
+def _open_codec(path, codec: str | None, mode: str = "rb", **kw):
+    if codec == "gzip":
+        return gzip.open(path, mode, **kw)
+    if codec == "xz":
+        return lzma.open(path, mode, **kw)
+    return open(path, mode, **kw)
+
+
+def _open_snapshot_file(path, mode: str = "rb", **kw):
+    """open() for snapshot files, decompressing .gz/.xz segments on the fly."""
+    return _open_codec(path, _codec_of(path), mode, **kw)
+
+
+def _iter_lines_reversed(path, block_size: int | None = None):
+    """
+    Yield (offset, raw_line) pairs from the end of `path` towards the start.
+
+    Reads fixed-size blocks backwards, so memory is bounded by the block size
+    plus the longest line. Blank lines are skipped; the newline is stripped.
+    """
+    block_size = block_size or TAIL_BLOCK_SIZE
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        carry = b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            buf = f.read(step) + carry
+            parts = buf.split(b"\n")
+            # parts[0] may be the tail of a line that starts in an earlier block
+            carry = parts[0]
+            off = pos + len(carry) + 1
+            tail = []
+            for part in parts[1:]:
+                tail.append((off, part))
+                off += len(part) + 1
+            for off, part in reversed(tail):
+                if part.strip():
+                    yield off, part
+        if carry.strip():
+            yield 0, carry
+
+
+def _tail_json(path, n: int, fields: tuple | None = None) -> list[dict]:
+    """
+    Decode the last `n` JSON lines of `path` (chronological order).
+
+    Only the tail of the file is read. Undecodable lines (e.g. a torn final
+    write from a crashed process) are skipped rather than counted. With
+    `fields`, rows are projections (see project_snapshot).
+    """
+    if n <= 0 or not os.path.exists(path):
         return []
-    # efficient-ish tail read
+    if fields is None or not _HEAD_FIELD_SET.issuperset(fields):
+        return _tail_snapshots(path, n, fields)
+    if _codec_of(path):
+        # compressed streams can't be read backwards; keep a bounded window instead
+        return _tail_json_forward(path, n, fields)
     out = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
+    for _, raw in _iter_lines_reversed(path):
+        row = _decode_line(raw, fields)
+        if row is None:
+            continue
+        out.append(row)
+        if len(out) >= n:
+            break
+    out.reverse()
+    return out
+
+
+def _tail_snapshots(path, n: int, fields: tuple | None = None) -> list[dict]:
+    """Full-decode tail: v2 repeat lines are expanded from the full line before them."""
+    if _codec_of(path):
+        window: deque = deque()
+        seed = None
+        for _, raw in _iter_lines_from(path):
+            if len(window) == n + 8:  # slack for undecodable lines
+                old = window.popleft()
+                if not snapshot_codec.is_repeat_line(old):
+                    seed = old
+            window.append(raw)
+        raws = ([seed] if seed is not None else []) + list(window)
+    else:
+        raws, good = [], 0
+        for _, raw in _iter_lines_reversed(path):
+            raws.append(raw)
+            if _decode_line(raw) is None:
                 continue
-            out.append(json.loads(line))
-    return out[-n:]
+            good += 1
+            if good >= n and not snapshot_codec.is_repeat_line(raw):
+                break
+        raws.reverse()
+    dec = _SnapshotDecoder()
+    out = [row for row in (dec.feed(raw) for raw in raws) if row is not None][-n:]
+    if fields is not None:
+        out = [{f: row[f] for f in fields if f in row} for row in out]
+    return out
 
 
-# ---- Config helpers ----
+def _tail_json_forward(path, n: int, fields: tuple | None = None) -> list[dict]:
+    window: deque = deque(maxlen=n + 8)  # slack for undecodable lines
+    for _, raw in _iter_lines_from(path):
+        window.append(raw)
+    out = []
+    for raw in reversed(window):
+        row = _decode_line(raw, fields)
+        if row is None:
+            continue
+        out.append(row)
+        if len(out) >= n:
+            break
+    out.reverse()
+    return out
 
-DEFAULT_CONFIG = {
-    "vs_currency": "usd",
-    "update_interval_sec": 600,
-    "symbols_map": {"btc": "bitcoin", "eth": "ethereum", "ada": "cardano"},
-}
 
+def _tail_json_sources(paths: list[str], n: int, fields: tuple | None = None) -> list[dict]:
+    """Like _tail_json, but continues into earlier files when the last one runs short."""
+    out: list[dict] = []
+    for path in reversed(paths):
+        need = n - len(out)
+        if need <= 0:
+            break
+        out = _tail_json(path, need, fields) + out
+    return out
 
-def write_config(cfg: dict):
-    """Atomic write of config.json."""
-    # keep only known top-level keys; ignore accidental extras
-    clean = {
-        "vs_currency": cfg.get("vs_currency", DEFAULT_CONFIG["vs_currency"]),
-        "update_interval_sec": int(
-            cfg.get("update_interval_sec", DEFAULT_CONFIG["update_interval_sec"])
-        ),
-        "symbols_map": dict(cfg.get("symbols_map", DEFAULT_CONFIG["symbols_map"])),
-    }
-    write_json(CONFIG_PATH, clean)
 
+def read_last_snapshots(n: int = 10):
+    ensure_home()
+    return get_backend().read_last_snapshots(n)
 
-def ensure_config_exists():
-    """Create config.json with defaults if missing."""
-    if not os.path.exists(CONFIG_PATH):
-        write_config(DEFAULT_CONFIG.copy())
 
+def _jsonl_read_last_snapshots(n: int) -> list[dict]:
+    return _tail_json_sources(_snapshot_sources(), n)
 
-# ---- Alerts (optional persistence) ----
-ALERTS_PATH = os.path.join(HOME_DIR, "alerts.json")
 
+def _iter_lines_from(path, offset: int = 0):
+    """
+    Yield (offset, raw_line) pairs reading forward from byte `offset`.
+    Offsets are positions in the uncompressed stream for .gz/.xz segments.
+    """
+    with _open_snapshot_file(path) as f:
+        if offset:
+            f.seek(offset)
+        off = offset
+        for raw in f:
+            if raw.strip():
+                yield off, raw
+            off += len(raw)
+
+
+# ---- Field projection ----
+#
+# Aggregate scans (rollups, the outlier guard, the ts index) only need ts and
+# total_value, yet json.loads would build every nested price/position object.
+# append_snapshot_line writes those head fields first, in a fixed order and
+# with json.dumps' default separators, so they can be cut out of the line
+# prefix with one regex. Lines in any other layout (older history, hand
+# edits) fall back to a full decode.
+
+SNAPSHOT_HEAD_FIELDS = ("ts", "total_value", "vs_currency")
+_HEAD_FIELD_SET = frozenset(SNAPSHOT_HEAD_FIELDS)
+_HEAD_RE = re.compile(
+    rb'\s*\{"ts": "([^"\\]*)", "total_value": (-?\d+(\.\d+)?([eE][+-]?\d+)?)'
+    rb'(?:, "vs_currency": "([^"\\]*)")?[,}]'
+)
+
+
+def _ordered_snapshot(obj: dict) -> dict:
+    """`obj` with SNAPSHOT_HEAD_FIELDS moved to the front (values unchanged)."""
+    head = {k: obj[k] for k in SNAPSHOT_HEAD_FIELDS if k in obj}
+    return {**head, **obj}
+
+
+def project_snapshot(raw: bytes, fields: tuple) -> dict | None:
+    """
+    Decode only `fields` from one raw snapshot line; None if the line is not
+    valid JSON. Missing fields are omitted, as with a full decode.
+    """
+    if _HEAD_FIELD_SET.issuperset(fields):
+        m = _HEAD_RE.match(raw)
+        # balanced braces guard against torn lines that kept an intact prefix
+        if (
+            m is not None
+            and raw.rstrip().endswith(b"}")
+            and raw.count(b"{") == raw.count(b"}")
+        ):
+            ts, total, frac, exp, vs = m.groups()
+            if vs is not None or "vs_currency" not in fields:
+                out = {}
+                for f in fields:
+                    if f == "ts":
+                        out["ts"] = ts.decode("utf-8")
+                    elif f == "total_value":
+                        out["total_value"] = float(total) if frac or exp else int(total)
+                    else:
+                        out["vs_currency"] = vs.decode("utf-8")
+                return out
+    try:
+        row = json.loads(raw)
+    except Exception:
+        return None
+    if not isinstance(row, dict):
+        return None
+    return {f: row[f] for f in fields if f in row}
 
-def read_alerts():
-    return read_json(ALERTS_PATH, {"saved": {}})
 
+def _decode_line(raw: bytes, fields: tuple | None = None) -> dict | None:
+    if fields is not None:
+        return project_snapshot(raw, fields)
+    try:
+        return json.loads(raw)
+    except Exception:
+        return None
 
-def write_alerts(data: dict):
-    write_json(ALERTS_PATH, data)
 
+def iter_snapshot_fields(fields: tuple, paths: list[str] | None = None):
+    """Yield projections of every snapshot (sealed segments first, then the hot file)."""
+    head_only = _HEAD_FIELD_SET.issuperset(fields)
+    for path in paths if paths is not None else _snapshot_sources():
+        if not os.path.exists(path):
+            continue
+        if not head_only:
+            for _, _, snap in _iter_snapshots(path):
+                yield {f: snap[f] for f in fields if f in snap}
+            continue
+        for _, raw in _iter_lines_from(path):
+            row = project_snapshot(raw, fields)
+            if row is not None:
+                yield row
 
-# ---- Daily rollups ----
 
-SNAPSHOTS_DAY_PATH = os.path.join(HOME_DIR, "snapshots_day.jsonl")
+# ---- Compact snapshot format (v2, see storage/snapshot_codec.py) ----
 
 
-def _date_utc(ts_iso: str) -> str:
-    # ts like "2025-10-08T15:22:01.123456+00:00" -> "2025-10-08"
+def _snapshot_format() -> int:
+    """Line format for new snapshots (config "snapshot_format": 1 or 2; default 2)."""
     try:
-        dt = datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
+        return int(read_config().get("snapshot_format", snapshot_codec.FORMAT_VERSION))
     except Exception:
-        # fallback: treat unknown as UTC now, but avoid crash
-        dt = datetime.now(timezone.utc)
-    return dt.astimezone(timezone.utc).date().isoformat()
+        return snapshot_codec.FORMAT_VERSION
 
-def _read_all_daily_records() -> list[dict]:
-    """Load all daily rollup rows from snapshots_day.jsonl (may return [])."""
-    ensure_home()
-    if not os.path.exists(SNAPSHOTS_DAY_PATH):
-        return []
+
+def _portfolio_refs_path() -> str:
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_PATH)), "snapshot_portfolios.jsonl")
+
+
+_portfolio_refs_cache: dict = {}
+
+
+def _portfolio_refs() -> dict:
+    """pf ref -> portfolio positions, from snapshot_portfolios.jsonl (cached by size)."""
+    path = _portfolio_refs_path()
+    size = _file_size(path)
+    if size < 0:
+        return {}
+    cached = _portfolio_refs_cache.get(path)
+    if cached is not None and cached[0] == size:
+        return cached[1]
+    refs = {}
+    for _, raw in _iter_lines_from(path):
+        try:
+            rec = json.loads(raw)
+            refs[rec["ref"]] = rec["positions"]
+        except Exception:
+            continue
+    _portfolio_refs_cache[path] = (size, refs)
+    return refs
+
+
+def _remember_portfolio(positions: list) -> None:
+    ref = snapshot_codec.portfolio_ref(positions)
+    if ref in _portfolio_refs():
+        return
+    path = _portfolio_refs_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"ref": ref, "positions": positions}, ensure_ascii=False) + "\n")
+
+
+def _last_full_record(path) -> dict | None:
+    """Last decodable non-repeat record of `path`, as stored."""
+    if not os.path.exists(path):
+        return None
+    for _, raw in _iter_lines_reversed(path):
+        if snapshot_codec.is_repeat_line(raw):
+            continue
+        rec = _decode_line(raw)
+        if isinstance(rec, dict):
+            return rec
+    return None
+
+
+def _encode_run_for_hot(objs: list[dict]) -> list[dict]:
+    """v2 records for appending `objs` to the hot file (registers their portfolio state)."""
+    positions = None
+    if any("positions" in obj for obj in objs):
+        positions = read_json_cached(PORTFOLIO_PATH, {"positions": []}).get("positions")
+    prev = _last_full_record(SNAPSHOTS_PATH)
     out = []
-    with open(SNAPSHOTS_DAY_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                out.append(json.loads(line))
-            except Exception:
-                pass
+    for obj in objs:
+        record, remember = snapshot_codec.encode(obj, prev, positions)
+        if remember is not None:
+            # before the line that references it, so readers never see a dangling pf
+            _remember_portfolio(remember)
+        if snapshot_codec.is_full(record):
+            prev = record
+        out.append(record)
     return out
 
 
-def _write_all_daily_records(rows: list[dict]) -> None:
-    """Rewrite snapshots_day.jsonl with the provided rows (atomic)."""
-    lines = [json.dumps(r, ensure_ascii=False) for r in rows]
-    _atomic_write_text(SNAPSHOTS_DAY_PATH, "\n".join(lines) + ("\n" if lines else ""))
+class _SnapshotDecoder:
+    """Decodes the stored lines of one file in order, remembering the base for repeats."""
+
+    def __init__(self):
+        self._base_raw: bytes | None = None
+        self._refs: dict | None = None
+
+    def feed(self, raw: bytes, want: bool = True) -> dict | None:
+        repeat = snapshot_codec.is_repeat_line(raw)
+        out = self._decode(raw, repeat) if want else None
+        if not repeat:
+            self._base_raw = raw
+        return out
+
+    def _decode(self, raw: bytes, repeat: bool) -> dict | None:
+        rec = _decode_line(raw)
+        if not isinstance(rec, dict):
+            return None
+        if rec.get("v") != snapshot_codec.FORMAT_VERSION:
+            return rec
+        if self._refs is None:
+            self._refs = _portfolio_refs()
+        base = _decode_line(self._base_raw) if repeat and self._base_raw is not None else None
+        try:
+            return snapshot_codec.decode(rec, base, self._refs)
+        except Exception:
+            return None
 
 
-def upsert_daily_from_snapshot(snapshot: dict) -> None:
-    """
-    Incrementally update the daily rollup for the date of `snapshot`.
-    snapshot must contain: ts (ISO-8601), total_value (float).
-    Fields maintained per-day: open, close, high, low, avg, count.
-    """
-    ensure_home()
-    # derive date + total (guard but don't crash)
-    d = _date_utc(str(snapshot.get("ts", "")))
+def _expand_repeat_line(raw: bytes, base_raw: bytes) -> bytes:
+    """Rewrite a v2 repeat line as a full (still v2) line, given its base line."""
+    rec, base = _decode_line(raw), _decode_line(base_raw)
+    if not isinstance(rec, dict) or not isinstance(base, dict):
+        return raw
+    base.update({k: rec[k] for k in SNAPSHOT_HEAD_FIELDS if k in rec})
+    return (json.dumps(_ordered_snapshot(base), ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _iter_snapshots(path, offset: int = 0):
+    """Yield (offset, raw, snapshot) from `offset`, which must start a full line."""
+    dec = _SnapshotDecoder()
+    for off, raw in _iter_lines_from(path, offset):
+        snap = dec.feed(raw)
+        if snap is not None:
+            yield off, raw, snap
+
+
+# ---- Snapshot index (sparse ts -> byte offset sidecar) ----
+
+INDEX_STRIDE_BYTES = 64 * 1024
+_INDEX_VERSION = 1
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _index_path(path=None) -> str:
+    return str(path if path is not None else SNAPSHOTS_PATH) + ".idx"
+
+
+def _ts_ms(ts) -> int | None:
+    """ISO-8601 timestamp -> epoch milliseconds (naive values are taken as UTC)."""
     try:
-        total = float(snapshot.get("total_value", 0.0))
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
     except Exception:
-        total = 0.0
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(milliseconds=1)
 
-    rows = _read_all_daily_records()
-
-    # find existing record for this date
-    idx = next((i for i, r in enumerate(rows) if r.get("date") == d), None)
 
-    if idx is None:
-        # first observation for the day
-        rec = {
-            "date": d,
-            "open": total,
-            "close": total,
-            "high": total,
-            "low": total,
-            "avg": total,
-            "count": 1,
-        }
-        rows.append(rec)
-    else:
-        rec = rows[idx]
-        # recompute fields (avg via weighted running sum)
-        cnt = int(rec.get("count", 0))
-        prev_sum = float(rec.get("avg", 0.0)) * max(cnt, 0)
-        cnt += 1
-        new_sum = prev_sum + total
-        rec.update(
-            {
-                "close": total,
-                "high": max(float(rec.get("high", total)), total),
-                "low": min(float(rec.get("low", total)), total),
-                "avg": (new_sum / cnt) if cnt else total,
-                "count": cnt,
-            }
-        )
-        rows[idx] = rec
+def _ts_us(ts) -> int | None:
+    """ISO-8601 timestamp -> epoch microseconds (naive values are taken as UTC)."""
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except Exception:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1)
 
-    # keep file sorted by date (ascending)
-    rows.sort(key=lambda r: r.get("date", ""))
 
-    _write_all_daily_records(rows)
+def _iso_from_us(us: int) -> str:
+    return (_EPOCH + timedelta(microseconds=int(us))).isoformat()
 
-def rebuild_daily_rollups():
-    """Rebuild snapshots_day.jsonl from snapshots.jsonl (idempotent)."""
-    ensure_home()
-    if not os.path.exists(SNAPSHOTS_PATH):
-        # nothing to do
-        _atomic_write_text(SNAPSHOTS_DAY_PATH, "")
-        return {"days": 0, "snapshots": 0}
 
-    # Aggregate in-memory per date
-    per_day = {}  # date -> dict
-    total_snapshots = 0
-    with open(SNAPSHOTS_PATH, "r", encoding="utf-8") as f:
+def _bound_ms(value, end: bool = False) -> int | None:
+    """
+    Parse a range bound: a YYYY-MM-DD date or a full ISO timestamp.
+    Bare dates cover the whole UTC day (start of day, or last ms when `end`).
+    """
+    if value is None or value == "":
+        return None
+    s = str(value).strip()
+    if len(s) == 10:
+        ms = _ts_ms(s + "T00:00:00+00:00")
+        if ms is None:
+            raise ValueError(f"Invalid date '{value}' (expected YYYY-MM-DD).")
+        return ms + 86_400_000 - 1 if end else ms
+    ms = _ts_ms(s)
+    if ms is None:
+        raise ValueError(f"Invalid timestamp '{value}' (expected ISO-8601).")
+    return ms
+
+
+def _file_ino(path) -> int:
+    try:
+        return int(os.stat(path).st_ino)
+    except OSError:
+        return 0
+
+
+def _index_note_append(path, offset: int, ts) -> None:
+    """Record (ts, offset) for the line just written at `offset`, every stride bytes."""
+    ms = _ts_ms(ts)
+    if ms is None:
+        return
+    ipath = _index_path(path)
+    if not os.path.exists(ipath):
+        if offset != 0:
+            # pre-existing history without an index: built lazily on first range read
+            return
+        header = {"v": _INDEX_VERSION, "stride": INDEX_STRIDE_BYTES, "ino": _file_ino(path)}
+        _atomic_write_text(ipath, json.dumps(header) + "\n" + json.dumps([ms, 0]) + "\n")
+        return
+    _, last = _last_json_record(ipath)
+    if not isinstance(last, list) or offset - int(last[1]) < INDEX_STRIDE_BYTES:
+        return
+    with open(ipath, "a", encoding="utf-8") as f:
+        f.write(json.dumps([ms, offset]) + "\n")
+
+
+def _load_index(path) -> list[list[int]] | None:
+    """Return index entries for `path`, or None if the index is missing or stale."""
+    ipath = _index_path(path)
+    if not os.path.exists(ipath) or not os.path.exists(path):
+        return None
+    entries = []
+    with open(ipath, "r", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline() or "{}")
+        except Exception:
+            return None
         for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            total_snapshots += 1
             try:
-                row = json.loads(line)
+                ms, off = json.loads(line)
+                entries.append([int(ms), int(off)])
             except Exception:
                 continue
-            d = _date_utc(row.get("ts", ""))
-            total = float(row.get("total_value", 0.0))
-            rec = per_day.get(d)
-            if rec is None:
-                rec = {
-                    "date": d,
-                    "open": total,
-                    "close": total,
-                    "high": total,
-                    "low": total,
-                    "sum": total,
-                    "count": 1,
-                }
-                per_day[d] = rec
-            else:
-                # update OHLC + average
-                rec["close"] = total
-                rec["high"] = max(rec["high"], total)
-                rec["low"] = min(rec["low"], total)
-                rec["sum"] += total
-                rec["count"] += 1
-
-    # Write out as jsonl in date order
-    days_sorted = sorted(per_day.keys())
-    lines = []
-    for d in days_sorted:
-        rec = per_day[d]
-        avg = rec["sum"] / rec["count"] if rec["count"] else rec["close"]
-        lines.append(
-            json.dumps(
-                {
-                    "date": rec["date"],
-                    "open": rec["open"],
-                    "close": rec["close"],
-                    "high": rec["high"],
-                    "low": rec["low"],
-                    "avg": avg,
-                    "count": rec["count"],
-                },
-                ensure_ascii=False,
-            )
-        )
-
-    _atomic_write_text(SNAPSHOTS_DAY_PATH, "\n".join(lines) + ("\n" if lines else ""))
-    return {"days": len(days_sorted), "snapshots": total_snapshots}
+    if header.get("v") != _INDEX_VERSION:
+        return None
+    ino = _file_ino(path)
+    if header.get("ino") and ino and header["ino"] != ino:
+        return None  # file was replaced/rotated
+    size = os.path.getsize(path)
+    if not entries:
+        return entries if size == 0 else None
+    ms, off = entries[-1]
+    stride = int(header.get("stride", INDEX_STRIDE_BYTES))
+    if off >= size or size - off > 4 * stride:
+        return None  # truncated, or appended to without index maintenance
+    # the last entry must still point at the line it was built from
+    for _, raw in _iter_lines_from(path, off):
+        row = project_snapshot(raw, ("ts",))
+        if row is None or _ts_ms(row.get("ts")) != ms:
+            return None
+        break
+    return entries
+
+
+def rebuild_snapshot_index(path=None) -> dict:
+    """Rebuild the sparse timestamp index for snapshots.jsonl from scratch."""
+    path = path if path is not None else SNAPSHOTS_PATH
+    entries = []
+    size = 0
+    if os.path.exists(path):
+        last_off = None
+        for off, raw in _iter_lines_from(path):
+            if last_off is not None and off - last_off < INDEX_STRIDE_BYTES:
+                continue
+            if snapshot_codec.is_repeat_line(raw):
+                continue
+            row = project_snapshot(raw, ("ts",))
+            ms = _ts_ms(row.get("ts")) if row is not None else None
+            if ms is not None:
+                entries.append([ms, off])
+                last_off = off
+        size = os.path.getsize(path)
+    header = {"v": _INDEX_VERSION, "stride": INDEX_STRIDE_BYTES, "ino": _file_ino(path)}
+    lines = [json.dumps(header)] + [json.dumps(e) for e in entries]
+    _atomic_write_text(_index_path(path), "\n".join(lines) + "\n")
+    return {"entries": len(entries), "bytes": size}
+
+
+def _ensure_index(path) -> list[list[int]]:
+    if _codec_of(path):
+        return []  # compressed segments are scanned whole; the manifest bounds prune them
+    entries = _load_index(path)
+    if entries is None:
+        rebuild_snapshot_index(path)
+        entries = _load_index(path) or []
+    return entries
+
+
+def _seek_offset(entries: list[list[int]], ms: int | None) -> int:
+    """Byte offset of the last indexed line strictly before `ms` (0 if none)."""
+    if ms is None or not entries:
+        return 0
+    i = bisect.bisect_left([e[0] for e in entries], ms) - 1
+    return entries[i][1] if i >= 0 else 0
+
+
+def _read_range_in_file(path, start_ms: int | None, end_ms: int | None) -> list[dict]:
+    entries = _ensure_index(path)
+    out = []
+    dec = _SnapshotDecoder()
+    for _, raw in _iter_lines_from(path, _seek_offset(entries, start_ms)):
+        head = project_snapshot(raw, ("ts",))
+        ms = _ts_ms(head.get("ts")) if head is not None else None
+        if ms is None or (start_ms is not None and ms < start_ms):
+            dec.feed(raw, want=False)
+            continue
+        if end_ms is not None and ms > end_ms:
+            break
+        row = dec.feed(raw)
+        if row is not None:
+            out.append(row)
+    return out
 
 
-def read_last_daily(n: int = 14):
-    """Tail the daily rollups file (rebuild first if missing/empty)."""
+def read_snapshots_range(start=None, end=None) -> list[dict]:
+    """
+    Return snapshots with start <= ts <= end (bounds are dates or ISO timestamps).
+    Segments outside the range are skipped via the manifest, and each file is
+    entered through its sparse index instead of being decoded from the top;
+    assumes snapshots were appended in time order.
+    """
     ensure_home()
-    if not os.path.exists(SNAPSHOTS_DAY_PATH):
-        # lazy build once
-        rebuild_daily_rollups()
-    if not os.path.exists(SNAPSHOTS_DAY_PATH):
-        return []
+    return get_backend().read_snapshots_range(_bound_ms(start), _bound_ms(end, end=True))
+
+
+def _jsonl_read_snapshots_range(start_ms: int | None, end_ms: int | None) -> list[dict]:
     out = []
-    with open(SNAPSHOTS_DAY_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            out.append(json.loads(line))
-    return out[-n:]
+    for path, lo, hi in _snapshot_sources_with_bounds():
+        if not os.path.exists(path):
+            continue
+        if start_ms is not None and hi is not None and hi < start_ms:
+            continue
+        if end_ms is not None and lo is not None and lo > end_ms:
+            continue
+        out.extend(_read_range_in_file(path, start_ms, end_ms))
+    return out
 
-def read_daily_all() -> list[dict]:
-    """Return all daily rollup rows (chronological)."""
+
+def snapshot_at(when) -> dict | None:
+    """Return the latest snapshot at or before `when` (point-in-time lookup)."""
     ensure_home()
-    if not os.path.exists(SNAPSHOTS_DAY_PATH):
-        return []
-    rows = []
-    with open(SNAPSHOTS_DAY_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            try:
-                rows.append(json.loads(line))
-            except Exception:
-                pass
-    rows.sort(key=lambda r: r.get("date", ""))
-    return rows
+    at_ms = _bound_ms(when, end=True)
+    if at_ms is None:
+        return None
+    return get_backend().snapshot_at(at_ms)
+
+
+def _jsonl_snapshot_at(at_ms: int) -> dict | None:
+    for path, lo, _ in reversed(_snapshot_sources_with_bounds()):
+        if not os.path.exists(path) or (lo is not None and lo > at_ms):
+            continue
+        entries = _ensure_index(path)
+        found = found_base = base = None  # base: last full line so far, for v2 repeats
+        for _, raw in _iter_lines_from(path, _seek_offset(entries, at_ms)):
+            head = project_snapshot(raw, ("ts",))
+            ms = _ts_ms(head.get("ts")) if head is not None else None
+            if ms is not None and ms > at_ms:
+                break
+            if ms is not None:
+                found, found_base = raw, base
+            if not snapshot_codec.is_repeat_line(raw):
+                base = raw
+        if found is not None:
+            dec = _SnapshotDecoder()
+            if found_base is not None:
+                dec.feed(found_base, want=False)
+            row = dec.feed(found)
+            if row is not None:
+                return row
+    return None
+
+
+# ---- Time-partitioned segments ----
+#
+# snapshots.jsonl is the "hot" file for the current period. When a snapshot for
+# a later period arrives, the hot file is sealed into segments/ and described in
+# segments/manifest.json (time range, row count, OHLC of total_value). Sealed
+# segments are immutable; each carries a .days.json sidecar with its per-day
+# rollup state so rebuilds don't need to re-parse them.
+
+SEGMENT_PERIODS = ("day", "month", "year")
+_MANIFEST_VERSION = 1
+
+
+def _segments_dir() -> str:
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_PATH)), "segments")
+
+
+def _manifest_path() -> str:
+    return os.path.join(_segments_dir(), "manifest.json")
+
+
+def _manifest_lock():
+    """
+    Cross-process lock held around every read-modify-write of manifest.json
+    (sealing, migration, compaction, retention); re-read the manifest under it.
+    """
+    from utils.lock import file_lock
 
-# --- Outlier guard ---
-SNAPSHOTS_BAD_PATH = os.path.join(HOME_DIR, "snapshots_bad.jsonl")
+    return file_lock(_manifest_path() + ".lock")
 
-def _read_last_totals(n: int = 10) -> list[float]:
-    """Return last n total_value numbers from snapshots.jsonl (chronological tail)."""
-    ensure_home()
-    if not os.path.exists(SNAPSHOTS_PATH):
-        return []
-    rows = []
-    with open(SNAPSHOTS_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            line = line.strip()
-            if not line:
+
+def read_segment_manifest() -> dict | None:
+    """Return the segment manifest, or None for a single-file (unsegmented) install."""
+    path = _manifest_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        return read_json(path)
+    except Exception:
+        return None
+
+
+def _new_manifest(period: str | None = None) -> dict:
+    if period is None:
+        try:
+            period = str(read_config().get("segment_period", "month"))
+        except Exception:
+            period = "month"
+    if period not in SEGMENT_PERIODS:
+        raise ValueError(
+            f"Unknown segment period '{period}'. Allowed: {', '.join(SEGMENT_PERIODS)}"
+        )
+    return {"v": _MANIFEST_VERSION, "period": period, "segments": []}
+
+
+def _period_key(ts, period: str) -> str:
+    d = _date_utc(str(ts))
+    if period == "day":
+        return d
+    if period == "year":
+        return d[:4]
+    return d[:7]
+
+
+def _sealed_segment_paths(manifest: dict | None = None) -> list[str]:
+    manifest = manifest if manifest is not None else read_segment_manifest()
+    if not manifest:
+        return []
+    base = _segments_dir()
+    return [os.path.join(base, seg["file"]) for seg in manifest.get("segments", [])]
+
+
+def _snapshot_sources() -> list[str]:
+    """All snapshot files in chronological order: sealed segments, then the hot file."""
+    return _sealed_segment_paths() + [str(SNAPSHOTS_PATH)]
+
+
+def _snapshot_sources_with_bounds() -> list[tuple[str, int | None, int | None]]:
+    """(path, start_ms, end_ms) per snapshot file; bounds are None when unknown (hot)."""
+    out = []
+    manifest = read_segment_manifest()
+    if manifest:
+        base = _segments_dir()
+        for seg in manifest.get("segments", []):
+            out.append(
+                (os.path.join(base, seg["file"]), _ts_ms(seg.get("start")), _ts_ms(seg.get("end")))
+            )
+    out.append((str(SNAPSHOTS_PATH), None, None))
+    return out
+
+
+def _first_json_record(path) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    for _, raw in _iter_lines_from(path):
+        try:
+            return json.loads(raw)
+        except Exception:
+            continue
+    return None
+
+
+def _segment_days_path(seg_path) -> str:
+    return str(seg_path) + ".days.json"
+
+
+def _segment_daily_state(seg_path, refresh: bool = False) -> tuple[list[dict], int]:
+    """Per-day rollup state of a sealed segment (cached in its .days.json sidecar)."""
+    days, n, _ = _segment_rollup_state(seg_path, refresh)
+    return days, n
+
+
+def _segment_rollup_state(seg_path, refresh: bool = False) -> tuple[list[dict], int, dict]:
+    """
+    (days, snapshots, {tier: buckets}) of a sealed segment, all cached in its
+    .days.json sidecar. Sidecars written before the 1h/1w/1M tiers keep their
+    days (possibly the raw state of since-downsampled rows) and gain the tiers.
+    """
+    side = _segment_days_path(seg_path)
+    cached = None
+    data: dict = {}
+    if os.path.exists(side) and not refresh:
+        try:
+            data = read_json(side)
+            cached = list(data["days"]), int(data["snapshots"])
+            if isinstance(data.get("tiers"), dict):
+                return cached[0], cached[1], data["tiers"]
+        except Exception:
+            data = data if isinstance(data, dict) else {}
+    if not os.path.exists(seg_path):
+        return [], 0, {}
+    tiers: dict = {tier: {} for tier in _TIER_FILES}
+    per_day, n = _aggregate_daily_file(seg_path, tiers=tiers)
+    days = [per_day[d] for d in sorted(per_day)]
+    if cached is not None:
+        days, n = cached
+    by_tier = {tier: [state[k] for k in sorted(state)] for tier, state in tiers.items()}
+    write_json(side, {**data, "days": days, "snapshots": n, "tiers": by_tier})
+    return days, n, by_tier
+
+
+def _segment_coin_state(seg_path) -> dict:
+    """
+    {coin: per-day price states} of a sealed segment, cached in its .days.json
+    sidecar next to the totals (so retention keeps the raw per-coin days).
+    """
+    side = _segment_days_path(seg_path)
+    data: dict = {}
+    if os.path.exists(side):
+        try:
+            data = read_json(side)
+        except Exception:
+            data = {}
+        if isinstance(data.get("coins"), dict):
+            return data["coins"]
+    if not os.path.exists(seg_path):
+        return {}
+    per_coin: dict = {}
+    _fold_coin_rows(per_coin, iter_snapshot_fields(_COIN_FIELDS, [str(seg_path)]))
+    coins = {coin: [state[d] for d in sorted(state)] for coin, state in per_coin.items()}
+    write_json(side, {**data, "coins": coins})
+    return coins
+
+
+def _segment_entry(path, name: str, key: str) -> dict:
+    """Manifest entry for a segment file: time range, rows and OHLC of total_value."""
+    days, n = _segment_daily_state(path, refresh=True)
+    first = _first_json_record(path) or {}
+    _, last = _last_json_record(path)
+    last = last or {}
+    return {
+        "file": name,
+        "period": key,
+        "start": first.get("ts"),
+        "end": last.get("ts"),
+        "rows": n,
+        "open": days[0]["open"] if days else None,
+        "high": max((d["high"] for d in days), default=None),
+        "low": min((d["low"] for d in days), default=None),
+        "close": days[-1]["close"] if days else None,
+        "bytes": os.path.getsize(path),
+    }
+
+
+def _raw_segment_name(name: str) -> str:
+    codec = _codec_of(name)
+    return name[: -len(SEGMENT_CODECS[codec])] if codec else name
+
+
+def _unused_segment_name(manifest: dict, key: str) -> str:
+    taken = {_raw_segment_name(seg["file"]) for seg in manifest.get("segments", [])}
+    name, n = f"snapshots-{key}.jsonl", 1
+    while name in taken or os.path.exists(os.path.join(_segments_dir(), name)):
+        n += 1
+        name = f"snapshots-{key}.{n}.jsonl"
+    return name
+
+
+def _drop_missing_segments(manifest: dict) -> None:
+    """Forget manifest entries whose file is gone: a seal that crashed before its move."""
+    segs = manifest.get("segments", [])
+    kept = [seg for seg in segs if os.path.exists(os.path.join(_segments_dir(), seg["file"]))]
+    if len(kept) != len(segs):
+        manifest["segments"] = kept
+
+
+def _seal_hot_file(manifest: dict, key: str) -> None:
+    """
+    Move the hot file into segments/ and record it in the manifest. Callers
+    hold _manifest_lock() and pass the manifest read under it.
+    """
+    hot = str(SNAPSHOTS_PATH)
+    os.makedirs(_segments_dir(), exist_ok=True)
+    _drop_missing_segments(manifest)
+    name = _unused_segment_name(manifest, key)
+    dest = os.path.join(_segments_dir(), name)
+
+    # compute the summary on the hot file, then list it before moving: a crash in
+    # between leaves a dangling manifest entry (skipped by readers and dropped by
+    # the next seal), never lost rows
+    entry = _segment_entry(hot, name, key)
+    manifest.setdefault("segments", []).append(entry)
+    write_json(_manifest_path(), manifest)
+
+    hot_size, hot_ino = _file_size(hot), _file_ino(hot)
+    os.replace(hot, dest)
+    os.replace(_segment_days_path(hot), _segment_days_path(dest))
+    if os.path.exists(_index_path(hot)):
+        os.replace(_index_path(hot), _index_path(dest))
+    _columns_note_seal(hot_size, hot_ino)
+    # compression ("segment_compression") runs later, off the append path:
+    # see compress_sealed_segments()
+
+
+def _roll_needed(manifest: dict | None, obj: dict) -> str | None:
+    """Return "create" for a fresh install, the hot period key if it must be sealed, else None."""
+    if manifest is None:
+        # a legacy single-file install waits for migrate_to_segments()
+        return None if _file_size(SNAPSHOTS_PATH) > 0 else "create"
+    first = _first_json_record(SNAPSHOTS_PATH)
+    if not first:
+        return None
+    period = manifest.get("period", "month")
+    hot_key = _period_key(first.get("ts", ""), period)
+    return hot_key if _period_key(obj.get("ts", ""), period) > hot_key else None
+
+
+def _maybe_roll_segment(obj: dict) -> None:
+    """Seal the hot file if `obj` belongs to a later period than its first row."""
+    if _roll_needed(read_segment_manifest(), obj) is None:
+        return  # the common case, decided without taking the lock
+    os.makedirs(_segments_dir(), exist_ok=True)
+    with _manifest_lock():
+        # another process may have sealed (or created) in the meantime
+        manifest = read_segment_manifest()
+        action = _roll_needed(manifest, obj)
+        if action == "create":
+            write_json(_manifest_path(), _new_manifest())
+        elif action is not None:
+            _seal_hot_file(manifest, action)
+
+
+def migrate_to_segments(period: str | None = None) -> dict:
+    """
+    One-time migration of a single-file snapshots.jsonl into sealed segments.
+    Rows of the latest period stay in the hot file. Returns a summary dict.
+    """
+    ensure_home()
+    os.makedirs(_segments_dir(), exist_ok=True)
+    with _manifest_lock():
+        return _migrate_to_segments(period)
+
+
+def _migrate_to_segments(period: str | None) -> dict:
+    if read_segment_manifest() is not None:
+        raise ValueError("Snapshot history is already segmented.")
+    manifest = _new_manifest(period)
+    period = manifest["period"]
+    seg_dir = _segments_dir()
+    hot = str(SNAPSHOTS_PATH)
+    if not os.path.exists(hot):
+        write_json(_manifest_path(), manifest)
+        return {"period": period, "segments": 0, "rows": 0}
+
+    # split by period into temp files (one open handle at a time)
+    tmp_paths: dict[str, str] = {}
+    rows = 0
+    key = None
+    out = None
+    base = None  # last full line, to expand v2 repeats that would start a file
+    try:
+        with open(hot, "rb") as f:
+            for raw in f:
+                if not raw.strip():
+                    continue
+                head = project_snapshot(raw, ("ts",))
+                if head is not None:
+                    line_key = _period_key(head.get("ts", ""), period)
+                else:
+                    line_key = key or _period_key("", period)  # keep torn lines with neighbours
+                repeat = snapshot_codec.is_repeat_line(raw)
+                if line_key != key:
+                    if out is not None:
+                        out.close()
+                    key = line_key
+                    tmp = tmp_paths.setdefault(key, os.path.join(seg_dir, f".migrate-{key}.tmp"))
+                    out = open(tmp, "ab")
+                    if repeat and base is not None:
+                        raw = _expand_repeat_line(raw, base)
+                        repeat = False
+                if not repeat:
+                    base = raw
+                out.write(raw if raw.endswith(b"\n") else raw + b"\n")
+                rows += 1
+    finally:
+        if out is not None:
+            out.close()
+
+    keys = sorted(tmp_paths)
+    for k in keys[:-1]:
+        name = _unused_segment_name(manifest, k)
+        dest = os.path.join(seg_dir, name)
+        os.replace(tmp_paths[k], dest)
+        manifest["segments"].append(_segment_entry(dest, name, k))
+        rebuild_snapshot_index(dest)
+    write_json(_manifest_path(), manifest)
+    if keys:
+        # the hot index goes stale (new inode) and is rebuilt on the next range read
+        os.replace(tmp_paths[keys[-1]], hot)
+    return {"period": period, "segments": max(0, len(keys) - 1), "rows": rows}
+
+
+# ---- Cold-history compression ----
+#
+# Sealed segments never change, so they can be stored gzip/xz-compressed.
+# The manifest entry then names the compressed file and records "codec" and
+# "raw_bytes"; readers pick the decompressor from the extension. The hot file
+# always stays plain, appendable JSONL.
+
+
+def _seal_codec() -> str | None:
+    """Codec for compress-on-seal from config "segment_compression" (None = off)."""
+    try:
+        codec = str(read_config().get("segment_compression", "none")).lower()
+    except Exception:
+        return None
+    return codec if codec in SEGMENT_CODECS else None
+
+
+def _compress_segment(name: str, codec: str) -> bool:
+    """
+    Replace the sealed segment `name` with a compressed copy. The copy is made
+    without holding the manifest lock; the manifest is then re-read under it and
+    only switched over if the segment is still listed and its file unchanged
+    (not rewritten by retention meanwhile). The raw file is removed last, so a
+    crash never leaves the segment unreadable. Returns False if skipped.
+    """
+    base = _segments_dir()
+    src = os.path.join(base, name)
+    dest_name = name + SEGMENT_CODECS[codec]
+    dest = os.path.join(base, dest_name)
+    tmp = dest + ".tmp"
+    try:
+        st = os.stat(src)
+    except FileNotFoundError:
+        return False
+    with open(src, "rb") as fin, _open_codec(tmp, codec, "wb") as fout:
+        shutil.copyfileobj(fin, fout, 1024 * 1024)
+
+    with _manifest_lock():
+        manifest = read_segment_manifest() or {}
+        seg = next((x for x in manifest.get("segments", []) if x["file"] == name), None)
+        try:
+            cur = os.stat(src)
+            unchanged = (cur.st_mtime_ns, cur.st_size) == (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            unchanged = False
+        if seg is None or not unchanged:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, dest)
+        if os.path.exists(_segment_days_path(src)):
+            shutil.copyfile(_segment_days_path(src), _segment_days_path(dest))
+        seg.update({"file": dest_name, "codec": codec, "raw_bytes": st.st_size})
+        seg["bytes"] = os.path.getsize(dest)
+        write_json(_manifest_path(), manifest)
+
+    for stale in (src, _segment_days_path(src), _index_path(src)):
+        if os.path.exists(stale):
+            os.remove(stale)
+    return True
+
+
+def compress_sealed_segments() -> int:
+    """
+    Compress sealed segments still stored plain, with the codec from config
+    "segment_compression" (nothing when it is off). The daemon runs this after
+    each cycle, so sealing inside append_snapshot_line stays cheap. Returns the
+    number of segments compressed.
+    """
+    codec = _seal_codec()
+    manifest = read_segment_manifest()
+    if not codec or not manifest:
+        return 0
+    done = 0
+    for seg in manifest.get("segments", []):
+        if _codec_of(seg["file"]):
+            continue
+        try:
+            done += _compress_segment(seg["file"], codec)
+        except OSError:
+            continue  # stays uncompressed; the next run or `crypto compact` retries
+    return done
+
+
+def _scan_throughput(paths: list[str]) -> dict:
+    """Decode every line of `paths` once; returns rows, uncompressed bytes and seconds."""
+    rows = nbytes = 0
+    t0 = time.perf_counter()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        for _, raw in _iter_lines_from(path):
+            nbytes += len(raw)
+            try:
+                json.loads(raw)
+            except Exception:
+                continue
+            rows += 1
+    return {"rows": rows, "bytes": nbytes, "seconds": time.perf_counter() - t0}
+
+
+def compact_segments(codec: str | None = None) -> dict:
+    """
+    Compress every uncompressed sealed segment with `codec` ("gzip" or "xz";
+    default: config "segment_compression", else gzip). Returns bytes before and
+    after plus a full-scan measurement of the compacted segments on each side.
+    """
+    ensure_home()
+    codec = codec or _seal_codec() or "gzip"
+    if codec not in SEGMENT_CODECS:
+        raise ValueError(f"Unknown codec '{codec}'. Allowed: {', '.join(SEGMENT_CODECS)}")
+    manifest = read_segment_manifest()
+    if manifest is None:
+        raise ValueError(
+            "Snapshot history is a single file. Run `crypto segments --migrate` first."
+        )
+    base = _segments_dir()
+    todo = [
+        seg
+        for seg in manifest.get("segments", [])
+        if not _codec_of(seg["file"]) and os.path.exists(os.path.join(base, seg["file"]))
+    ]
+    sizes = {seg["file"]: os.path.getsize(os.path.join(base, seg["file"])) for seg in todo}
+    scan_before = _scan_throughput([os.path.join(base, name) for name in sizes])
+    done = [name for name in sizes if _compress_segment(name, codec)]  # skips raced segments
+    before = sum(sizes[name] for name in done)
+    packed = [os.path.join(base, name + SEGMENT_CODECS[codec]) for name in done]
+    after = sum(os.path.getsize(path) for path in packed)
+    scan_after = _scan_throughput(packed)
+    return {
+        "codec": codec,
+        "segments": len(done),
+        "bytes_before": before,
+        "bytes_after": after,
+        "scan_before": scan_before,
+        "scan_after": scan_after,
+    }
+
+
+# ---- Retention (downsampling of old sealed segments) ----
+#
+# Config "retention" lists steps such as
+#   [{"after_days": 30, "every": "15m"}, {"after_days": 180, "every": "1h"}]
+# i.e. snapshots older than 30 days are merged into one record per 15 minutes,
+# older than 180 days into one per hour. A merged record is a plain snapshot
+# with the bucket's last ts and its closing total_value and prices, plus "ds":
+# the resolution, open/high/low/sum/count of total_value, and per coin the
+# same five as a list. Rollup folds read those instead of the close. Only sealed
+# segments are rewritten (temp file, then rename), so the appending daemon
+# never waits on a compaction, and each segment's .days.json sidecar is taken
+# from the raw rows beforehand and kept: daily rollups rebuild unchanged.
+
+_DS_MARK = b'"ds": {"every": '
+_EVERY_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_OHLC_KEYS = ("open", "high", "low", "sum", "count")
+
+
+def _parse_every(value) -> int:
+    m = re.fullmatch(r"\s*(\d+)\s*([smhd])\s*", str(value).lower())
+    secs = int(m.group(1)) * _EVERY_UNITS[m.group(2)] if m else 0
+    if secs <= 0 or 86400 % secs:
+        raise ValueError(
+            f"Invalid retention resolution '{value}': use e.g. 5m, 15m or 1h (must divide a day)."
+        )
+    return secs
+
+
+def retention_policy(cfg: dict | None = None) -> list[tuple[int, int]]:
+    """Config "retention" as sorted (after_days, every_seconds) steps; [] keeps raw forever."""
+    steps = (cfg if cfg is not None else read_config()).get("retention") or []
+    usage = 'Config "retention" must be a list of {"after_days": N, "every": "15m"} steps.'
+    if not isinstance(steps, list):
+        raise ValueError(usage)
+    out = []
+    for step in steps:
+        try:
+            after, every = int(step["after_days"]), step["every"]
+        except Exception:
+            raise ValueError(usage) from None
+        if after < 1:
+            raise ValueError("Retention after_days must be at least 1.")
+        out.append((after, _parse_every(every)))
+    out.sort()
+    for (a0, e0), (a1, e1) in zip(out, out[1:]):
+        if a0 == a1 or e1 % e0:
+            raise ValueError(
+                "Retention steps need distinct after_days, and each resolution must be "
+                "a multiple of the one before it."
+            )
+    return out
+
+
+def _retention_every(policy: list[tuple[int, int]], age_ms: int) -> int | None:
+    every = None
+    for after, secs in policy:
+        if age_ms >= after * 86_400_000:
+            every = secs
+    return every
+
+
+def _ohlc_state(value: float) -> dict:
+    return {"open": value, "close": value, "high": value, "low": value, "sum": value, "count": 1}
+
+
+def _merged_states(snap: dict) -> tuple[dict, dict]:
+    """(total_value state, {coin: price state}) of a raw snapshot or a merged record."""
+    total = _snapshot_total(snap)
+    prices = snap.get("prices") or {}
+    ds = snap.get("ds")
+    if isinstance(ds, dict):
+        coins = {
+            coin: {**dict(zip(_OHLC_KEYS, st)), "close": prices.get(coin)}
+            for coin, st in (ds.get("prices") or {}).items()
+        }
+        return {**{k: ds[k] for k in _OHLC_KEYS}, "close": total}, coins
+    coins = {}
+    for coin, value in prices.items():
+        price = _coin_price(value)
+        if price is not None:
+            coins[coin] = _ohlc_state(price)
+    return _ohlc_state(total), coins
+
+
+def _merged_record(raw: bytes) -> dict | None:
+    """The decoded record if `raw` is a merged (downsampled) line, else None."""
+    if _DS_MARK not in raw:
+        return None
+    rec = _decode_line(raw)
+    return rec if isinstance(rec, dict) and isinstance(rec.get("ds"), dict) else None
+
+
+class _RetentionBucket:
+    """Snapshots of one (resolution, time bucket, currency), merged into one record."""
+
+    def __init__(self, every: int, key: tuple):
+        self.every = every
+        self.key = key
+        self.total: dict = {}
+        self.coins: dict = {}
+        self.last: dict = {}
+
+    def add(self, snap: dict) -> None:
+        total, coins = _merged_states(snap)
+        _merge_daily_state(self.total, {**total, "date": 0})
+        for coin, st in coins.items():
+            _merge_daily_state(self.coins.setdefault(coin, {}), {**st, "date": 0})
+        self.last = snap
+
+    def record(self) -> dict:
+        tot = self.total[0]
+        coins = {coin: state[0] for coin, state in self.coins.items()}
+        rec = {"ts": self.last.get("ts"), "total_value": tot["close"]}
+        if self.last.get("vs_currency") is not None:
+            rec["vs_currency"] = self.last["vs_currency"]
+        rec["ds"] = {
+            "every": self.every,
+            **{k: tot[k] for k in _OHLC_KEYS},
+            "prices": {coin: [st[k] for k in _OHLC_KEYS] for coin, st in coins.items()},
+        }
+        rec["prices"] = {coin: st["close"] for coin, st in coins.items()}
+        return rec
+
+
+def _downsample_segment(
+    path: str, policy: list, now_ms: int, out
+) -> tuple[int, int, int, int]:
+    """
+    Stream `path` into `out` (a binary file, or None to only count) at the
+    resolutions `policy` assigns by age. Rows younger than every step, and
+    records already at least as coarse, are copied as they are; v2 repeat
+    lines whose base was merged away are expanded. Returns (lines in, lines
+    out, uncompressed bytes out, coarsest resolution merged or 0).
+    """
+    stats = [0, 0, 0, 0]
+
+    def emit(line: bytes) -> None:
+        stats[1] += 1
+        stats[2] += len(line)
+        if out is not None:
+            out.write(line)
+
+    dec = _SnapshotDecoder()
+    bucket: _RetentionBucket | None = None
+    base_raw: bytes | None = None
+    base_written = False
+    for _, raw in _iter_lines_from(path):
+        stats[0] += 1
+        repeat = snapshot_codec.is_repeat_line(raw)
+        line = raw if raw.endswith(b"\n") else raw + b"\n"
+        snap = dec.feed(raw)
+        if not repeat:
+            base_raw, base_written = raw, False
+        ms = _ts_ms(snap.get("ts")) if snap is not None else None
+        every = _retention_every(policy, now_ms - ms) if ms is not None else None
+        ds = snap.get("ds") if snap is not None else None
+        if every is not None and isinstance(ds, dict) and int(ds.get("every", 0)) >= every:
+            every = None
+        if every is None:
+            if bucket is not None:
+                emit((json.dumps(bucket.record(), ensure_ascii=False) + "\n").encode("utf-8"))
+                bucket = None
+            if repeat and not base_written and base_raw is not None:
+                line = _expand_repeat_line(raw, base_raw)
+            emit(line)
+            base_written = True
+            continue
+        key = (every, ms // (every * 1000), snap.get("vs_currency"))
+        if bucket is not None and bucket.key != key:
+            emit((json.dumps(bucket.record(), ensure_ascii=False) + "\n").encode("utf-8"))
+            bucket = None
+        if bucket is None:
+            bucket = _RetentionBucket(every, key)
+            stats[3] = max(stats[3], every)
+            base_written = False  # a merged record now sits between base and repeats
+        bucket.add(snap)
+    if bucket is not None:
+        emit((json.dumps(bucket.record(), ensure_ascii=False) + "\n").encode("utf-8"))
+    return stats[0], stats[1], stats[2], stats[3]
+
+
+def _invalidate_columns() -> None:
+    """Mark the columnar store stale so the next columnar read rebuilds it."""
+    base = _columns_dir()
+    meta = columnar.read_meta(base)
+    if meta is not None:
+        meta["hot_size"] = None
+        columnar.write_meta(base, meta)
+
+
+def apply_retention(dry_run: bool = False, now=None) -> dict:
+    """
+    Downsample sealed segments per config "retention" (see above). Returns
+    {"segments", "rows_before", "rows_after", "bytes_before", "bytes_after"}
+    over the segments that changed (or would change, with `dry_run`).
+    """
+    ensure_home()
+    if not _using_jsonl():
+        raise ValueError("Retention compaction applies to the JSONL storage backend only.")
+    policy = retention_policy()
+    manifest = read_segment_manifest()
+    if manifest is None:
+        raise ValueError(
+            "Snapshot history is a single file. Run `crypto segments --migrate` first."
+        )
+    now_ms = _bound_ms(now) if now is not None else int(time.time() * 1000)
+    res = {"segments": 0, "rows_before": 0, "rows_after": 0, "bytes_before": 0, "bytes_after": 0}
+    if not policy:
+        return res
+    oldest_cut = now_ms - policy[0][0] * 86_400_000
+    base = _segments_dir()
+    for seg in list(manifest.get("segments", [])):
+        path = os.path.join(base, seg["file"])
+        start = _ts_ms(seg.get("start"))
+        if not os.path.exists(path) or start is None or start > oldest_cut:
+            continue
+        rows_in, rows_out, _, merged = _downsample_segment(path, policy, now_ms, None)
+        if not merged:
+            continue  # nothing old enough, or already at these resolutions
+        before = os.path.getsize(path)
+        if not dry_run and not _retain_segment(path, seg["file"], policy, now_ms):
+            continue  # compacted or rewritten meanwhile; the next run picks it up
+        res["segments"] += 1
+        res["rows_before"] += rows_in
+        res["rows_after"] += rows_out
+        res["bytes_before"] += before
+        res["bytes_after"] += before if dry_run else os.path.getsize(path)
+    if res["segments"] and not dry_run:
+        _invalidate_columns()
+        _remove_rollup_checkpoint()
+    return res
+
+
+def _retain_segment(path: str, name: str, policy: list, now_ms: int) -> bool:
+    """
+    Rewrite one sealed segment (atomically) and update its manifest entry. The
+    rewrite goes to a temp file without the manifest lock; under it, the
+    manifest is re-read and the result only swapped in if the entry still
+    names this file and the file is unchanged (compaction may have replaced
+    it meanwhile). Returns False if skipped.
+    """
+    # cache the raw per-day, tier and per-coin state before the rows merge
+    _segment_rollup_state(path)
+    _segment_coin_state(path)
+    codec = _codec_of(path)
+    tmp = path + ".retention.tmp"
+    try:
+        st = os.stat(path)
+        with _open_codec(tmp, codec, "wb") as out:
+            _, _, raw_bytes, every = _downsample_segment(path, policy, now_ms, out)
+        with _manifest_lock():
+            manifest = read_segment_manifest() or {}
+            seg = next((x for x in manifest.get("segments", []) if x["file"] == name), None)
+            try:
+                cur = os.stat(path)
+                unchanged = (cur.st_mtime_ns, cur.st_size) == (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                unchanged = False
+            if seg is None or not unchanged:
+                return False
+            os.replace(tmp, path)
+            if os.path.exists(_index_path(path)):
+                os.remove(_index_path(path))
+            seg["bytes"] = os.path.getsize(path)
+            if codec:
+                seg["raw_bytes"] = raw_bytes
+            seg["downsampled"] = max(int(seg.get("downsampled", 0)), every)
+            write_json(_manifest_path(), manifest)
+        return True
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# ---- Columnar companion store (layout in storage/columnar.py) ----
+
+_COLUMN_BATCH = 10_000
+
+
+def _columns_dir() -> str:
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_PATH)), "columns")
+
+
+def _column_row(obj: dict) -> tuple | None:
+    us = _ts_us(obj.get("ts"))
+    if us is None:
+        return None
+    vs = str(obj.get("vs_currency") or "usd").lower()
+    return (us, _snapshot_total(obj), vs, obj.get("prices") or {})
+
+
+def _columns_in_sync(meta: dict | None) -> bool:
+    """True when the columns cover exactly the snapshot files as they are now."""
+    if meta is None:
+        return False
+    hot_ino = meta.get("hot_ino")
+    return meta.get("hot_size") == max(0, _file_size(SNAPSHOTS_PATH)) and (
+        hot_ino is None or hot_ino == _file_ino(SNAPSHOTS_PATH)
+    )
+
+
+def _columns_note_append(obj: dict, offset: int, end: int) -> None:
+    """Mirror a snapshot appended at [offset, end) of the hot file into the columns."""
+    base = _columns_dir()
+    meta = columnar.read_meta(base)
+    if meta is None:
+        # start alongside a brand-new history; existing ones use rebuild_columns()
+        if offset != 0 or _sealed_segment_paths():
+            return
+        meta = columnar.new_meta()
+    elif meta.get("hot_size") != offset or meta.get("hot_ino") not in (
+        None,
+        _file_ino(SNAPSHOTS_PATH),
+    ):
+        return  # out of sync; rebuilt on the next columnar read
+    row = _column_row(obj)
+    if row is not None:
+        columnar.append_rows(base, meta, [row])
+    meta["hot_size"] = end
+    meta["hot_ino"] = _file_ino(SNAPSHOTS_PATH)
+    columnar.write_meta(base, meta)
+
+
+def _columns_note_seal(hot_size: int, hot_ino: int) -> None:
+    """The hot file became a sealed segment: columns stay valid for a new, empty hot file."""
+    base = _columns_dir()
+    meta = columnar.read_meta(base)
+    if meta is None or meta.get("hot_size") != hot_size or meta.get("hot_ino") not in (
+        None,
+        hot_ino,
+    ):
+        return
+    meta["hot_size"] = 0
+    meta["hot_ino"] = None
+    columnar.write_meta(base, meta)
+
+
+def rebuild_columns() -> dict:
+    """Rebuild the columnar store from the JSONL snapshot history."""
+    ensure_home()
+    base = _columns_dir()
+    tmp = base + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    # only cover the hot file up to its current size; later appends mark us stale
+    hot = str(SNAPSHOTS_PATH)
+    hot_size, hot_ino = max(0, _file_size(hot)), _file_ino(hot)
+    meta = columnar.new_meta()
+    batch: list[tuple] = []
+    rows = 0
+    for path in _snapshot_sources():
+        if not os.path.exists(path):
+            continue
+        for off, _, snap in _iter_snapshots(path):
+            if path == hot and off >= hot_size:
+                break
+            try:
+                row = _column_row(snap)
+            except Exception:
+                continue
+            if row is not None:
+                batch.append(row)
+            if len(batch) >= _COLUMN_BATCH:
+                columnar.append_rows(tmp, meta, batch)
+                rows += len(batch)
+                batch = []
+    if batch:
+        columnar.append_rows(tmp, meta, batch)
+        rows += len(batch)
+    meta["hot_size"] = hot_size
+    meta["hot_ino"] = hot_ino if hot_size else None
+    columnar.write_meta(tmp, meta)
+
+    shutil.rmtree(base, ignore_errors=True)
+    os.replace(tmp, base)
+    return {"rows": rows, "coins": len(meta["coins"])}
+
+
+def open_snapshot_columns(coins: list[str] | None = None) -> "columnar.ColumnSet | None":
+    """
+    Zero-copy columnar view of every snapshot (ts/total/vs/prices).
+    Rebuilds the columns first if they are missing or out of sync with the
+    JSONL files; returns None only if that fails.
+    """
+    ensure_home()
+    base = _columns_dir()
+    meta = columnar.read_meta(base)
+    if not _columns_in_sync(meta):
+        try:
+            rebuild_columns()
+        except Exception:
+            return None
+        meta = columnar.read_meta(base)
+        if meta is None:
+            return None
+    return columnar.ColumnSet(base, meta, coins)
+
+
+def _points_from_columns(cols, lo: int, hi: int) -> list[dict]:
+    out = []
+    for i in range(lo, hi):
+        prices = {}
+        for cid, col in cols.prices.items():
+            v = col[i]
+            if v == v:  # not NaN
+                prices[cid] = v
+        out.append(
+            {
+                "ts": _iso_from_us(cols.ts[i]),
+                "total_value": cols.total[i],
+                "vs_currency": cols.currencies[cols.vs[i]],
+                "prices": prices,
+            }
+        )
+    return out
+
+
+def read_last_snapshot_points(n: int = 10) -> list[dict]:
+    """
+    Last n snapshots reduced to ts/total_value/vs_currency/prices, served from
+    the columnar store (falls back to decoding JSONL).
+    """
+    cols = open_snapshot_columns() if _using_jsonl() else None
+    if cols is None:
+        return read_last_snapshots(n)
+    with cols:
+        return _points_from_columns(cols, max(0, cols.rows - max(0, n)), cols.rows)
+
+
+def read_snapshot_points_range(start=None, end=None) -> list[dict]:
+    """Columnar counterpart of read_snapshots_range() (same reduced shape as above)."""
+    start_ms, end_ms = _bound_ms(start), _bound_ms(end, end=True)
+    cols = open_snapshot_columns() if _using_jsonl() else None
+    if cols is None:
+        return read_snapshots_range(start, end)
+    with cols:
+        lo = 0 if start_ms is None else bisect.bisect_left(cols.ts, start_ms * 1000)
+        hi = cols.rows if end_ms is None else bisect.bisect_right(cols.ts, end_ms * 1000 + 999)
+        return _points_from_columns(cols, lo, max(lo, hi))
+
+
+# ---- Storage backends ----
+#
+# The public snapshot/rollup functions above and below forward to the engine
+# named by config "storage_backend". JSONL is the default; the sidecars
+# (index, segments, columns) only apply to it.
+
+STORAGE_BACKENDS = ("jsonl", "sqlite")
+_IMPORT_BATCH = 1000
+_backend_cache: dict = {}
+
+
+class JsonlBackend(SnapshotBackend):
+    name = "jsonl"
+
+    def append_snapshots(self, objs: list[dict]) -> None:
+        appender = _HotFileAppender()
+        try:
+            _jsonl_append_snapshots(objs, appender, _snapshot_durability())
+        finally:
+            appender.close()
+
+    def read_last_snapshots(self, n: int) -> list[dict]:
+        return _jsonl_read_last_snapshots(n)
+
+    def read_last_totals(self, n: int) -> list[float]:
+        return _jsonl_read_last_totals(n)
+
+    def read_snapshots_range(self, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        return _jsonl_read_snapshots_range(start_ms, end_ms)
+
+    def snapshot_at(self, at_ms: int) -> dict | None:
+        return _jsonl_snapshot_at(at_ms)
+
+    def rebuild_daily_rollups(self) -> dict:
+        return _jsonl_rebuild_daily_rollups()
+
+    def refresh_daily_rollups(self) -> dict:
+        return _jsonl_refresh_daily_rollups()
+
+    def read_last_daily(self, n: int) -> list[dict]:
+        return _jsonl_read_last_daily(n)
+
+    def read_daily_all(self) -> list[dict]:
+        return _jsonl_read_daily_all()
+
+    def read_rollups(self, tier: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        return _jsonl_read_rollups(tier, start_ms, end_ms)
+
+    def read_last_rollups(self, tier: str, n: int) -> list[dict]:
+        return _jsonl_read_last_rollups(tier, n)
+
+    def rebuild_rollup_tiers(self) -> dict:
+        return _jsonl_rebuild_rollup_tiers()
+
+    def read_coin_daily(self, coin: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        return _jsonl_read_coin_daily(coin, start_ms, end_ms)
+
+    def read_last_coin_daily(self, coin: str, n: int) -> list[dict]:
+        return _jsonl_read_last_coin_daily(coin, n)
+
+    def rollup_coins(self) -> list[str]:
+        return _jsonl_rollup_coins()
+
+    def change_token(self):
+        return _file_size(SNAPSHOTS_PATH)
+
+
+def _sqlite_path() -> str:
+    from storage.sqlite_store import DB_NAME
+
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_PATH)), DB_NAME)
+
+
+def _configured_backend_name() -> str:
+    try:
+        name = str(read_config().get("storage_backend", "jsonl")).lower()
+    except Exception:
+        name = "jsonl"
+    return name if name in STORAGE_BACKENDS else "jsonl"
+
+
+def get_backend(name: str | None = None) -> SnapshotBackend:
+    """
+    Return the storage engine (default: the one configured in config.json).
+    Instances are cached per process and location, so the SQLite connection
+    is opened once.
+    """
+    name = name or _configured_backend_name()
+    if name != "sqlite":
+        return JsonlBackend()
+    from storage.sqlite_store import SqliteBackend
+
+    path = _sqlite_path()
+    key = (name, path, os.getpid())
+    backend = _backend_cache.get(key)
+    if backend is None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        backend = _backend_cache[key] = SqliteBackend(path)
+    return backend
+
+
+def _using_jsonl() -> bool:
+    return _configured_backend_name() == "jsonl"
+
+
+def import_jsonl_into_sqlite() -> dict:
+    """
+    Copy the JSONL history (sealed segments + hot file) into snapshots.db in
+    batches, skipping snapshots not newer than what the database already holds
+    (safe to re-run). Daily rollups are rebuilt afterwards.
+    """
+    ensure_home()
+    db = get_backend("sqlite")
+    since = db.latest_ts_ms()
+    imported = skipped = 0
+    batch: list[dict] = []
+    for path in _snapshot_sources():
+        if not os.path.exists(path):
+            continue
+        for _, _, row in _iter_snapshots(path):
+            ms = _ts_ms(row.get("ts"))
+            if ms is None or (since is not None and ms <= since):
+                skipped += 1
+                continue
+            batch.append(row)
+            if len(batch) >= _IMPORT_BATCH:
+                db.append_snapshots(batch)
+                imported += len(batch)
+                batch = []
+    if batch:
+        db.append_snapshots(batch)
+        imported += len(batch)
+    rollup = db.rebuild_daily_rollups()
+    return {"imported": imported, "skipped": skipped, "days": rollup["days"]}
+
+
+# ---- Config helpers ----
+
+DEFAULT_CONFIG = {
+    "vs_currency": "usd",
+    "update_interval_sec": 600,
+    "symbols_map": {"btc": "bitcoin", "eth": "ethereum", "ada": "cardano"},
+}
+
+
+def write_config(cfg: dict):
+    """Atomic write of config.json."""
+    # normalise the core keys; other settings (outlier_*, storage_backend, ...) pass through
+    clean = {
+        **cfg,
+        "vs_currency": cfg.get("vs_currency", DEFAULT_CONFIG["vs_currency"]),
+        "update_interval_sec": int(
+            cfg.get("update_interval_sec", DEFAULT_CONFIG["update_interval_sec"])
+        ),
+        "symbols_map": dict(cfg.get("symbols_map", DEFAULT_CONFIG["symbols_map"])),
+    }
+    write_json(CONFIG_PATH, clean)
+
+
+def ensure_config_exists():
+    """Create config.json with defaults if missing."""
+    if not os.path.exists(CONFIG_PATH):
+        write_config(DEFAULT_CONFIG.copy())
+
+
+# ---- Alerts (optional persistence) ----
+ALERTS_PATH = os.path.join(HOME_DIR, "alerts.json")
+
+
+def read_alerts():
+    return copy.deepcopy(read_json_cached(ALERTS_PATH, {"saved": {}}))
+
+
+def write_alerts(data: dict):
+    write_json(ALERTS_PATH, data)
+
+
+# ---- Daily rollups ----
+
+SNAPSHOTS_DAY_PATH = os.path.join(HOME_DIR, "snapshots_day.jsonl")
+
+
+def _date_utc(ts_iso: str) -> str:
+    # ts like "2025-10-08T15:22:01.123456+00:00" -> "2025-10-08"
+    try:
+        dt = datetime.fromisoformat(ts_iso.replace("Z", "+00:00"))
+    except Exception:
+        # fallback: treat unknown as UTC now, but avoid crash
+        dt = datetime.now(timezone.utc)
+    return dt.astimezone(timezone.utc).date().isoformat()
+
+def _read_all_daily_records(path=None) -> list[dict]:
+    """Load all rollup rows from snapshots_day.jsonl, or another tier's `path` (may return [])."""
+    ensure_home()
+    path = path or SNAPSHOTS_DAY_PATH
+    if not os.path.exists(path):
+        return []
+    out = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except Exception:
+                pass
+    return out
+
+
+def _write_all_daily_records(rows: list[dict], path=None) -> None:
+    """Rewrite snapshots_day.jsonl (or another tier's `path`) with the provided rows (atomic)."""
+    lines = [json.dumps(r, ensure_ascii=False) for r in rows]
+    _atomic_write_text(path or SNAPSHOTS_DAY_PATH, "\n".join(lines) + ("\n" if lines else ""))
+
+
+def _new_daily_rec(d: str, total: float) -> dict:
+    # first observation for the day
+    return {
+        "date": d,
+        "open": total,
+        "close": total,
+        "high": total,
+        "low": total,
+        "avg": total,
+        "count": 1,
+    }
+
+
+def _fold_daily_rec(rec: dict, total: float) -> dict:
+    # recompute fields (avg via weighted running sum)
+    cnt = int(rec.get("count", 0))
+    prev_sum = float(rec.get("avg", 0.0)) * max(cnt, 0)
+    cnt += 1
+    new_sum = prev_sum + total
+    rec.update(
+        {
+            "close": total,
+            "high": max(float(rec.get("high", total)), total),
+            "low": min(float(rec.get("low", total)), total),
+            "avg": (new_sum / cnt) if cnt else total,
+            "count": cnt,
+        }
+    )
+    return rec
+
+
+def _last_json_record(path) -> tuple[int, dict | None]:
+    """
+    Return (offset, record) for the last non-blank line of `path`.
+    (-1, None) when the file is missing/empty; (offset, None) if the line is torn.
+    """
+    if not os.path.exists(path):
+        return -1, None
+    for off, raw in _iter_lines_reversed(path):
+        try:
+            return off, json.loads(raw)
+        except Exception:
+            return off, None
+    return -1, None
+
+
+def _rewrite_tail(path, offset: int, rows: list[dict]) -> None:
+    """Overwrite `path` from byte `offset` onwards with `rows` (one JSON line each)."""
+    data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows).encode("utf-8")
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+
+def _upsert_daily_full_rewrite(d: str, total: float, path=None) -> None:
+    """Slow path: load every row, update/insert `d`, rewrite the file sorted."""
+    rows = _read_all_daily_records(path)
+
+    # find existing record for this date
+    idx = next((i for i, r in enumerate(rows) if r.get("date") == d), None)
+
+    if idx is None:
+        rows.append(_new_daily_rec(d, total))
+    else:
+        rows[idx] = _fold_daily_rec(rows[idx], total)
+
+    # keep file sorted by date (ascending)
+    rows.sort(key=lambda r: r.get("date", ""))
+
+    _write_all_daily_records(rows, path)
+
+
+def _upsert_rollup_row(path, d: str, total: float) -> None:
+    """Fold `total` into bucket `d` of a rollup file by rewriting only its last line."""
+    offset, last = _last_json_record(path)
+    if offset < 0:
+        _write_all_daily_records([_new_daily_rec(d, total)], path)
+        return
+    if last is None:
+        _upsert_daily_full_rewrite(d, total, path)
+        return
+
+    last_date = str(last.get("date", ""))
+    if last_date == d:
+        _rewrite_tail(path, offset, [_fold_daily_rec(last, total)])
+    elif last_date < d:
+        # re-emit the previous row so a missing trailing newline can't glue lines together
+        _rewrite_tail(path, offset, [last, _new_daily_rec(d, total)])
+    else:
+        _upsert_daily_full_rewrite(d, total, path)
+
+
+def upsert_daily_from_snapshot(snapshot: dict) -> None:
+    """
+    Incrementally update the daily rollup for the date of `snapshot`.
+    snapshot must contain: ts (ISO-8601), total_value (float).
+    Fields maintained per-day: open, close, high, low, avg, count.
+
+    Snapshots arrive in time order, so only the last line of the daily file is
+    ever touched: it is rewritten in place for the same day, or followed by a
+    new line when the UTC date rolls over. Cost does not depend on history
+    length. Out-of-order dates or a torn last line take the full-rewrite path.
+    The hourly, weekly and monthly tiers and the per-coin daily prices are
+    folded the same way.
+    """
+    ensure_home()
+    # derive date + total (guard but don't crash)
+    d = _date_utc(str(snapshot.get("ts", "")))
+    try:
+        total = float(snapshot.get("total_value", 0.0))
+    except Exception:
+        total = 0.0
+
+    _upsert_rollup_tiers(snapshot, total)
+    _upsert_coin_rollups(snapshot, d)
+    _upsert_rollup_row(SNAPSHOTS_DAY_PATH, d, total)
+
+
+_ROLLUP_FIELDS = ("ts", "total_value")
+
+
+def _aggregate_daily_file(
+    path, per_day: dict | None = None, tiers: dict | None = None
+) -> tuple[dict, int]:
+    """
+    Fold every snapshot line of `path` into per-day state (date -> OHLC/sum/count).
+    Passing an existing `per_day` continues the aggregation across files; with
+    `tiers` ({tier: state}, see _TIER_FILES) those are folded in the same pass.
+    """
+    per_day = {} if per_day is None else per_day
+    total_snapshots = 0
+    with _open_snapshot_file(path) as f:
+        for raw in f:
+            if not raw.strip():
+                continue
+            total_snapshots += 1
+            merged = _merged_record(raw)
+            if merged is not None:
+                state = _merged_states(merged)[0]
+                total_snapshots += int(state["count"]) - 1
+                _merge_daily_state(per_day, {**state, "date": _date_utc(str(merged.get("ts")))})
+                if tiers:
+                    dt = rollup_tiers.parse_utc(merged.get("ts"))
+                    for tier, st in tiers.items():
+                        _merge_daily_state(st, {**state, "date": rollup_tiers.bucket_key(tier, dt)})
+                continue
+            row = project_snapshot(raw, _ROLLUP_FIELDS)
+            if row is None:
+                continue
+            d = _date_utc(row.get("ts", ""))
+            total = float(row.get("total_value", 0.0))
+            _fold_daily_total(per_day, d, total)
+            if tiers:
+                _fold_tier_totals(tiers, row.get("ts", ""), total)
+    return per_day, total_snapshots
+
+
+def _fold_tier_totals(tiers: dict, ts, total: float) -> None:
+    """Fold one snapshot total into each of `tiers` ({tier: bucket key -> state})."""
+    dt = rollup_tiers.parse_utc(ts)
+    for tier, state in tiers.items():
+        _fold_daily_total(state, rollup_tiers.bucket_key(tier, dt), total)
+
+
+def _fold_daily_total(per_day: dict, d: str, total: float) -> None:
+    rec = per_day.get(d)
+    if rec is None:
+        per_day[d] = {
+            "date": d,
+            "open": total,
+            "close": total,
+            "high": total,
+            "low": total,
+            "sum": total,
+            "count": 1,
+        }
+    else:
+        # update OHLC + average
+        rec["close"] = total
+        rec["high"] = max(rec["high"], total)
+        rec["low"] = min(rec["low"], total)
+        rec["sum"] += total
+        rec["count"] += 1
+
+
+# Parallel rebuild: the file is cut into newline-aligned byte ranges that are
+# aggregated in a process pool. A chunk's first day may continue from the
+# previous chunk, so its totals come back raw and are folded in order during
+# the merge; every other day is complete within its chunk. Float sums are
+# therefore accumulated in exactly the serial order (bit-identical results).
+
+ROLLUP_PARALLEL_MIN_BYTES = 8 * 1024 * 1024
+
+
+def _rollup_workers() -> int:
+    """Worker processes for rebuilds (config "rollup_workers"; 1 disables the pool)."""
+    try:
+        workers = read_config().get("rollup_workers")
+    except Exception:
+        workers = None
+    if workers is None:
+        return min(os.cpu_count() or 1, 8)
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        return 1
+
+
+def _chunk_bounds(path, parts: int) -> list[tuple[int, int]]:
+    """Split `path` into up to `parts` byte ranges that start and end on line boundaries."""
+    size = os.path.getsize(path)
+    cuts = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(cuts[-1], size * i // parts))
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            if pos > cuts[-1]:
+                cuts.append(pos)
+    cuts.append(size)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def _aggregate_daily_chunk(path, start: int, end: int, tiers: tuple = ()) -> tuple:
+    """
+    Worker: aggregate lines in [start, end) of `path` per day and per tier in
+    `tiers`. Returns (line_count, {"1d" and each tier: (head_key, head_totals,
+    later_bucket_states)}).
+    """
+    parts = {tier: [None, [], {}] for tier in ("1d", *tiers)}  # head key, head totals, later
+    n = 0
+    with open(path, "rb") as f:
+        f.seek(start)
+        pos = start
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            if not raw.strip():
+                continue
+            n += 1
+            row = project_snapshot(raw, _ROLLUP_FIELDS)
+            if row is None:
+                continue
+            ts = row.get("ts", "")
+            total = float(row.get("total_value", 0.0))
+            dt = rollup_tiers.parse_utc(ts) if tiers else None
+            for tier, part in parts.items():
+                key = _date_utc(ts) if tier == "1d" else rollup_tiers.bucket_key(tier, dt)
+                if part[0] is None:
+                    part[0] = key
+                if key == part[0] and not part[2]:
+                    part[1].append(total)
+                else:
+                    _fold_daily_total(part[2], key, total)
+    return n, {t: (key, head, list(later.values())) for t, (key, head, later) in parts.items()}
+
+
+def _merge_chunk_parts(state: dict, parts: list) -> bool:
+    """Fold per-chunk (head_key, head_totals, later_states) into `state`, in chunk order."""
+    for head_key, head, later in parts:
+        for total in head:
+            _fold_daily_total(state, head_key, total)
+        for rec in later:
+            if rec["date"] in state:
+                # a bucket resumed out of order across chunks; only a serial pass
+                # keeps its running sum in file order
+                return False
+            state[rec["date"]] = rec
+    return True
+
+
+def _aggregate_daily_file_parallel(
+    path, per_day: dict | None = None, workers: int | None = None, tiers: dict | None = None
+) -> tuple[dict, int]:
+    """_aggregate_daily_file() over a process pool; same result, bit for bit."""
+    per_day = {} if per_day is None else per_day
+    workers = _rollup_workers() if workers is None else workers
+    if workers <= 1 or _codec_of(path) or _file_size(path) < max(1, ROLLUP_PARALLEL_MIN_BYTES):
+        return _aggregate_daily_file(path, per_day, tiers)
+    bounds = _chunk_bounds(path, workers * 4)
+    if len(bounds) < 2:
+        return _aggregate_daily_file(path, per_day, tiers)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    names = tuple(tiers or ())
+    with ProcessPoolExecutor(max_workers=min(workers, len(bounds))) as pool:
+        futures = [pool.submit(_aggregate_daily_chunk, str(path), a, b, names) for a, b in bounds]
+        chunks = [fut.result() for fut in futures]
+
+    merged = {"1d": {d: dict(rec) for d, rec in per_day.items()}}
+    merged.update({t: {k: dict(rec) for k, rec in tiers[t].items()} for t in names})
+    for tier, state in merged.items():
+        if not _merge_chunk_parts(state, [parts[tier] for _, parts in chunks]):
+            return _aggregate_daily_file(path, per_day, tiers)
+    for tier, state in merged.items():
+        target = per_day if tier == "1d" else tiers[tier]
+        target.clear()
+        target.update(state)
+    return per_day, sum(n for n, _ in chunks)
+
+
+def _merge_daily_state(per_day: dict, rec: dict) -> None:
+    """Merge one pre-aggregated day (e.g. from a sealed segment) into `per_day`."""
+    cur = per_day.get(rec["date"])
+    if cur is None:
+        per_day[rec["date"]] = dict(rec)
+        return
+    cur["close"] = rec["close"]
+    cur["high"] = max(cur["high"], rec["high"])
+    cur["low"] = min(cur["low"], rec["low"])
+    cur["sum"] += rec["sum"]
+    cur["count"] += rec["count"]
+
+
+def _daily_line(rec: dict) -> str:
+    """Render per-day state (with running sum) as a snapshots_day.jsonl row."""
+    avg = rec["sum"] / rec["count"] if rec["count"] else rec["close"]
+    return json.dumps(
+        {
+            "date": rec["date"],
+            "open": rec["open"],
+            "close": rec["close"],
+            "high": rec["high"],
+            "low": rec["low"],
+            "avg": avg,
+            "count": rec["count"],
+        },
+        ensure_ascii=False,
+    )
+
+
+def _write_daily_state(per_day: dict) -> int:
+    """Write per-day state to snapshots_day.jsonl in date order; returns day count."""
+    days_sorted = sorted(per_day.keys())
+    lines = [_daily_line(per_day[d]) for d in days_sorted]
+    _atomic_write_text(SNAPSHOTS_DAY_PATH, "\n".join(lines) + ("\n" if lines else ""))
+    return len(days_sorted)
+
+
+def _write_tier_states(tiers: dict) -> dict:
+    """Write each tier's bucket state to its file in key order; returns {tier: bucket count}."""
+    counts = {}
+    for tier, state in tiers.items():
+        lines = [_daily_line(state[k]) for k in sorted(state)]
+        _atomic_write_text(_tier_path(tier), "\n".join(lines) + ("\n" if lines else ""))
+        counts[tier] = len(lines)
+    return counts
+
+
+def rebuild_daily_rollups():
+    """Rebuild the daily rollups, and the 1h/1w/1M tiers with them (idempotent)."""
+    ensure_home()
+    return get_backend().rebuild_daily_rollups()
+
+
+def _jsonl_rebuild_daily_rollups() -> dict:
+    res = _jsonl_rebuild_rollups()
+    return {"days": res["days"], "snapshots": res["snapshots"]}
+
+
+def _jsonl_rebuild_rollups() -> dict:
+    """
+    Rebuild snapshots_day.jsonl, the 1h/1w/1M tier files and the per-coin daily
+    files from the snapshot history, the tiers in the same pass as the days.
+    Sealed segments contribute their cached state; only the hot file is
+    re-parsed. Returns {"days", "snapshots", "1h", "1w", "1M"}.
+    """
+    manifest = read_segment_manifest()
+    sealed = _sealed_segment_paths(manifest)
+    hot = str(SNAPSHOTS_PATH)
+    hot_ino, hot_size = _file_ino(hot), _file_size(hot)
+    tiers: dict = {tier: {} for tier in _TIER_FILES}
+    if not sealed and not os.path.exists(SNAPSHOTS_PATH):
+        # nothing to do
+        _atomic_write_text(SNAPSHOTS_DAY_PATH, "")
+        counts = _write_tier_states(tiers)
+        _checkpoint_after_rebuild(manifest, hot_ino, 0, {}, tiers, 0, {})
+        return {"days": 0, "snapshots": 0, **counts}
+
+    # Aggregate in-memory per date (and per tier bucket)
+    per_day = {}  # date -> dict
+    total_snapshots = 0
+    for seg in sealed:
+        days, n, seg_tiers = _segment_rollup_state(seg)
+        for rec in days:
+            _merge_daily_state(per_day, rec)
+        for tier, state in tiers.items():
+            for rec in seg_tiers.get(tier, []):
+                _merge_daily_state(state, rec)
+        total_snapshots += n
+    if os.path.exists(SNAPSHOTS_PATH):
+        per_day, n = _aggregate_daily_file_parallel(SNAPSHOTS_PATH, per_day, tiers=tiers)
+        total_snapshots += n
+
+    days = _write_daily_state(per_day)
+    counts = _write_tier_states(tiers)
+    try:
+        per_coin = _coin_day_states()
+        _write_coin_states(per_coin)
+    except Exception:
+        per_coin = None  # per-coin files are rebuilt on their next read if missing
+    if per_coin is not None and _file_ino(hot) == hot_ino and _file_size(hot) == hot_size:
+        # only checkpoint a consistent view (no append raced the aggregation)
+        _checkpoint_after_rebuild(
+            manifest, hot_ino, max(0, hot_size), per_day, tiers, total_snapshots, per_coin
+        )
+    else:
+        _remove_rollup_checkpoint()
+    return {"days": days, "snapshots": total_snapshots, **counts}
+
+
+def refresh_daily_rollups() -> dict:
+    """
+    Bring the daily rollups and the 1h/1w/1M tiers up to date with the snapshot
+    history, cheaply. Returns {"days", "snapshots", "incremental"}.
+    """
+    ensure_home()
+    return get_backend().refresh_daily_rollups()
+
+
+# ---- Rollup checkpoint ----
+#
+# snapshots_day.jsonl.ckpt remembers how far the last rebuild got: the hot
+# file's identity (inode, first ts) and byte offset, the sealed segments it
+# covered, and for every tier (1h/1d/1w/1M) the exact running state of its
+# last (still open) bucket together with that bucket's offset in the tier's
+# file. A refresh folds only the lines after the hot offset and rewrites each
+# tier file from its open bucket onwards. The per-coin daily files are marked
+# and refreshed the same way. Truncation, rotation, rewritten segments or
+# out-of-order buckets fall back to a full rebuild.
+
+_CHECKPOINT_VERSION = 3
+
+
+def _rollup_checkpoint_path() -> str:
+    return str(SNAPSHOTS_DAY_PATH) + ".ckpt"
+
+
+def _remove_rollup_checkpoint() -> None:
+    try:
+        os.remove(_rollup_checkpoint_path())
+    except OSError:
+        pass
+
+
+def _segment_names(manifest: dict | None) -> list[str]:
+    return [_raw_segment_name(seg["file"]) for seg in (manifest or {}).get("segments", [])]
+
+
+def _write_rollup_checkpoint(
+    manifest: dict | None,
+    hot_ino: int,
+    offset: int,
+    snapshots: int,
+    marks: dict,
+    coin_marks: dict,
+) -> None:
+    """
+    `marks`: {tier: {"count", "open", "offset"}} for every rollup tier;
+    `coin_marks` the same per coin for the files in coins_day/.
+    """
+    first = _first_json_record(SNAPSHOTS_PATH) if offset else None
+    write_json(
+        _rollup_checkpoint_path(),
+        {
+            "v": _CHECKPOINT_VERSION,
+            "segments": _segment_names(manifest),
+            "hot_ino": hot_ino,
+            "hot_first_ts": (first or {}).get("ts"),
+            "offset": offset,
+            "snapshots": snapshots,
+            "tiers": marks,
+            "coins": coin_marks,
+        },
+    )
+
+
+def _checkpoint_after_rebuild(
+    manifest: dict | None,
+    hot_ino: int,
+    offset: int,
+    per_day: dict,
+    tiers: dict,
+    snapshots: int,
+    per_coin: dict,
+) -> None:
+    """Checkpoint the state a full rebuild just wrote to the daily, tier and per-coin files."""
+    marks = {
+        tier: _rollup_mark(_tier_path(tier), state)
+        for tier, state in {"1d": per_day, **tiers}.items()
+    }
+    coin_marks = {
+        coin: _rollup_mark(_coin_day_path(coin), state) for coin, state in per_coin.items()
+    }
+    if None in marks.values() or None in coin_marks.values():
+        _remove_rollup_checkpoint()
+        return
+    _write_rollup_checkpoint(manifest, hot_ino, offset, snapshots, marks, coin_marks)
+
+
+def _rollup_mark(path: str, state: dict) -> dict | None:
+    """{"count", "open", "offset"} of a rollup file just written from `state`, or None."""
+    open_rec = state[max(state)] if state else None
+    if open_rec is None:
+        return {"count": 0, "open": None, "offset": max(0, _file_size(path))}
+    pos, last = _last_json_record(path)
+    if last is None or last.get("date") != open_rec["date"]:
+        return None
+    return {"count": len(state), "open": open_rec, "offset": pos}
+
+
+def _load_rollup_checkpoint() -> dict | None:
+    path = _rollup_checkpoint_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        ck = read_json(path)
+    except Exception:
+        return None
+    return ck if ck.get("v") == _CHECKPOINT_VERSION else None
+
+
+def _rollup_mark_holds(path: str, mark) -> bool:
+    """True if the rollup file still starts its checkpointed open bucket at mark["offset"]."""
+    if not isinstance(mark, dict):
+        return False
+    if _file_size(path) < int(mark.get("offset", 0)):
+        return False
+    open_rec = mark.get("open")
+    if open_rec is None:
+        return True
+    head = next((raw for _, raw in _iter_lines_from(path, int(mark["offset"]))), b"")
+    try:
+        return json.loads(head).get("date") == open_rec["date"]
+    except Exception:
+        return False
+
+
+def _checkpoint_sources(ck: dict, manifest: dict | None) -> list[tuple[str, int]] | None:
+    """(path, start offset) pairs still to fold since `ck`, or None if it no longer applies."""
+    names = _segment_names(manifest)
+    covered = ck.get("segments", [])
+    if names[: len(covered)] != covered:
+        return None  # sealed history changed underneath the checkpoint
+    hot = str(SNAPSHOTS_PATH)
+    offset = int(ck.get("offset", 0))
+    new_segs = (manifest or {}).get("segments", [])[len(covered) :]
+    if not new_segs:
+        if offset and (_file_ino(hot) != ck.get("hot_ino") or _file_size(hot) < offset):
+            return None  # rotated or truncated
+        return [(hot, offset)] if os.path.exists(hot) else []
+    # the checkpointed hot file has since been sealed as the first new segment
+    first = new_segs[0]
+    if offset and (
+        first.get("start") != ck.get("hot_first_ts")
+        or int(first.get("raw_bytes", first.get("bytes", 0))) < offset
+    ):
+        return None
+    base = _segments_dir()
+    out = [(os.path.join(base, first["file"]), offset)]
+    out += [(os.path.join(base, seg["file"]), 0) for seg in new_segs[1:]]
+    if os.path.exists(hot):
+        out.append((hot, 0))
+    return out
+
+
+def _rewrite_rollup_tail(path: str, state: dict, mark: dict, count: int) -> dict:
+    """Rewrite a rollup file from its open bucket on with `state`; returns the new mark."""
+    if not state:
+        return {**mark, "count": count}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = [_daily_line(state[k]) + "\n" for k in sorted(state)]
+    data = "".join(lines).encode("utf-8")
+    offset = int(mark["offset"])
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+    offset += len(data) - len(lines[-1].encode("utf-8"))
+    return {"count": count, "open": state[max(state)], "offset": offset}
+
+
+def _decoder_at(path: str, offset: int) -> _SnapshotDecoder:
+    """A decoder primed with the full lines before `offset`, for v2 repeats that follow it."""
+    dec = _SnapshotDecoder()
+    if offset:
+        start = max((e[1] for e in _ensure_index(path) if e[1] < offset), default=0)
+        for off, raw in _iter_lines_from(path, start):
+            if off >= offset:
+                break
+            dec.feed(raw, want=False)
+    return dec
+
+
+def _jsonl_refresh_daily_rollups() -> dict:
+    """Checkpointed counterpart of _jsonl_rebuild_daily_rollups() (see above)."""
+    ck = _load_rollup_checkpoint()
+    manifest = read_segment_manifest()
+    sources = _checkpoint_sources(ck, manifest) if ck is not None else None
+    marks = (ck or {}).get("tiers") or {}
+    coin_marks = (ck or {}).get("coins")
+    if sources is not None and not (
+        all(_rollup_mark_holds(_tier_path(t), marks.get(t)) for t in ROLLUP_TIERS)
+        and isinstance(coin_marks, dict)
+        and all(_rollup_mark_holds(_coin_day_path(c), m) for c, m in coin_marks.items())
+    ):
+        sources = None
+    if sources is None:
+        return {**_jsonl_rebuild_daily_rollups(), "incremental": False}
+
+    hot = str(SNAPSHOTS_PATH)
+    states, last, counts = {}, {}, {}
+    for tier in ROLLUP_TIERS:
+        open_rec = marks[tier].get("open")
+        states[tier] = {open_rec["date"]: dict(open_rec)} if open_rec else {}
+        last[tier] = open_rec["date"] if open_rec else ""
+        counts[tier] = int(marks[tier].get("count", 0))
+    # per-coin days, unless coins_day/ is still to be built in full on its first read
+    coins = None
+    if os.path.isdir(_coins_day_dir()):
+        coins = {}
+        for coin, mark in coin_marks.items():
+            open_rec = mark.get("open")
+            coins[coin] = {open_rec["date"]: dict(open_rec)} if open_rec else {}
+    coin_last = {coin: max(state, default="") for coin, state in (coins or {}).items()}
+    coin_counts = {coin: int(mark.get("count", 0)) for coin, mark in coin_marks.items()}
+    snapshots = int(ck.get("snapshots", 0))
+    hot_offset = 0
+    for path, start in sources:
+        is_hot = path == hot
+        dec = _decoder_at(path, start) if coins is not None else None
+        off = start
+        for off, raw in _iter_lines_from(path, start):
+            if is_hot and not raw.endswith(b"\n"):
+                break  # torn/in-flight append; picked up next time
+            if is_hot:
+                hot_offset = off + len(raw)
+            snapshots += 1
+            snap = dec.feed(raw) if dec is not None else None
+            row = project_snapshot(raw, _ROLLUP_FIELDS)
+            if row is None:
+                continue
+            ts = row.get("ts", "")
+            total = float(row.get("total_value", 0.0))
+            dt = rollup_tiers.parse_utc(ts)
+            for tier, state in states.items():
+                key = _date_utc(ts) if tier == "1d" else rollup_tiers.bucket_key(tier, dt)
+                if key < last[tier]:
+                    # an earlier bucket reopened: its running sum is gone, start over
+                    return {**_jsonl_rebuild_daily_rollups(), "incremental": False}
+                if key not in state:
+                    counts[tier] += 1
+                _fold_daily_total(state, key, total)
+                last[tier] = key
+            if snap is None:
+                continue
+            d = _date_utc(ts)
+            for coin, value in (snap.get("prices") or {}).items():
+                price = _coin_price(value)
+                if price is None:
+                    continue
+                if d < coin_last.get(coin, ""):
+                    return {**_jsonl_rebuild_daily_rollups(), "incremental": False}
+                state = coins.setdefault(coin, {})
+                if d not in state:
+                    coin_counts[coin] = coin_counts.get(coin, 0) + 1
+                _fold_daily_total(state, d, price)
+                coin_last[coin] = d
+        if is_hot and hot_offset == 0:
+            hot_offset = start
+
+    marks = {
+        tier: _rewrite_rollup_tail(_tier_path(tier), state, marks[tier], counts[tier])
+        for tier, state in states.items()
+    }
+    if coins is not None:
+        # a coin first seen since the checkpoint owns its whole file
+        coin_marks = {
+            coin: _rewrite_rollup_tail(
+                _coin_day_path(coin),
+                state,
+                coin_marks.get(coin) or {"offset": 0},
+                coin_counts[coin],
+            )
+            for coin, state in coins.items()
+        }
+    _write_rollup_checkpoint(manifest, _file_ino(hot), hot_offset, snapshots, marks, coin_marks)
+    return {"days": counts["1d"], "snapshots": snapshots, "incremental": True}
+
+
+def read_last_daily(n: int = 14):
+    """Last n daily rollup rows (chronological)."""
+    ensure_home()
+    return get_backend().read_last_daily(n)
+
+
+def _jsonl_read_last_daily(n: int) -> list[dict]:
+    """Tail the daily rollups file (rebuild first if missing/empty)."""
+    if not os.path.exists(SNAPSHOTS_DAY_PATH):
+        # lazy build once
+        _jsonl_rebuild_daily_rollups()
+    return _tail_json(SNAPSHOTS_DAY_PATH, n)
+
+
+def read_daily_all() -> list[dict]:
+    """Return all daily rollup rows (chronological)."""
+    ensure_home()
+    return get_backend().read_daily_all()
+
+
+def _jsonl_read_daily_all() -> list[dict]:
+    if not os.path.exists(SNAPSHOTS_DAY_PATH):
+        return []
+    rows = []
+    with open(SNAPSHOTS_DAY_PATH, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
                 continue
             try:
-                obj = json.loads(line)
-                rows.append(float(obj.get("total_value", 0.0)))
+                rows.append(json.loads(line))
             except Exception:
                 pass
-    return rows[-n:]
+    rows.sort(key=lambda r: r.get("date", ""))
+    return rows
+
+# ---- Rollup tiers (1h / 1d / 1w / 1M, see storage/rollup_tiers.py) ----
+#
+# The daily tier is snapshots_day.jsonl above. The others live next to it in
+# snapshots_{hour,week,month}.jsonl with the same row shape, and are folded
+# from each appended snapshot alongside the daily file. Installs that predate
+# a tier file build it on the first read (rebuild_rollup_tiers()).
+
+ROLLUP_TIERS = rollup_tiers.ROLLUP_TIERS
+_TIER_FILES = {
+    "1h": "snapshots_hour.jsonl",
+    "1w": "snapshots_week.jsonl",
+    "1M": "snapshots_month.jsonl",
+}
+
+
+def _tier_path(tier: str) -> str:
+    if tier == "1d":
+        return str(SNAPSHOTS_DAY_PATH)
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_DAY_PATH)), _TIER_FILES[tier])
+
+
+def _upsert_rollup_tiers(snapshot: dict, total: float) -> None:
+    dt = rollup_tiers.parse_utc(snapshot.get("ts", ""))
+    had_history = _file_size(SNAPSHOTS_DAY_PATH) > 0
+    for tier in _TIER_FILES:
+        path = _tier_path(tier)
+        if had_history and not os.path.exists(path):
+            continue  # older history: built in full on first read
+        try:
+            _upsert_rollup_row(path, rollup_tiers.bucket_key(tier, dt), total)
+        except Exception:
+            pass
+
+
+def rebuild_rollup_tiers() -> dict:
+    """Rebuild the hourly, weekly and monthly rollups; returns {"snapshots", "1h", "1w", "1M"}."""
+    ensure_home()
+    return get_backend().rebuild_rollup_tiers()
+
+
+def _jsonl_rebuild_rollup_tiers() -> dict:
+    """The tiers are rebuilt with the daily rollups, in the same pass."""
+    res = _jsonl_rebuild_rollups()
+    return {"snapshots": res["snapshots"], **{tier: res[tier] for tier in _TIER_FILES}}
+
+
+def _jsonl_read_rollups(tier: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+    if tier != "1d" and not os.path.exists(_tier_path(tier)):
+        _jsonl_rebuild_rollup_tiers()
+    return _read_rollup_range(_tier_path(tier), tier, start_ms, end_ms)
+
+
+def _rollup_line_key(raw: bytes) -> str | None:
+    try:
+        return str(json.loads(raw)["date"])
+    except Exception:
+        return None
+
+
+def _rollup_range_offset(f, lo: str) -> int:
+    """
+    Byte offset in the rollup file `f` (rows in key order) of the first line
+    whose key is >= `lo`, by binary search over line starts. An undecodable
+    line counts as >= `lo`, so the result is never past the true start.
+    """
+    a, b = 0, f.seek(0, os.SEEK_END)
+    while a < b:
+        mid = (a + b) // 2
+        f.seek(max(0, mid - 1))
+        if mid:
+            f.readline()  # to the first line starting at or after mid
+        raw = f.readline()
+        key = _rollup_line_key(raw) if raw.strip() else None
+        if raw and key is not None and key < lo:
+            a = mid + 1
+        else:
+            b = mid
+    if a:
+        f.seek(a - 1)
+        f.readline()
+        return f.tell()
+    return 0
+
+
+def _read_rollup_range(path, tier: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+    """
+    Rows of the rollup file `path` whose bucket overlaps [start_ms, end_ms].
+    Rows are kept in key order, so only the requested range is read: a binary
+    search finds the first row and the scan stops after the last.
+    """
+    if not os.path.exists(path):
+        return []
+    lo = rollup_tiers.key_of_ms(tier, start_ms) if start_ms is not None else None
+    hi = rollup_tiers.key_of_ms(tier, end_ms) if end_ms is not None else None
+    out = []
+    with open(path, "rb") as f:
+        f.seek(_rollup_range_offset(f, lo) if lo is not None else 0)
+        for raw in f:
+            try:
+                row = json.loads(raw)
+            except Exception:
+                continue
+            key = str(row.get("date", ""))
+            if hi is not None and key > hi:
+                break
+            if lo is None or key >= lo:
+                out.append(row)
+    return out
+
+
+def _jsonl_read_last_rollups(tier: str, n: int) -> list[dict]:
+    if tier == "1d":
+        return _jsonl_read_last_daily(n)
+    if not os.path.exists(_tier_path(tier)):
+        _jsonl_rebuild_rollup_tiers()
+    return _tail_json(_tier_path(tier), n)
+
+
+def read_rollups(tier: str, start=None, end=None) -> list[dict]:
+    """Rollup rows of `tier` whose bucket overlaps [start, end] (dates or ISO timestamps)."""
+    ensure_home()
+    rollup_tiers.check_tier(tier)
+    return get_backend().read_rollups(tier, _bound_ms(start), _bound_ms(end, end=True))
+
+
+def read_last_rollups(tier: str, n: int) -> list[dict]:
+    """Last n rollup rows of `tier` (chronological)."""
+    ensure_home()
+    rollup_tiers.check_tier(tier)
+    return get_backend().read_last_rollups(tier, n)
+
+
+def pick_rollup_tier(start=None, end=None, points: int = 100, allow_raw: bool = False) -> str:
+    """
+    Coarsest tier that still gives about `points` rows between `start` and `end`
+    (end defaults to now; without a start the daily tier is used). With
+    `allow_raw`, "raw" when even hourly buckets would give fewer rows.
+    """
+    start_ms = _bound_ms(start)
+    if start_ms is None:
+        return "1d"
+    end_ms = _bound_ms(end, end=True)
+    if end_ms is None:
+        end_ms = int(time.time() * 1000)
+    finest = ROLLUP_TIERS[0]
+    step = max(0, end_ms - start_ms) / 1000.0 / max(1, int(points))
+    if allow_raw and step < rollup_tiers.TIER_SECONDS[finest]:
+        return "raw"
+    return rollup_tiers.pick_tier(end_ms - start_ms, points)
+
+
+# ---- Per-coin daily rollups ----
+#
+# coins_day/<coin id>.jsonl holds the daily OHLC/avg/count of one coin's price
+# (rows shaped like snapshots_day.jsonl), so a single coin is read without
+# parsing the others. Prices that are missing or not positive (a failed fetch
+# is recorded as 0.0) are skipped. Like the tiers above, an install whose
+# history predates coins_day/ builds it on the first read.
+
+
+def _coins_day_dir() -> str:
+    return os.path.join(os.path.dirname(str(SNAPSHOTS_DAY_PATH)), "coins_day")
+
+
+def _coin_day_path(coin: str) -> str:
+    return os.path.join(_coins_day_dir(), quote(str(coin), safe="") + ".jsonl")
+
+
+def _coin_price(value) -> float | None:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    price = float(value)
+    return price if price > 0 and price == price else None
+
+
+def _upsert_coin_rollups(snapshot: dict, d: str) -> None:
+    base = _coins_day_dir()
+    if not os.path.isdir(base):
+        if _file_size(SNAPSHOTS_DAY_PATH) > 0:
+            return  # older history: built in full on first read
+        os.makedirs(base, exist_ok=True)
+    for coin, value in (snapshot.get("prices") or {}).items():
+        price = _coin_price(value)
+        if price is None:
+            continue
+        try:
+            _upsert_rollup_row(_coin_day_path(coin), d, price)
+        except Exception:
+            pass
+
+
+_COIN_FIELDS = ("ts", "prices", "ds")
+
+
+def _fold_coin_rows(per_coin: dict, rows) -> None:
+    """Fold snapshot projections (_COIN_FIELDS) into {coin: per-day state}."""
+    for row in rows:
+        d = _date_utc(str(row.get("ts", "")))
+        if isinstance(row.get("ds"), dict):
+            for coin, state in _merged_states(row)[1].items():
+                _merge_daily_state(per_coin.setdefault(coin, {}), {**state, "date": d})
+            continue
+        for coin, value in (row.get("prices") or {}).items():
+            price = _coin_price(value)
+            if price is not None:
+                _fold_daily_total(per_coin.setdefault(coin, {}), d, price)
+
+
+def _coin_day_states() -> dict:
+    """
+    coin id -> per-day state, from the columnar store (or decoded prices as a
+    fallback). Merged records only keep their close in the columns, so history
+    with downsampled segments takes the per-coin state cached in the sealed
+    segments' sidecars and decodes only the hot file.
+    """
+    per_coin: dict = {}
+    manifest = read_segment_manifest() or {}
+    merged = any(seg.get("downsampled") for seg in manifest.get("segments", []))
+    if merged:
+        for seg in _sealed_segment_paths(manifest):
+            for coin, days in _segment_coin_state(seg).items():
+                state = per_coin.setdefault(coin, {})
+                for rec in days:
+                    _merge_daily_state(state, rec)
+        _fold_coin_rows(per_coin, iter_snapshot_fields(_COIN_FIELDS, [str(SNAPSHOTS_PATH)]))
+        return per_coin
+    cols = open_snapshot_columns()
+    if cols is not None:
+        with cols:
+            day_of: dict = {}
+            days = []
+            for us in cols.ts:
+                key = us // 86_400_000_000
+                d = day_of.get(key)
+                if d is None:
+                    d = day_of[key] = _iso_from_us(us)[:10]
+                days.append(d)
+            for coin, col in cols.prices.items():
+                state = per_coin.setdefault(coin, {})
+                for i in range(cols.rows):
+                    price = col[i]
+                    if price > 0:  # NaN (coin absent) compares false
+                        _fold_daily_total(state, days[i], price)
+        return {coin: state for coin, state in per_coin.items() if state}
+    _fold_coin_rows(per_coin, iter_snapshot_fields(_COIN_FIELDS))
+    return per_coin
+
+
+def _jsonl_rebuild_coin_rollups() -> dict:
+    """Rewrite coins_day/ from the snapshot history; returns {"coins", "days"}."""
+    return _write_coin_states(_coin_day_states())
+
+
+def _write_coin_states(per_coin: dict) -> dict:
+    """Write {coin: per-day state} as coins_day/, dropping other coins; {"coins", "days"}."""
+    base = _coins_day_dir()
+    os.makedirs(base, exist_ok=True)
+    keep = set()
+    days = 0
+    for coin, state in per_coin.items():
+        path = _coin_day_path(coin)
+        lines = [_daily_line(state[d]) for d in sorted(state)]
+        _atomic_write_text(path, "\n".join(lines) + "\n")
+        keep.add(os.path.basename(path))
+        days += len(lines)
+    for name in os.listdir(base):
+        if name.endswith(".jsonl") and name not in keep:
+            os.remove(os.path.join(base, name))
+    return {"coins": len(per_coin), "days": days}
+
+
+def _ensure_coin_rollups() -> None:
+    if not os.path.isdir(_coins_day_dir()):
+        _jsonl_rebuild_coin_rollups()
+        _remove_rollup_checkpoint()  # its refresh marks don't cover the new files
+
+
+def _jsonl_read_coin_daily(coin: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+    _ensure_coin_rollups()
+    return _read_rollup_range(_coin_day_path(coin), "1d", start_ms, end_ms)
+
+
+def _jsonl_read_last_coin_daily(coin: str, n: int) -> list[dict]:
+    _ensure_coin_rollups()
+    return _tail_json(_coin_day_path(coin), n)
+
+
+def _jsonl_rollup_coins() -> list[str]:
+    _ensure_coin_rollups()
+    return sorted(
+        unquote(name[: -len(".jsonl")])
+        for name in os.listdir(_coins_day_dir())
+        if name.endswith(".jsonl")
+    )
+
+
+def read_coin_daily(coin: str, start=None, end=None) -> list[dict]:
+    """Daily OHLC/avg/count of `coin`'s price between start and end (dates or ISO timestamps)."""
+    ensure_home()
+    return get_backend().read_coin_daily(coin, _bound_ms(start), _bound_ms(end, end=True))
+
+
+def read_last_coin_daily(coin: str, n: int = 14) -> list[dict]:
+    """Last n daily price rollups of `coin` (chronological)."""
+    ensure_home()
+    return get_backend().read_last_coin_daily(coin, n)
+
+
+def rollup_coins() -> list[str]:
+    """Coin ids that have per-coin daily rollups."""
+    ensure_home()
+    return get_backend().rollup_coins()
+
+
+# --- Outlier guard ---
+SNAPSHOTS_BAD_PATH = os.path.join(HOME_DIR, "snapshots_bad.jsonl")
+
+def _read_last_totals(n: int = 10) -> list[float]:
+    """Return the last n total_value numbers (chronological tail)."""
+    ensure_home()
+    return get_backend().read_last_totals(n)
+
+
+def _jsonl_read_last_totals(n: int) -> list[float]:
+    rows = []
+    for obj in _tail_json_sources(_snapshot_sources(), n, ("total_value",)):
+        try:
+            rows.append(float(obj.get("total_value", 0.0)))
+        except Exception:
+            pass
+    return rows
 
 def _median(vals: list[float]) -> float:
     if not vals:
@@ -376,34 +3062,19 @@ def _write_bad_snapshot(obj: dict) -> None:
     except Exception:
         pass  # never block caller
 
-def guarded_append_snapshot_line(
-    obj: dict,
-    window: int | None = None,
-    threshold: float | None = None,  # fraction 0..1 if provided
+def _screen_outlier(
+    obj: dict, total: float, ref_count: int, med: float, window: int, threshold: float
 ) -> bool:
     """
-    Append snapshot with an outlier guard.
-    Returns True if appended; False if skipped as outlier (logged to snapshots_bad.jsonl).
+    Decide whether `total` is acceptable against a reference median.
+    Returns True to keep; False after logging the outlier to snapshots_bad.jsonl.
     """
-    try:
-        total = float(obj.get("total_value", 0.0))
-    except Exception:
-        total = 0.0
-
-    # pick params (prefer explicit args; else config)
-    if window is None or threshold is None:
-        cfg_win, cfg_thr = _guard_params_from_config()
-        window = cfg_win if window is None else window
-        threshold = cfg_thr if threshold is None else threshold
-
-    ref = _read_last_totals(int(window))
-    if len(ref) < max(3, min(int(window), 10)):
-        append_snapshot_line(obj)
+    # not enough history yet -> accept unconditionally
+    if ref_count < max(3, min(int(window), 10)):
         return True
 
-    med = _median(ref)
     base = med if med > 0 else 1.0
-    deviation = abs(total - med) / base
+    deviation = abs(total - med) / base  # e.g., 0.82 means 82% away from median
 
     if deviation > float(threshold):
         _write_bad_snapshot({
@@ -417,29 +3088,233 @@ def guarded_append_snapshot_line(
             "prices": obj.get("prices", {}),
         })
         return False
-
-    append_snapshot_line(obj)
     return True
 
-    med = _median(ref)
-    base = med if med > 0 else 1.0
-    deviation = abs(total - med) / base  # e.g., 0.82 means 82% away from median
 
-    if deviation > threshold:
-        # Outlier — log to 'bad' file, skip normal append/rollup.
-        _write_bad_snapshot({
-            "reason": "outlier_total_value",
-            "median": med,
-            "total_value": total,
-            "deviation": deviation,
-            "threshold": threshold,
-            "ts": obj.get("ts"),
-            "vs_currency": obj.get("vs_currency", "usd"),
-            "prices": obj.get("prices", {}),
-        })
+def _snapshot_total(obj: dict) -> float:
+    try:
+        return float(obj.get("total_value", 0.0))
+    except Exception:
+        return 0.0
+
+
+def _file_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return -1
+
+
+class SnapshotWriter:
+    """
+    Group-commit snapshot appender for the daemon and bulk ingestion.
+
+    Buffers snapshots and hands them to the storage engine as one batch once
+    `batch_size` are pending or the oldest has waited `flush_sec`. The JSONL
+    engine writes each batch through a single long-lived file handle and fsyncs
+    per "snapshot_durability". Pending snapshots are not visible to readers
+    until flushed; call flush()/close() (or use it as a context manager) on exit.
+    """
+
+    def __init__(
+        self,
+        batch_size: int | None = None,
+        flush_sec: float | None = None,
+        durability: str | None = None,
+    ):
+        cfg = {}
+        try:
+            cfg = read_config()
+        except Exception:
+            pass
+        if batch_size is None:
+            batch_size = cfg.get("snapshot_batch_size", 64)
+        if flush_sec is None:
+            flush_sec = cfg.get("snapshot_flush_sec", 5.0)
+        if durability is None:
+            durability = _snapshot_durability()
+        if durability not in DURABILITY_POLICIES:
+            raise ValueError(
+                f"Unknown durability '{durability}'. Allowed: {', '.join(DURABILITY_POLICIES)}"
+            )
+        self.batch_size = max(1, int(batch_size))
+        self.flush_sec = max(0.0, float(flush_sec))
+        self.durability = durability
+        self._pending: list[dict] = []
+        self._first_at: float | None = None
+        self._appender = _HotFileAppender()
+        self._flushing = False
+        self._flush_listeners: list = []
+
+    def add_flush_listener(self, fn) -> None:
+        """Call fn(token_before, token_after) with the backend change tokens around each flush."""
+        self._flush_listeners.append(fn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def pending(self) -> list[dict]:
+        """Snapshots accepted but not written yet (oldest first)."""
+        return list(self._pending)
+
+    def append(self, obj: dict) -> None:
+        if not self._pending:
+            self._first_at = time.monotonic()
+        self._pending.append(obj)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flush when the oldest pending snapshot has waited `flush_sec`."""
+        if self._pending and time.monotonic() - (self._first_at or 0.0) >= self.flush_sec:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all pending snapshots (best-effort, like append_snapshot_line)."""
+        if self._flushing or not self._pending:
+            return  # re-entered from a signal handler: the running flush finishes the batch
+        self._flushing = True
+        try:
+            batch, self._pending, self._first_at = self._pending, [], None
+            ensure_home()
+            backend = get_backend()
+            before = backend.change_token()
+            if isinstance(backend, JsonlBackend):
+                _jsonl_append_snapshots(batch, self._appender, self.durability)
+            else:
+                # one transaction per batch; SQLite's own sync settings apply
+                backend.append_snapshots(batch)
+            after = backend.change_token()
+            for fn in self._flush_listeners:
+                fn(before, after)
+        except Exception:
+            pass
+        finally:
+            self._flushing = False
+
+    def close(self) -> None:
+        self.flush()
+        self._appender.close()
+
+
+class OutlierGuard:
+    """
+    In-memory outlier guard for long-running processes (daemon).
+
+    Seeds itself once from the tail of snapshots.jsonl, then keeps the last
+    `window` accepted totals in a ring buffer alongside a sorted copy, so each
+    check costs O(window) with no file reads. If the snapshot store changes
+    behind our back (e.g. a one-shot `crypto track`), it re-seeds from the tail.
+    With a `writer`, accepted snapshots are appended through it (group commit);
+    the writer's own flushes move the change token without forcing a re-seed.
+    """
+
+    def __init__(
+        self,
+        window: int | None = None,
+        threshold: float | None = None,
+        writer: SnapshotWriter | None = None,
+    ):
+        if window is None or threshold is None:
+            cfg_win, cfg_thr = _guard_params_from_config()
+            window = cfg_win if window is None else window
+            threshold = cfg_thr if threshold is None else threshold
+        self.window = int(window)
+        self.threshold = float(threshold)
+        self._ring: deque[float] = deque(maxlen=self.window)
+        self._sorted: list[float] = []
+        self._seen_token = None
+        self.writer = writer
+        if writer is not None:
+            writer.add_flush_listener(self._note_flush)
+
+    def _note_flush(self, before, after) -> None:
+        # our own batch landed; anything else written meanwhile still forces a re-seed
+        if self._seen_token is not None and before == self._seen_token:
+            self._seen_token = after
+
+    def _push(self, total: float) -> None:
+        if len(self._ring) == self._ring.maxlen:
+            oldest = self._ring[0]
+            del self._sorted[bisect.bisect_left(self._sorted, oldest)]
+        self._ring.append(total)
+        bisect.insort(self._sorted, total)
+
+    def _sync(self) -> None:
+        token = get_backend().change_token()
+        if self._seen_token is not None and token == self._seen_token:
+            return
+        self._ring.clear()
+        self._sorted.clear()
+        for t in _read_last_totals(self.window):
+            self._push(t)
+        if self.writer is not None:
+            # accepted but still buffered: newer than anything on disk
+            for obj in self.writer.pending:
+                self._push(_snapshot_total(obj))
+        self._seen_token = token
+
+    def median(self) -> float:
+        vals = self._sorted
+        if not vals:
+            return 0.0
+        m = len(vals) // 2
+        if len(vals) % 2:
+            return vals[m]
+        return (vals[m - 1] + vals[m]) / 2.0
+
+    def append(self, obj: dict) -> bool:
+        """Same contract as guarded_append_snapshot_line()."""
+        self._sync()
+        total = _snapshot_total(obj)
+        if not _screen_outlier(
+            obj, total, len(self._ring), self.median(), self.window, self.threshold
+        ):
+            return False
+        if self.writer is not None:
+            self.writer.append(obj)  # its flushes advance the token via _note_flush
+        else:
+            before = get_backend().change_token()
+            append_snapshot_line(obj)
+            self._note_flush(before, get_backend().change_token())
+        self._push(total)
+        return True
+
+
+def guarded_append_snapshot_line(
+    obj: dict,
+    window: int | None = None,
+    threshold: float | None = None,  # fraction 0..1 if provided
+    guard: OutlierGuard | None = None,
+) -> bool:
+    """
+    Append snapshot with an outlier guard.
+    Returns True if appended; False if skipped as outlier (logged to snapshots_bad.jsonl).
+
+    Long-running callers pass a persistent `guard`; one-shot callers get a
+    bounded tail read of the last `window` totals.
+    """
+    if guard is not None:
+        return guard.append(obj)
+
+    total = _snapshot_total(obj)
+
+    # pick params (prefer explicit args; else config)
+    if window is None or threshold is None:
+        cfg_win, cfg_thr = _guard_params_from_config()
+        window = cfg_win if window is None else window
+        threshold = cfg_thr if threshold is None else threshold
+
+    ref = _read_last_totals(int(window))
+    if not _screen_outlier(obj, total, len(ref), _median(ref), int(window), float(threshold)):
         return False
 
-    # Normal path
     append_snapshot_line(obj)
     return True
 
@@ -0,0 +1,65 @@
+# storage/rollup_tiers.py
+# Rollup tiers: OHLC/avg/count of total_value over fixed UTC calendar buckets.
+#
+#   tier  bucket key (rows keep it under "date", like the daily rollups)
+#   1h    "2025-10-08T15:00"
+#   1d    "2025-10-08"
+#   1w    "2025-10-06"  (the ISO week's Monday)
+#   1M    "2025-10"
+#
+# Keys of one tier sort lexicographically in time order, so range filters
+# compare keys directly. Engines maintain every tier from the same snapshot
+# stream as the daily rollups.
+from datetime import datetime, timedelta, timezone
+
+ROLLUP_TIERS = ("1h", "1d", "1w", "1M")
+
+# nominal bucket widths (a month counts as 30 days) used to pick a tier
+TIER_SECONDS = {"1h": 3600, "1d": 86400, "1w": 7 * 86400, "1M": 30 * 86400}
+
+
+def check_tier(tier: str) -> str:
+    if tier not in ROLLUP_TIERS:
+        raise ValueError(f"Unknown rollup tier '{tier}'. Allowed: {', '.join(ROLLUP_TIERS)}")
+    return tier
+
+
+def parse_utc(ts) -> datetime:
+    """ISO-8601 -> aware UTC datetime; unparseable values count as now (like daily rollups)."""
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+    except Exception:
+        return datetime.now(timezone.utc)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def bucket_key(tier: str, dt: datetime) -> str:
+    """Bucket key of `dt` (aware UTC) in `tier`."""
+    if tier == "1h":
+        return dt.strftime("%Y-%m-%dT%H:00")
+    if tier == "1w":
+        return (dt.date() - timedelta(days=dt.weekday())).isoformat()
+    if tier == "1M":
+        return dt.strftime("%Y-%m")
+    return dt.date().isoformat()
+
+
+def key_of_ms(tier: str, ms: int) -> str:
+    return bucket_key(tier, datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc))
+
+
+def pick_tier(span_ms: int | None, points: int) -> str:
+    """
+    Coarsest tier that still resolves `span_ms` into at least `points` buckets
+    (the finest tier if none does). Without a span, the daily tier.
+    """
+    if span_ms is None:
+        return "1d"
+    step = max(0, span_ms) / 1000.0 / max(1, int(points))
+    best = ROLLUP_TIERS[0]
+    for tier in ROLLUP_TIERS:
+        if TIER_SECONDS[tier] <= step:
+            best = tier
+    return best
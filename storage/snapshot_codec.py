@@ -0,0 +1,100 @@
+# storage/snapshot_codec.py
+# Compact snapshot line format (v2) for snapshots.jsonl.
+#
+# A v1 line is the snapshot dict as `crypto track` built it. v2 lines carry
+# "v": 2 and come in two kinds:
+#   full    the snapshot without "positions"; "pf" names the portfolio state
+#           (kept once per change in snapshot_portfolios.jsonl) from which
+#           positions are re-derived with core.portfolio.valuate(). Positions
+#           that don't re-derive exactly are kept inline instead.
+#   repeat  {"ts", "total_value", "vs_currency", "v": 2, "rep": 1}: same content
+#           as the previous full line of the same file, only the ts differs
+#           (a cached price served again). Never the first line of a file.
+# The head fields stay first so field projection works on both kinds.
+import hashlib
+import json
+
+FORMAT_VERSION = 2
+REPEAT_TAIL = b', "rep": 1}'
+_HEAD = ("ts", "total_value", "vs_currency")
+_MARKERS = ("v", "pf", "rep")
+
+
+def portfolio_ref(positions: list) -> str:
+    """Content hash of a portfolio's positions (stable across key order)."""
+    blob = json.dumps(positions, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def derive_positions(portfolio_positions: list, prices: dict, vs_currency: str) -> list:
+    """Rebuild a snapshot's positions report from the portfolio and its flat prices."""
+    # core.portfolio imports storage.json_store; import lazily to avoid the cycle
+    from core.portfolio import valuate
+
+    vs = vs_currency or "usd"
+    nested = {pid: {vs: price} for pid, price in (prices or {}).items()}
+    return valuate({"positions": portfolio_positions}, nested, vs)["positions"]
+
+
+def is_repeat_line(raw: bytes) -> bool:
+    return raw.rstrip().endswith(REPEAT_TAIL)
+
+
+def encode(obj: dict, prev: dict | None, portfolio_positions: list | None) -> tuple[dict, list | None]:
+    """
+    Encode `obj` as a v2 record. `prev` is the previous full record in the same
+    file (as stored), `portfolio_positions` the current portfolio. Returns
+    (record, positions to remember under record["pf"] or None).
+    """
+    remember = None
+    record = dict(obj)
+    positions = record.get("positions")
+    if positions is not None and portfolio_positions is not None:
+        try:
+            derived = derive_positions(
+                portfolio_positions, record.get("prices") or {}, record.get("vs_currency")
+            )
+        except Exception:
+            derived = None
+        if derived == positions:
+            del record["positions"]
+            record["pf"] = portfolio_ref(portfolio_positions)
+            remember = portfolio_positions
+    record["v"] = FORMAT_VERSION
+
+    if prev is not None and _body(prev) == _body(record):
+        repeat = {k: record[k] for k in _HEAD if k in record}
+        repeat.update({"v": FORMAT_VERSION, "rep": 1})
+        return repeat, None
+    return record, remember
+
+
+def _body(record: dict) -> dict:
+    return {k: v for k, v in record.items() if k != "ts"}
+
+
+def is_full(record: dict) -> bool:
+    return not record.get("rep")
+
+
+def decode(record: dict, base: dict | None, portfolios: dict) -> dict | None:
+    """
+    Snapshot dict for a stored record. `base` is the previous full record of the
+    same file (needed for repeats); `portfolios` maps pf refs to positions.
+    Returns None for a repeat without a base.
+    """
+    if record.get("v") != FORMAT_VERSION:
+        return record
+    if record.get("rep"):
+        if base is None:
+            return None
+        full = decode(base, None, portfolios)
+        full.update({k: record[k] for k in _HEAD if k in record})
+        return full
+    out = {k: v for k, v in record.items() if k not in _MARKERS}
+    ref = record.get("pf")
+    if ref is not None and ref in portfolios:
+        out["positions"] = derive_positions(
+            portfolios[ref], out.get("prices") or {}, out.get("vs_currency")
+        )
+    return out
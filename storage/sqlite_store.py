@@ -0,0 +1,403 @@
+# storage/sqlite_store.py
+# SQLite storage engine (config: "storage_backend": "sqlite").
+#
+# Snapshots live in snapshots.db next to snapshots.jsonl. Each row keeps the
+# original JSON body plus the columns we filter on (ts_ms, UTC day), indexed so
+# tail reads, range scans and point-in-time lookups never decode the whole
+# history. Daily rollups (plus the 1h/1w/1M tiers in `rollups` and per-coin
+# daily prices in `coin_daily`) are tables updated with an UPSERT in the same
+# transaction as the insert. WAL journaling
+# lets `crypto history` read while the daemon writes.
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from storage import rollup_tiers
+from storage.backend import SnapshotBackend
+
+DB_NAME = "snapshots.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    ts TEXT,
+    ts_ms INTEGER,
+    day TEXT NOT NULL,
+    total_value REAL NOT NULL,
+    vs_currency TEXT,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_ts_ms ON snapshots(ts_ms);
+CREATE INDEX IF NOT EXISTS snapshots_day ON snapshots(day);
+CREATE TABLE IF NOT EXISTS daily (
+    day TEXT PRIMARY KEY,
+    open REAL NOT NULL,
+    close REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    tier TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    open REAL NOT NULL,
+    close REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (tier, bucket)
+);
+CREATE TABLE IF NOT EXISTS coin_daily (
+    coin TEXT NOT NULL,
+    day TEXT NOT NULL,
+    open REAL NOT NULL,
+    close REAL NOT NULL,
+    high REAL NOT NULL,
+    low REAL NOT NULL,
+    sum REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (coin, day)
+);
+"""
+
+# PRAGMA user_version: 1 = rollup tiers, 2 = per-coin daily rollups
+_SCHEMA_VERSION = 2
+
+_UPSERT_DAILY = """
+INSERT INTO daily (day, open, close, high, low, sum, count) VALUES (?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(day) DO UPDATE SET
+    close = excluded.close,
+    high = max(high, excluded.high),
+    low = min(low, excluded.low),
+    sum = sum + excluded.sum,
+    count = count + 1
+"""
+
+_UPSERT_ROLLUP = """
+INSERT INTO rollups (tier, bucket, open, close, high, low, sum, count)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(tier, bucket) DO UPDATE SET
+    close = excluded.close,
+    high = max(high, excluded.high),
+    low = min(low, excluded.low),
+    sum = sum + excluded.sum,
+    count = count + 1
+"""
+
+# tiers kept in `rollups`; the daily tier is the `daily` table
+_TIERS = tuple(t for t in rollup_tiers.ROLLUP_TIERS if t != "1d")
+
+_UPSERT_COIN_DAILY = """
+INSERT INTO coin_daily (coin, day, open, close, high, low, sum, count)
+VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+ON CONFLICT(coin, day) DO UPDATE SET
+    close = excluded.close,
+    high = max(high, excluded.high),
+    low = min(low, excluded.low),
+    sum = sum + excluded.sum,
+    count = count + 1
+"""
+
+_ROLLUP_COLS = "key, open, close, high, low, sum, count"
+
+_REBUILD_DAILY = """
+INSERT INTO daily (day, open, close, high, low, sum, count)
+SELECT s.day,
+       (SELECT total_value FROM snapshots o WHERE o.day = s.day ORDER BY o.id LIMIT 1),
+       (SELECT total_value FROM snapshots c WHERE c.day = s.day ORDER BY c.id DESC LIMIT 1),
+       max(s.total_value), min(s.total_value), sum(s.total_value), count(*)
+FROM snapshots s
+GROUP BY s.day
+"""
+
+
+def _parse_ts(ts) -> tuple[int | None, str]:
+    """(epoch ms or None, UTC date) for a snapshot ts; unparseable ts counts as today."""
+    try:
+        dt = datetime.fromisoformat(str(ts).replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        ms = int(dt.timestamp() * 1000)
+    except Exception:
+        dt, ms = datetime.now(timezone.utc), None
+    return ms, dt.astimezone(timezone.utc).date().isoformat()
+
+
+def _total(obj: dict) -> float:
+    try:
+        return float(obj.get("total_value", 0.0))
+    except Exception:
+        return 0.0
+
+
+def _coin_prices(obj: dict) -> list[tuple[str, float]]:
+    """(coin, price) pairs worth folding: positive numbers only (0.0 marks a failed fetch)."""
+    out = []
+    for coin, value in (obj.get("prices") or {}).items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        if value > 0:
+            out.append((str(coin), float(value)))
+    return out
+
+
+def _daily_row(row) -> dict:
+    day, open_, close, high, low, total, count = row
+    return {
+        "date": day,
+        "open": open_,
+        "close": close,
+        "high": high,
+        "low": low,
+        "avg": total / count if count else close,
+        "count": count,
+    }
+
+
+class SqliteBackend(SnapshotBackend):
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self) -> None:
+        """Fill rollup tables that are newer than the database."""
+        version = self._query("PRAGMA user_version")[0][0]
+        if version >= _SCHEMA_VERSION:
+            return
+        if self._query("SELECT 1 FROM snapshots LIMIT 1"):
+            if version < 1:
+                self.rebuild_rollup_tiers()
+            if version < 2:
+                self._rebuild_coin_daily()
+        with self._lock:
+            self._conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _bodies(rows) -> list[dict]:
+        out = []
+        for (body,) in rows:
+            try:
+                out.append(json.loads(body))
+            except Exception:
+                pass
+        return out
+
+    def append_snapshots(self, objs: list[dict]) -> None:
+        snaps, days, tiers, coins = [], [], [], []
+        for obj in objs:
+            ms, day = _parse_ts(obj.get("ts"))
+            total = _total(obj)
+            body = json.dumps(obj, ensure_ascii=False)
+            snaps.append((obj.get("ts"), ms, day, total, obj.get("vs_currency"), body))
+            days.append((day, total, total, total, total, total))
+            dt = rollup_tiers.parse_utc(obj.get("ts"))
+            for tier in _TIERS:
+                key = rollup_tiers.bucket_key(tier, dt)
+                tiers.append((tier, key, total, total, total, total, total))
+            for coin, price in _coin_prices(obj):
+                coins.append((coin, day, price, price, price, price, price))
+        if not snaps:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO snapshots (ts, ts_ms, day, total_value, vs_currency, body)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                snaps,
+            )
+            self._conn.executemany(_UPSERT_DAILY, days)
+            self._conn.executemany(_UPSERT_ROLLUP, tiers)
+            self._conn.executemany(_UPSERT_COIN_DAILY, coins)
+
+    def read_last_snapshots(self, n: int) -> list[dict]:
+        if n <= 0:
+            return []
+        rows = self._query("SELECT body FROM snapshots ORDER BY id DESC LIMIT ?", (int(n),))
+        return self._bodies(reversed(rows))
+
+    def read_last_totals(self, n: int) -> list[float]:
+        if n <= 0:
+            return []
+        rows = self._query("SELECT total_value FROM snapshots ORDER BY id DESC LIMIT ?", (int(n),))
+        return [r[0] for r in reversed(rows)]
+
+    def read_snapshots_range(self, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        sql = "SELECT body FROM snapshots WHERE ts_ms IS NOT NULL"
+        params = []
+        if start_ms is not None:
+            sql += " AND ts_ms >= ?"
+            params.append(int(start_ms))
+        if end_ms is not None:
+            sql += " AND ts_ms <= ?"
+            params.append(int(end_ms))
+        return self._bodies(self._query(sql + " ORDER BY id", params))
+
+    def snapshot_at(self, at_ms: int) -> dict | None:
+        rows = self._query(
+            "SELECT body FROM snapshots WHERE ts_ms <= ? ORDER BY ts_ms DESC, id DESC LIMIT 1",
+            (int(at_ms),),
+        )
+        found = self._bodies(rows)
+        return found[0] if found else None
+
+    def rebuild_daily_rollups(self) -> dict:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM daily")
+            self._conn.execute(_REBUILD_DAILY)
+            days = self._conn.execute("SELECT count(*) FROM daily").fetchone()[0]
+            snaps = self._conn.execute("SELECT count(*) FROM snapshots").fetchone()[0]
+        self.rebuild_rollup_tiers()
+        self._rebuild_coin_daily()
+        return {"days": days, "snapshots": snaps}
+
+    def _rebuild_coin_daily(self) -> None:
+        """Recompute coin_daily from the stored snapshot bodies (in insertion order)."""
+        state: dict = {}
+        with self._lock, self._conn:
+            for day, body in self._conn.execute("SELECT day, body FROM snapshots ORDER BY id"):
+                try:
+                    obj = json.loads(body)
+                except Exception:
+                    continue
+                for coin, price in _coin_prices(obj):
+                    rec = state.get((coin, day))
+                    if rec is None:
+                        state[(coin, day)] = [price, price, price, price, price, 1]
+                    else:
+                        rec[1] = price
+                        rec[2] = max(rec[2], price)
+                        rec[3] = min(rec[3], price)
+                        rec[4] += price
+                        rec[5] += 1
+            self._conn.execute("DELETE FROM coin_daily")
+            self._conn.executemany(
+                "INSERT INTO coin_daily (coin, day, open, close, high, low, sum, count)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(coin, day, *rec) for (coin, day), rec in state.items()],
+            )
+
+    def refresh_daily_rollups(self) -> dict:
+        # the daily table is updated in the same transaction as every insert
+        days = self._query("SELECT count(*) FROM daily")[0][0]
+        snaps = self._query("SELECT count(*) FROM snapshots")[0][0]
+        return {"days": days, "snapshots": snaps, "incremental": True}
+
+    def read_last_daily(self, n: int) -> list[dict]:
+        if n <= 0:
+            return []
+        rows = self._query(
+            "SELECT day, open, close, high, low, sum, count FROM daily"
+            " ORDER BY day DESC LIMIT ?",
+            (int(n),),
+        )
+        return [_daily_row(r) for r in reversed(rows)]
+
+    def read_daily_all(self) -> list[dict]:
+        rows = self._query("SELECT day, open, close, high, low, sum, count FROM daily ORDER BY day")
+        return [_daily_row(r) for r in rows]
+
+    def read_rollups(self, tier: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        table, where, params = self._rollup_source(tier)
+        if start_ms is not None:
+            where += " AND key >= ?"
+            params.append(rollup_tiers.key_of_ms(tier, start_ms))
+        if end_ms is not None:
+            where += " AND key <= ?"
+            params.append(rollup_tiers.key_of_ms(tier, end_ms))
+        rows = self._query(f"SELECT {_ROLLUP_COLS} FROM {table} WHERE {where} ORDER BY key", params)
+        return [_daily_row(r) for r in rows]
+
+    def read_last_rollups(self, tier: str, n: int) -> list[dict]:
+        if n <= 0:
+            return []
+        table, where, params = self._rollup_source(tier)
+        rows = self._query(
+            f"SELECT {_ROLLUP_COLS} FROM {table} WHERE {where} ORDER BY key DESC LIMIT ?",
+            params + [int(n)],
+        )
+        return [_daily_row(r) for r in reversed(rows)]
+
+    @staticmethod
+    def _rollup_source(tier: str) -> tuple[str, str, list]:
+        """(row source with columns key, open, close, high, low, sum, count; WHERE; params)."""
+        if tier == "1d":
+            return "(SELECT day AS key, open, close, high, low, sum, count FROM daily)", "1", []
+        return (
+            "(SELECT tier, bucket AS key, open, close, high, low, sum, count FROM rollups)",
+            "tier = ?",
+            [tier],
+        )
+
+    def rebuild_rollup_tiers(self) -> dict:
+        state: dict = {tier: {} for tier in _TIERS}
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT ts, total_value FROM snapshots ORDER BY id")
+            n = 0
+            for ts, total in rows:
+                dt = rollup_tiers.parse_utc(ts)
+                for tier in _TIERS:
+                    key = rollup_tiers.bucket_key(tier, dt)
+                    rec = state[tier].get(key)
+                    if rec is None:
+                        state[tier][key] = [total, total, total, total, total, 1]
+                    else:
+                        rec[1] = total
+                        rec[2] = max(rec[2], total)
+                        rec[3] = min(rec[3], total)
+                        rec[4] += total
+                        rec[5] += 1
+                n += 1
+            self._conn.execute("DELETE FROM rollups")
+            self._conn.executemany(
+                "INSERT INTO rollups (tier, bucket, open, close, high, low, sum, count)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(t, k, *rec) for t, buckets in state.items() for k, rec in buckets.items()],
+            )
+        return {"snapshots": n, **{tier: len(buckets) for tier, buckets in state.items()}}
+
+    def read_coin_daily(self, coin: str, start_ms: int | None, end_ms: int | None) -> list[dict]:
+        sql = "SELECT day, open, close, high, low, sum, count FROM coin_daily WHERE coin = ?"
+        params: list = [coin]
+        if start_ms is not None:
+            sql += " AND day >= ?"
+            params.append(rollup_tiers.key_of_ms("1d", start_ms))
+        if end_ms is not None:
+            sql += " AND day <= ?"
+            params.append(rollup_tiers.key_of_ms("1d", end_ms))
+        return [_daily_row(r) for r in self._query(sql + " ORDER BY day", params)]
+
+    def read_last_coin_daily(self, coin: str, n: int) -> list[dict]:
+        if n <= 0:
+            return []
+        rows = self._query(
+            "SELECT day, open, close, high, low, sum, count FROM coin_daily WHERE coin = ?"
+            " ORDER BY day DESC LIMIT ?",
+            (coin, int(n)),
+        )
+        return [_daily_row(r) for r in reversed(rows)]
+
+    def rollup_coins(self) -> list[str]:
+        return [r[0] for r in self._query("SELECT DISTINCT coin FROM coin_daily ORDER BY coin")]
+
+    def latest_ts_ms(self) -> int | None:
+        return self._query("SELECT max(ts_ms) FROM snapshots")[0][0]
+
+    def change_token(self):
+        return self._query("SELECT max(id) FROM snapshots")[0][0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,38 @@
+import pytest
+import requests
+
+from services import coingecko_client as cg
+from services import http_session, metrics, price_cache
+
+_LIBRARY = {"get": requests.get, "post": requests.post}
+_session_request = http_session.request
+
+
+def _request_via_patched_requests(method: str, url: str, **kwargs):
+    """
+    Tests stub the network by patching requests.get / requests.post (often as
+    cg.requests.get); route http_session's calls there when they have been.
+    """
+    replaced = getattr(requests, method)
+    if replaced is not _LIBRARY[method]:
+        return replaced(url, **kwargs)
+    return _session_request(method, url, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def _isolated_price_state(tmp_path, monkeypatch):
+    """
+    Fresh per-test CoinGecko state instead of ~/.crypto_tracker's: a roomy
+    token bucket, an empty price cache, a closed circuit breaker,
+    an empty metrics file, and patched requests.get/post seeing every call.
+    """
+    monkeypatch.setattr(cg, "_rate_limit_path", lambda: str(tmp_path / "coingecko.ratelimit"))
+    monkeypatch.setattr(cg, "DEFAULT_RATE_PER_MIN", 6000)
+    monkeypatch.setattr(cg, "DEFAULT_BURST", 100)
+    monkeypatch.setattr(price_cache, "_cache_path", lambda: str(tmp_path / "price_cache.json"))
+    monkeypatch.setattr(price_cache, "_mem", {})
+    monkeypatch.setattr(price_cache, "_inflight", {})
+    monkeypatch.setattr(cg, "_breaker_path", lambda: str(tmp_path / "coingecko.breaker"))
+    monkeypatch.setattr(metrics, "_metrics_path", lambda: str(tmp_path / "metrics.json"))
+    monkeypatch.setattr(metrics, "_pending", {})
+    monkeypatch.setattr(http_session, "request", _request_via_patched_requests)
@@ -0,0 +1,33 @@
+import storage.json_store as js
+from benchmarks import bench_store, datagen
+
+
+def test_generated_history_reads_back_as_snapshots(tmp_path, monkeypatch):
+    res = datagen.generate(str(tmp_path), 300, coins=3, seed=7)
+    assert res["rows"] == 300
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", str(tmp_path / "snapshots.jsonl"))
+    monkeypatch.setattr(js, "read_config", lambda: {})
+
+    expected = [snap for snap, _ in datagen.iter_snapshots(300, 3, seed=7)]
+    got = js.read_last_snapshots(300)
+    assert [s["ts"] for s in got] == [s["ts"] for s in expected]
+    assert got[-1]["positions"] == expected[-1]["positions"]  # re-derived from the pf ref
+    assert got[-1]["total_value"] == expected[-1]["total_value"]
+    assert datagen.generate(str(tmp_path / "again"), 300, coins=3, seed=7) == res
+
+
+def test_cliffs_and_regressions_are_flagged():
+    def run(rows, **per_op):
+        return {"rows": rows, "coins": 5, "cases": {k: {"per_op_s": v} for k, v in per_op.items()}}
+
+    results = {
+        "sizes": {
+            "10k": run(10_000, read_last_snapshots=0.001, rebuild_daily_rollups=0.1),
+            "1m": run(1_000_000, read_last_snapshots=0.05, rebuild_daily_rollups=9.0),
+        }
+    }
+    assert [c.split(":")[0] for c in bench_store.find_cliffs(results, 1.5, 0.001)] == [
+        "read_last_snapshots"
+    ]
+    baseline = {"sizes": {"1m": run(1_000_000, read_last_snapshots=0.05, rebuild_daily_rollups=4)}}
+    assert len(bench_store.compare_baseline(results, baseline, 1.5, 0.001)) == 1
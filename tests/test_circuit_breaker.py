@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+import requests
+
+from services import circuit_breaker
+from services import coingecko_client as cg
+from services.circuit_breaker import CircuitBreaker, CircuitOpen
+
+
+def test_breaker_opens_probes_once_and_recovers(tmp_path, monkeypatch, caplog):
+    clock = [1000.0]
+    monkeypatch.setattr(circuit_breaker.time, "time", lambda: clock[0])
+    caplog.set_level(logging.INFO, logger="coingecko.breaker")
+    path = tmp_path / "cb"
+    breaker = CircuitBreaker(path, threshold=3, cooldown=30, name="test")
+
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()  # failures must be consecutive
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    other = CircuitBreaker(path, threshold=3, cooldown=30)  # another process
+    assert other.status()["state"] == "open"
+    assert not other.allow()
+
+    clock[0] += 30
+    assert breaker.allow()  # the single probe
+    assert not other.allow()
+    breaker.record_failure()
+    assert breaker.status()["state"] == "open"
+
+    clock[0] += 30
+    assert other.allow()
+    other.record_success()
+    assert breaker.status() == {"state": "closed", "failures": 0, "since": clock[0]}
+    assert [r.getMessage() for r in caplog.records] == [
+        "test breaker closed -> open (3 consecutive failures).",
+        "test breaker open -> half_open (probing).",
+        "test breaker half_open -> open (probe failed).",
+        "circuit breaker open -> half_open (probing).",
+        "circuit breaker half_open -> closed (call succeeded).",
+    ]
+
+
+def test_open_breaker_skips_coingecko(monkeypatch):
+    calls = []
+
+    def down(url, params=None, **kwargs):
+        calls.append(url)
+        raise requests.ConnectionError("connection refused")
+
+    monkeypatch.setattr(cg.requests, "get", down)
+    monkeypatch.setattr(cg, "_html_fallback", lambda ids, vs: None)
+    for _ in range(cg.DEFAULT_BREAKER_FAILURES):
+        with pytest.raises(requests.ConnectionError):
+            cg.get_prices(["bitcoin"], "usd")
+    with pytest.raises(CircuitOpen):
+        cg.get_prices(["bitcoin"], "usd")
+    assert len(calls) == cg.DEFAULT_BREAKER_FAILURES
+
+    monkeypatch.setattr(cg, "_html_fallback", lambda ids, vs: {"bitcoin": {"usd": 1.0}})
+    assert cg.get_prices(["bitcoin"], "usd") == {"bitcoin": {"usd": 1.0}}
+    assert len(calls) == cg.DEFAULT_BREAKER_FAILURES
@@ -0,0 +1,114 @@
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch, backend="jsonl"):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {"storage_backend": backend})
+    monkeypatch.setattr(js, "_backend_cache", {})
+
+
+def _rows(n=40, start=datetime(2025, 10, 1, tzinfo=timezone.utc)):
+    out = []
+    for i in range(n):
+        prices = {"bitcoin": 60000.0 + (i * 37) % 11, "ethereum": 3000.0 + i}
+        if i % 5 == 0:
+            prices["ethereum"] = 0.0  # failed fetch: not a price
+        if i >= 20:
+            prices["solana"] = 150.0 - i  # listed later
+        out.append(
+            {
+                "ts": (start + timedelta(hours=6 * i)).isoformat(),
+                "total_value": 100.0 + i,
+                "vs_currency": "usd",
+                "prices": prices,
+            }
+        )
+    return out
+
+
+_KEYS = ("date", "open", "close", "high", "low", "count")
+
+
+def _strip(rows):
+    return [{k: r[k] for k in _KEYS} for r in rows]
+
+
+def _expected(rows, coin):
+    days = {}
+    for r in rows:
+        price = r["prices"].get(coin)
+        if not price:
+            continue
+        d = r["ts"][:10]
+        rec = days.setdefault(d, {"date": d, "open": price, "high": price, "low": price})
+        rec.setdefault("count", 0)
+        rec.update(close=price, high=max(rec["high"], price), low=min(rec["low"], price))
+        rec["count"] += 1
+    return [{k: rec[k] for k in _KEYS} for rec in days.values()]
+
+
+def test_coin_rollups_incremental_and_rebuilt(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows:
+        js.append_snapshot_line(r)
+
+    assert js.rollup_coins() == ["bitcoin", "ethereum", "solana"]
+    for coin in ("bitcoin", "ethereum", "solana"):
+        assert _strip(js.read_coin_daily(coin)) == _expected(rows, coin)
+    assert js.read_last_coin_daily("ethereum", 2) == js.read_coin_daily("ethereum")[-2:]
+    assert [r["date"] for r in js.read_coin_daily("bitcoin", "2025-10-03", "2025-10-04")] == [
+        "2025-10-03",
+        "2025-10-04",
+    ]
+    live = {c: js.read_coin_daily(c) for c in js.rollup_coins()}
+
+    # rebuilt from the columnar store, then from decoded snapshots
+    js.rebuild_daily_rollups()
+    assert {c: _strip(js.read_coin_daily(c)) for c in js.rollup_coins()} == {
+        c: _strip(v) for c, v in live.items()
+    }
+    monkeypatch.setattr(js, "open_snapshot_columns", lambda coins=None: None)
+    js.rebuild_daily_rollups()
+    assert {c: _strip(js.read_coin_daily(c)) for c in js.rollup_coins()} == {
+        c: _strip(v) for c, v in live.items()
+    }
+
+
+def test_coin_rollups_built_on_first_read_for_older_history(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows[:30]:
+        js.append_snapshot_line(r)
+    shutil.rmtree(tmp_path / "coins_day")  # as if written before per-coin rollups existed
+    for r in rows[30:]:
+        js.append_snapshot_line(r)
+    assert not os.path.exists(tmp_path / "coins_day")
+    assert _strip(js.read_coin_daily("solana")) == _expected(rows, "solana")
+
+
+def test_sqlite_coin_rollups_match_jsonl(tmp_path, monkeypatch):
+    rows = _rows()
+    results = {}
+    for backend in ("jsonl", "sqlite"):
+        base = tmp_path / backend
+        base.mkdir()
+        _redirect(base, monkeypatch, backend)
+        for r in rows:
+            js.append_snapshot_line(r)
+        coins = js.rollup_coins()
+        results[backend] = {c: _strip(js.read_coin_daily(c)) for c in coins}
+        results[backend]["last"] = _strip(js.read_last_coin_daily("bitcoin", 3))
+        if backend == "sqlite":
+            js.rebuild_daily_rollups()
+            assert {c: _strip(js.read_coin_daily(c)) for c in coins} == {
+                c: results["sqlite"][c] for c in coins
+            }
+            js.get_backend().close()
+    assert results["jsonl"] == results["sqlite"]
@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, timezone
 
+import pytest
 import requests
 
 from services import coingecko_client as cg
@@ -56,3 +57,136 @@ def test_parse_retry_after_date():
     )
     val = cg._parse_retry_after(future)
     assert 0.5 <= val <= 2.5  # within a loose window
+
+
+def test_large_id_lists_are_fetched_in_concurrent_chunks(monkeypatch):
+    import threading
+
+    import storage.json_store as js
+
+    ids = [f"coin-{i}" for i in range(10)]
+    seen, lock = [], threading.Lock()
+
+    def fake_get(url, params=None, **kwargs):
+        chunk = params["ids"].split(",")
+        with lock:
+            seen.append(chunk)
+        if "coin-4" in chunk:
+            return DummyResp(500)
+        return DummyResp(200, {cid: {"usd": float(cid[5:])} for cid in chunk})
+
+    monkeypatch.setattr(cg.requests, "get", fake_get)
+    monkeypatch.setattr(
+        js, "read_config", lambda: {"coingecko_chunk_size": 3, "coingecko_max_workers": 2}
+    )
+    monkeypatch.setattr(js, "read_cache", lambda: {"last_prices": {"coin-3": 33.0}})
+    import services.html_fallback as hf
+
+    monkeypatch.setattr(hf, "get_prices_html", lambda ids: {})
+
+    data = cg.get_prices(ids, "usd")
+    assert sorted(map(tuple, seen)) == [
+        ("coin-0", "coin-1", "coin-2"),
+        ("coin-3", "coin-4", "coin-5"),
+        ("coin-6", "coin-7", "coin-8"),
+        ("coin-9",),
+    ]
+    # the failed chunk is served from cache where it can be; the rest is live
+    failed = ("coin-3", "coin-4", "coin-5")
+    live = {cid: {"usd": float(cid[5:]), "source": "coingecko"} for cid in ids if cid not in failed}
+    assert data == {**live, "coin-3": {"usd": 33.0, "source": "cache"}}
+
+    monkeypatch.setattr(cg.requests, "get", lambda url, params=None, **kw: DummyResp(500))
+    with pytest.raises(requests.HTTPError):  # every chunk failed
+        cg.get_prices(ids, "usd")
+
+
+def test_slow_primary_is_hedged_and_sources_recorded(tmp_path, monkeypatch):
+    import threading
+    from collections import deque
+
+    import cli
+    import storage.json_store as js
+
+    release = threading.Event()
+
+    def slow_get(url, params=None, **kwargs):
+        release.wait(5)
+        return DummyResp(200, {cid: {"usd": 2.0} for cid in params["ids"].split(",")})
+
+    monkeypatch.setattr(cg.requests, "get", slow_get)
+    monkeypatch.setattr(js, "read_config", lambda: {"hedge_percentile": 90, "hedge_min_ms": 20})
+    monkeypatch.setattr(cg, "_latencies_ms", deque([5.0] * 30, maxlen=200))
+    monkeypatch.setattr(
+        cg, "HEDGE_PROVIDERS", {"html": lambda ids, vs: {"bitcoin": {"usd": 1.0, "source": "html"}}}
+    )
+    try:
+        assert cg.get_prices(["bitcoin"], "usd") == {"bitcoin": {"usd": 1.0, "source": "html"}}
+        # a hedge answer missing an id waits for CoinGecko
+        threading.Timer(0.1, release.set).start()
+        data = cg.get_prices(["bitcoin", "solana"], "usd", max_age=0)
+        assert data["solana"] == data["bitcoin"] == {"usd": 2.0, "source": "coingecko"}
+    finally:
+        release.set()
+
+    # snapshots flag the prices that did not come from CoinGecko
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "CACHE_PATH", tmp_path / "cache.json")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "_backend_cache", {})
+    prices = {"bitcoin": {"usd": 1.0, "source": "html"}, "solana": {"usd": 2.0}}
+    report = {"total_value": 3.0, "positions": []}
+    cli._snapshot_and_cache(["bitcoin", "solana"], prices, "usd", report)
+    assert js.read_last_snapshots(1)[0]["fallback"] == ["bitcoin"]
+
+
+def test_hedge_deadline_starts_after_the_rate_limit_token(monkeypatch):
+    import threading
+    import time
+    from collections import deque
+
+    import storage.json_store as js
+
+    class SlowBucket:
+        def acquire(self, max_wait):
+            time.sleep(0.2)  # ten times the hedge deadline
+            return 0.2
+
+        def reward(self):
+            pass
+
+    hedged = []
+    monkeypatch.setattr(js, "read_config", lambda: {"hedge_percentile": 90, "hedge_min_ms": 20})
+    monkeypatch.setattr(cg, "_latencies_ms", deque([5.0] * 30, maxlen=200))
+    monkeypatch.setattr(cg, "_limiter", lambda: SlowBucket())
+    monkeypatch.setattr(
+        cg, "HEDGE_PROVIDERS", {"html": lambda ids, vs: hedged.append(ids) or {}}
+    )
+    monkeypatch.setattr(
+        cg.requests, "get", lambda url, params=None, **kw: DummyResp(200, {"bitcoin": {"usd": 3.0}})
+    )
+    assert cg.get_prices(["bitcoin"], "usd", max_age=0)["bitcoin"]["usd"] == 3.0
+    assert hedged == []
+
+    # once the hedge has run, a failed CoinGecko answer does not reach the HTML fallback again
+    release = threading.Event()
+
+    def failing_get(url, params=None, **kwargs):
+        release.wait(5)
+        return DummyResp(500, {})
+
+    fallbacks = []
+    monkeypatch.setattr(cg, "_limiter", lambda: None)
+    monkeypatch.setattr(cg.requests, "get", failing_get)
+    monkeypatch.setattr(cg, "_html_fallback", lambda ids, vs: fallbacks.append(ids) or {})
+    monkeypatch.setattr(
+        cg, "HEDGE_PROVIDERS", {"html": lambda ids, vs: {"bitcoin": {"usd": 1.0, "source": "html"}}}
+    )
+    try:
+        threading.Timer(0.1, release.set).start()
+        data = cg.get_prices(["bitcoin", "solana"], "usd", max_age=0)
+    finally:
+        release.set()
+    assert data == {"bitcoin": {"usd": 1.0, "source": "html"}}
+    assert fallbacks == []
@@ -0,0 +1,79 @@
+import json
+import math
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace as NS
+
+import cli
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {})
+
+
+def _snap(i, start=datetime(2025, 10, 1, 0, 0, 0, 123456, tzinfo=timezone.utc)):
+    prices = {"bitcoin": 60000.0 + i, "ethereum": 3000.0 + i / 3}
+    if i >= 5:
+        prices["solana"] = 150.0 + i  # coin added later
+    return {
+        "ts": (start + timedelta(minutes=10 * i)).isoformat(),
+        "prices": prices,
+        "total_value": 1000.0 + i,
+        "positions": [],
+        "vs_currency": "usd",
+    }
+
+
+def test_columns_follow_appends(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    snaps = [_snap(i) for i in range(12)]
+    for s in snaps:
+        js.append_snapshot_line(s)
+
+    with js.open_snapshot_columns() as cols:
+        assert cols.rows == 12
+        assert js._iso_from_us(cols.ts[0]) == snaps[0]["ts"]
+        assert list(cols.total) == [s["total_value"] for s in snaps]
+        sol = cols.prices["solana"]
+        assert all(math.isnan(v) for v in sol[:5])
+        assert sol[5] == 155.0
+
+    pts = js.read_last_snapshot_points(3)
+    assert [p["ts"] for p in pts] == [s["ts"] for s in snaps[-3:]]
+    assert pts[-1]["prices"] == snaps[-1]["prices"]
+
+    rng = js.read_snapshot_points_range(snaps[2]["ts"], snaps[4]["ts"])
+    assert [p["total_value"] for p in rng] == [1002.0, 1003.0, 1004.0]
+
+
+def test_stale_columns_rebuilt_from_jsonl(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for i in range(3):
+        js.append_snapshot_line(_snap(i))
+    # rows written without the columnar hook (older version / external tool)
+    with open(js.SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
+        for i in range(3, 8):
+            f.write(json.dumps(_snap(i)) + "\n")
+
+    with js.open_snapshot_columns(["solana"]) as cols:
+        assert cols.rows == 8
+        assert list(cols.prices) == ["solana"]
+        assert cols.prices["solana"][7] == 157.0
+
+
+def test_export_matches_json_path(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for i in range(12):
+        js.append_snapshot_line(_snap(i))
+
+    fast = tmp_path / "fast.csv"
+    cli.cmd_export(NS(last=8, out=str(fast)))
+
+    monkeypatch.setattr(cli, "read_last_snapshot_points", js.read_last_snapshots)
+    slow = tmp_path / "slow.csv"
+    cli.cmd_export(NS(last=8, out=str(slow)))
+
+    assert fast.read_text() == slow.read_text()
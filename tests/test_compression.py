@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch, **cfg):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {"segment_period": "month", **cfg})
+
+
+def _rows(days=75, per_day=4, start=datetime(2025, 8, 1, tzinfo=timezone.utc)):
+    out = []
+    for i in range(days * per_day):
+        ts = start + timedelta(hours=24 / per_day * i)
+        out.append(
+            {
+                "ts": ts.isoformat(),
+                "total_value": 100.0 + (i % 17),
+                "vs_currency": "usd",
+                "prices": {"bitcoin": 60000.0 + i},
+            }
+        )
+    return out
+
+
+def _reads():
+    return {
+        "tail": js.read_last_snapshots(150),
+        "range": js.read_snapshots_range("2025-08-20", "2025-09-03"),
+        "at": js.snapshot_at("2025-08-31T23:00:00+00:00"),
+        "daily": js.read_daily_all(),
+    }
+
+
+@pytest.mark.parametrize("codec", ["gzip", "xz"])
+def test_compact_is_transparent_to_readers(tmp_path, monkeypatch, codec):
+    _redirect(tmp_path, monkeypatch)
+    for r in _rows():
+        js.append_snapshot_line(r)
+    before = _reads()
+
+    res = js.compact_segments(codec)
+    assert res["segments"] == 2
+    assert res["bytes_after"] < res["bytes_before"]
+    assert res["scan_before"]["rows"] == res["scan_after"]["rows"] == (31 + 30) * 4
+
+    manifest = js.read_segment_manifest()
+    for seg in manifest["segments"]:
+        assert seg["codec"] == codec and seg["file"].endswith(js.SEGMENT_CODECS[codec])
+        assert seg["raw_bytes"] > seg["bytes"]
+    seg_dir = tmp_path / "segments"
+    assert not any(name.endswith(".jsonl") for name in os.listdir(seg_dir))
+    assert open(js.SNAPSHOTS_PATH, "rb").read(1) == b"{"  # hot tail stays plain
+
+    assert _reads() == before
+    # force the rollup rebuild to stream the compressed segments themselves
+    for name in os.listdir(seg_dir):
+        if name.endswith(".days.json"):
+            os.remove(seg_dir / name)
+    js.rebuild_daily_rollups()
+    assert js.read_daily_all() == before["daily"]
+
+    assert js.compact_segments(codec)["segments"] == 0
+
+
+def test_sealed_segments_compressed_off_the_append_path(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, segment_compression="gzip")
+    rows = _rows()
+    for r in rows:
+        js.append_snapshot_line(r)
+    files = [s["file"] for s in js.read_segment_manifest()["segments"]]
+    assert files == ["snapshots-2025-08.jsonl", "snapshots-2025-09.jsonl"]
+
+    assert js.compress_sealed_segments() == 2
+    files = [s["file"] for s in js.read_segment_manifest()["segments"]]
+    assert files == ["snapshots-2025-08.jsonl.gz", "snapshots-2025-09.jsonl.gz"]
+    assert js.read_last_snapshots(len(rows)) == rows
+    assert js.compress_sealed_segments() == 0
+
+
+def test_compress_skips_a_segment_that_changed_mid_copy(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, segment_compression="gzip")
+    for r in _rows():
+        js.append_snapshot_line(r)
+    real_copy = js.shutil.copyfileobj
+
+    def copy_then_rewrite(fin, fout, *a):
+        real_copy(fin, fout, *a)
+        if fin.name.endswith("2025-08.jsonl"):  # retention rewrites it meanwhile
+            with open(fin.name, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    monkeypatch.setattr(js.shutil, "copyfileobj", copy_then_rewrite)
+    assert js.compress_sealed_segments() == 1
+    files = [s["file"] for s in js.read_segment_manifest()["segments"]]
+    assert files == ["snapshots-2025-08.jsonl", "snapshots-2025-09.jsonl.gz"]
+    assert not os.path.exists(tmp_path / "segments" / "snapshots-2025-08.jsonl.gz.tmp")
+
+
+def test_compact_requires_segments(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    with open(js.SNAPSHOTS_PATH, "w", encoding="utf-8") as f:
+        f.write('{"ts": "2025-08-01T00:00:00+00:00", "total_value": 1.0}\n')
+    with pytest.raises(ValueError):
+        js.compact_segments()
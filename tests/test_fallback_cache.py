@@ -1,6 +1,6 @@
 from services import coingecko_client as cg
 
-def test_fallback_writes_cache(monkeypatch):
+def test_fallback_writes_cache(tmp_path, monkeypatch):
     # 1) Force CoinGecko failures by patching requests.get (so we hit fallback)
     class DummyResp:
         status_code = 500
@@ -22,20 +22,15 @@ def test_fallback_writes_cache(monkeypatch):
     import services.html_fallback as hf
     monkeypatch.setattr(hf, "get_prices_html", fake_get_prices_html)
 
-    # 3) Capture write_cache calls
-    writes = {}
-    def fake_write_cache(obj):
-        writes["last"] = obj
-
+    # 3) Point the cache at a temp file that already holds another coin
     import storage.json_store as js
-    monkeypatch.setattr(js, "write_cache", fake_write_cache)
+    monkeypatch.setattr(js, "CACHE_PATH", tmp_path / "cache.json")
+    js.write_cache({"ethereum": 3000.0}, "2025-01-01T00:00:00+00:00")
 
     # 4) Call get_prices — it should return fallback data and write cache
     data = cg.get_prices(["bitcoin"], "usd")
 
     assert data["bitcoin"]["usd"] == 12345.67
-    assert "last" in writes
-    cached = writes["last"]
-    assert cached["vs_currency"] == "usd"
-    assert abs(cached["prices"]["bitcoin"] - 12345.67) < 1e-9
-    assert "ts" in cached
+    cached = js.read_json(js.CACHE_PATH)
+    assert cached["last_prices"] == {"ethereum": 3000.0, "bitcoin": 12345.67}
+    assert cached["last_fetch_ts"] > "2025-01-01"
@@ -0,0 +1,64 @@
+import requests
+
+from services import http_session, notify
+
+_session_request = http_session.request  # as imported, before conftest's shim
+
+
+class _Resp:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+def test_calls_share_one_pooled_session(monkeypatch):
+    http_session.close_session()
+    monkeypatch.setattr(
+        http_session,
+        "_config",
+        lambda: {
+            "http_pool_maxsize": 3,
+            "http_timeouts": {"hooks.example.com": [1, 2], "default": 7},
+        },
+    )
+    calls = []
+
+    def fake_request(self, method, url, **kwargs):
+        calls.append((self, method, url, kwargs["timeout"]))
+        return _Resp()
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    assert notify.send_webhook("https://hooks.example.com/x", "hi")
+    http_session.get("https://api.example.org/v1", timeout=10)
+
+    assert [c[1:] for c in calls] == [
+        ("POST", "https://hooks.example.com/x", (1.0, 2.0)),
+        ("GET", "https://api.example.org/v1", 7.0),
+    ]
+    assert calls[0][0] is calls[1][0] is http_session.get_session()
+    assert http_session.get_session().get_adapter("https://x.test")._pool_maxsize == 3
+    http_session.close_session()
+
+
+def test_requests_get_is_not_consulted_outside_the_test_shim(monkeypatch):
+    http_session.close_session()
+    monkeypatch.setattr(http_session, "request", _session_request)
+    monkeypatch.setattr(requests, "get", lambda *a, **kw: (_ for _ in ()).throw(AssertionError))
+    seen = []
+    monkeypatch.setattr(
+        requests.Session, "request", lambda self, method, url, **kw: seen.append(url) or _Resp()
+    )
+    http_session.get("https://api.coingecko.com/api/v3/ping", timeout=1)
+    assert seen == ["https://api.coingecko.com/api/v3/ping"]
+    http_session.close_session()
+
+
+def test_patched_requests_get_sees_calls_through_the_shim(monkeypatch):
+    seen = []
+    monkeypatch.setattr(requests, "get", lambda url, **kw: seen.append(url) or _Resp())
+    monkeypatch.setattr(
+        requests.Session, "request", lambda *a, **kw: (_ for _ in ()).throw(AssertionError)
+    )
+    http_session.get("https://api.coingecko.com/api/v3/ping", timeout=1)
+    assert seen == ["https://api.coingecko.com/api/v3/ping"]
@@ -54,3 +54,52 @@ def test_incremental_upsert_updates_today(tmp_path, monkeypatch):
     assert d2["low"] == 90.0
     assert d2["avg"] == 90.0
     assert d2["count"] == 1
+
+
+def _read_days(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def test_upsert_touches_only_last_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+
+    # a long history of closed days
+    history = [js._new_daily_rec(f"2024-01-{d:02d}", 10.0) for d in range(1, 29)]
+    js._write_all_daily_records(history)
+
+    def boom():
+        raise AssertionError("full read on the hot path")
+
+    monkeypatch.setattr(js, "_read_all_daily_records", boom)
+
+    t0 = datetime(2024, 2, 1, 0, 5, tzinfo=timezone.utc)
+    js.upsert_daily_from_snapshot(_snap(t0.isoformat(), 50.0))
+    js.upsert_daily_from_snapshot(_snap((t0 + timedelta(hours=1)).isoformat(), 70.0))
+
+    rows = _read_days(js.SNAPSHOTS_DAY_PATH)
+    assert len(rows) == 29
+    assert rows[:28] == history
+    assert rows[-1]["date"] == "2024-02-01"
+    assert rows[-1]["open"] == 50.0 and rows[-1]["close"] == 70.0
+    assert rows[-1]["count"] == 2
+
+
+def test_upsert_out_of_order_and_torn_tail(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+
+    js.upsert_daily_from_snapshot(_snap("2025-10-08T10:00:00+00:00", 90.0))
+    # late snapshot for an earlier day -> inserted in date order
+    js.upsert_daily_from_snapshot(_snap("2025-10-07T10:00:00+00:00", 80.0))
+    assert [r["date"] for r in _read_days(js.SNAPSHOTS_DAY_PATH)] == ["2025-10-07", "2025-10-08"]
+
+    # simulate a crash mid-write, then keep going
+    with open(js.SNAPSHOTS_DAY_PATH, "a", encoding="utf-8") as f:
+        f.write('{"date": "2025-10-0')
+    js.upsert_daily_from_snapshot(_snap("2025-10-08T11:00:00+00:00", 100.0))
+
+    rows = _read_days(js.SNAPSHOTS_DAY_PATH)
+    assert [r["date"] for r in rows] == ["2025-10-07", "2025-10-08"]
+    assert rows[-1]["close"] == 100.0 and rows[-1]["count"] == 2
@@ -16,3 +16,45 @@ def test_append_snapshot_line(tmp_path):
     obj = {"ts": "now", "total_value": 123}
     json_store.append_snapshot_line(obj)
     assert json.loads(json_store.SNAPSHOTS_PATH.read_text()).get("total_value") == 123
+
+
+def test_read_json_cached_reparses_only_changed_files(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    json_store.write_json(path, {"vs_currency": "usd"})
+    loads = []
+    real_load = json.load
+    monkeypatch.setattr(json, "load", lambda f: loads.append(1) or real_load(f))
+
+    first = json_store.read_json_cached(path)
+    assert json_store.read_json_cached(path) is first
+    assert len(loads) == 1
+
+    # edited behind our back (another process, an editor): picked up on the next read
+    path.write_text('{"vs_currency": "eur", "extra": 1}', encoding="utf-8")
+    assert json_store.read_json_cached(path) == {"vs_currency": "eur", "extra": 1}
+    json_store.write_json(path, {"vs_currency": "gbp"})
+    assert json_store.read_json_cached(path) == {"vs_currency": "gbp"}
+    assert len(loads) == 3
+
+    path.unlink()
+    assert json_store.read_json_cached(path, {"d": 1}) == {"d": 1}
+
+
+def test_cached_readers_hand_out_copies(tmp_path, monkeypatch):
+    from core import portfolio
+
+    monkeypatch.setattr(json_store, "CONFIG_PATH", str(tmp_path / "config.json"))
+    monkeypatch.setattr(portfolio, "PORTFOLIO_PATH", str(tmp_path / "portfolio.json"))
+    json_store.write_json(json_store.CONFIG_PATH, {"vs_currency": "eur"})
+    json_store.write_json(
+        portfolio.PORTFOLIO_PATH, {"positions": [{"id": "bitcoin", "symbol": "btc", "qty": 1.0}]}
+    )
+
+    json_store.read_config()["vs_currency"] = "usd"
+    assert json_store.read_config()["vs_currency"] == "eur"
+    port = portfolio.load_portfolio()
+    port["positions"][0]["qty"] = 5.0
+    port["positions"].append({"id": "ethereum", "symbol": "eth", "qty": 2.0})
+    assert portfolio.load_portfolio()["positions"] == [
+        {"id": "bitcoin", "symbol": "btc", "qty": 1.0}
+    ]
@@ -0,0 +1,80 @@
+import pytest
+import requests
+
+import cli
+from services import coingecko_client as cg
+from services import metrics
+from services.notify import send_webhook
+
+
+class Resp:
+    def __init__(self, status, data=None):
+        self.status_code = status
+        self.headers = {}
+        self._data = data or {}
+
+    def json(self):
+        return self._data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+
+def test_external_calls_are_counted_per_endpoint_and_outcome(monkeypatch, capsys):
+    replies = iter([Resp(503), Resp(200, {"bitcoin": {"usd": 1.0}})])
+
+    def fake_get(url, params=None, **kwargs):
+        if "coingecko" not in url:
+            raise requests.Timeout("slow")
+        return next(replies)
+
+    monkeypatch.setattr(cg.requests, "get", fake_get)
+    monkeypatch.setattr(requests, "post", lambda url, **kw: Resp(204))
+    with pytest.raises(requests.HTTPError):
+        cg.get_prices(["bitcoin"], "usd")  # 503, then the Yahoo fallback times out
+    cg.get_prices(["bitcoin"], "usd")
+    assert send_webhook("https://hooks.example/x", "hi")
+
+    rows = {(r["endpoint"], r["outcome"]): r for r in metrics.read_metrics()["series"]}
+    assert sorted(rows) == [
+        ("coingecko", "200"),
+        ("coingecko", "5xx"),
+        ("webhook", "2xx"),
+        ("yahoo", "timeout"),
+    ]
+    assert all(r["count"] == 1 for r in rows.values())
+    assert rows["coingecko", "200"]["p99_ms"] <= rows["coingecko", "200"]["max_ms"]
+
+    cli.cmd_metrics(cli.build_parser().parse_args(["metrics"]))
+    out = capsys.readouterr().out
+    assert "coingecko  5xx" in out and "p99" in out
+    cli.cmd_metrics(cli.build_parser().parse_args(["metrics", "--reset"]))
+    assert metrics.read_metrics()["series"] == []
+
+
+def test_percentiles_interpolate_within_buckets():
+    series = metrics._empty_series()
+    for ms in [3.0] * 50 + [40.0] * 40 + [700.0] * 10:
+        series["count"] += 1
+        series["max_ms"] = max(series["max_ms"], ms)
+        series["buckets"][metrics._bucket(ms)] += 1
+    assert metrics.percentile(series, 50) == 5.0  # top of the first bucket
+    assert 25.0 < metrics.percentile(series, 90) <= 50.0
+    assert 500.0 < metrics.percentile(series, 99) <= 700.0
+
+
+def test_observations_stay_in_memory_until_flushed(tmp_path):
+    path = tmp_path / "metrics.json"
+    for ms in (3.0, 40.0):
+        with metrics.timed("coingecko") as rec:
+            rec["status"] = 200
+        metrics.observe("yahoo", "fallback", ms)
+    assert not path.exists()  # no file I/O on the measured calls
+    metrics.flush()
+    metrics.observe("yahoo", "fallback", 700.0)
+    metrics.flush()
+    rows = {(r["endpoint"], r["outcome"]): r for r in metrics.read_metrics()["series"]}
+    assert rows["coingecko", "200"]["count"] == 2
+    assert rows["yahoo", "fallback"]["count"] == 3
+    assert rows["yahoo", "fallback"]["max_ms"] == 700.0
@@ -0,0 +1,105 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+
+
+def _write(path, rows):
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+
+
+def _rows(n=2000, seed=7):
+    rnd = random.Random(seed)
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "ts": (start + timedelta(minutes=37 * i)).isoformat(),
+            "total_value": rnd.uniform(900.0, 1100.0) / 3.0,
+        }
+        for i in range(n)
+    ]
+
+
+def test_chunk_bounds_align_on_lines(tmp_path):
+    path = tmp_path / "snaps.jsonl"
+    _write(path, _rows(300))
+    bounds = js._chunk_bounds(path, 7)
+    assert bounds[0][0] == 0 and bounds[-1][1] == path.stat().st_size
+    data = path.read_bytes()
+    for a, b in bounds:
+        assert a < b and (a == 0 or data[a - 1 : a] == b"\n")
+
+
+def test_parallel_matches_serial_bit_for_bit(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    rows = _rows()
+    _write(path, rows)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"ts": "2025-01-10T00:00:00+00:00", "total_va\n')  # torn line still counts
+
+    monkeypatch.setattr(js, "ROLLUP_PARALLEL_MIN_BYTES", 0)
+    serial = js._aggregate_daily_file(path)
+    parallel = js._aggregate_daily_file_parallel(path, workers=3)
+    assert parallel == serial
+    assert parallel[1] == len(rows) + 1
+
+
+def test_parallel_folds_tiers_bit_for_bit(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    _write(path, _rows())
+    monkeypatch.setattr(js, "ROLLUP_PARALLEL_MIN_BYTES", 0)
+    serial = {tier: {} for tier in ("1h", "1w", "1M")}
+    parallel = {tier: {} for tier in ("1h", "1w", "1M")}
+    assert js._aggregate_daily_file_parallel(
+        path, workers=3, tiers=parallel
+    ) == js._aggregate_daily_file(path, tiers=serial)
+    assert parallel == serial and len(serial["1M"]) == 2
+
+
+def test_parallel_continues_from_prior_state(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    _write(path, _rows(500))
+    prior = {
+        "2025-01-01": {
+            "date": "2025-01-01",
+            "open": 1.0,
+            "close": 2.0,
+            "high": 5.0,
+            "low": 0.5,
+            "sum": 12.3,
+            "count": 4,
+        }
+    }
+    monkeypatch.setattr(js, "ROLLUP_PARALLEL_MIN_BYTES", 0)
+    serial = js._aggregate_daily_file(path, {d: dict(r) for d, r in prior.items()})
+    parallel = js._aggregate_daily_file_parallel(path, prior, workers=4)
+    assert parallel == serial
+
+
+def test_out_of_order_day_falls_back_to_serial(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    rows = _rows(600)
+    rows.append({"ts": "2025-01-02T12:00:00+00:00", "total_value": 1234.5})
+    rows += _rows(600, seed=8)[590:]
+    _write(path, rows)
+    monkeypatch.setattr(js, "ROLLUP_PARALLEL_MIN_BYTES", 0)
+    assert js._aggregate_daily_file_parallel(path, workers=4) == js._aggregate_daily_file(path)
+
+
+def test_rebuild_uses_configured_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "ROLLUP_PARALLEL_MIN_BYTES", 0)
+    _write(js.SNAPSHOTS_PATH, _rows())
+
+    monkeypatch.setattr(js, "read_config", lambda: {"rollup_workers": 1})
+    js.rebuild_daily_rollups()
+    serial = js.read_daily_all()
+    monkeypatch.setattr(js, "read_config", lambda: {"rollup_workers": 3})
+    assert js._rollup_workers() == 3
+    js.rebuild_daily_rollups()
+    assert js.read_daily_all() == serial
@@ -0,0 +1,137 @@
+import threading
+
+from services import coingecko_client as cg
+from services import price_cache
+
+
+class Resp:
+    status_code = 200
+    headers: dict = {}
+
+    def __init__(self, data):
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def _counting_get(calls, gate=None):
+    def fake_get(url, params=None, **kwargs):
+        if gate is not None:
+            gate.wait(5)
+        ids = params["ids"].split(",")
+        calls.append(ids)
+        return Resp({cid: {params["vs_currencies"]: 100.0 + len(calls)} for cid in ids})
+
+    return fake_get
+
+
+def test_fresh_prices_are_served_without_network(monkeypatch):
+    calls = []
+    monkeypatch.setattr(cg.requests, "get", _counting_get(calls))
+    clock = [1000.0]
+    monkeypatch.setattr(price_cache.time, "time", lambda: clock[0])
+    monkeypatch.setattr(price_cache, "ttl_for", lambda vs: {"usd": 60.0, "eur": 5.0}[vs])
+
+    assert cg.get_prices(["bitcoin"], "usd") == {"bitcoin": {"usd": 101.0, "source": "coingecko"}}
+    # only the missing id is fetched; the cached one keeps its price
+    assert cg.get_prices(["bitcoin", "ethereum"], "usd") == {
+        "bitcoin": {"usd": 101.0, "source": "coingecko"},
+        "ethereum": {"usd": 102.0, "source": "coingecko"},
+    }
+    assert calls == [["bitcoin"], ["ethereum"]]
+
+    # another process: nothing in memory, the disk copy is still fresh
+    monkeypatch.setattr(price_cache, "_mem", {})
+    clock[0] += 30
+    assert cg.get_prices("bitcoin,ethereum", "usd")["ethereum"] == {
+        "usd": 102.0,
+        "source": "coingecko",
+    }
+    assert len(calls) == 2
+
+    # per-currency TTL and max_age
+    cg.get_prices(["bitcoin"], "eur")
+    clock[0] += 10
+    cg.get_prices(["bitcoin"], "eur")
+    assert calls[-1] == ["bitcoin"] and len(calls) == 4
+    cg.get_prices(["bitcoin"], "usd", max_age=0)
+    assert len(calls) == 5
+
+
+def test_concurrent_requests_share_one_fetch(monkeypatch):
+    calls, gate = [], threading.Event()
+    monkeypatch.setattr(cg.requests, "get", _counting_get(calls, gate))
+    results = []
+
+    def worker():
+        results.append(cg.get_prices(["bitcoin", "solana"], "usd"))
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    while not price_cache._inflight:
+        threading.Event().wait(0.01)
+    gate.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    price = {"usd": 101.0, "source": "coingecko"}
+    assert results == [{"bitcoin": price, "solana": price}] * 4
+
+
+def test_file_lock_excludes_other_processes_and_times_out(tmp_path):
+    import os
+    import subprocess
+    import sys
+
+    from utils.lock import file_lock
+
+    path = str(tmp_path / "x.lock")
+    probe = (
+        "import sys; from utils.lock import file_lock\n"
+        "try:\n"
+        "    with file_lock(sys.argv[1], timeout=0.2): print('got')\n"
+        "except TimeoutError: print('timeout')\n"
+    )
+
+    def other_process():
+        out = subprocess.run(
+            [sys.executable, "-c", probe, path],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+        return out.stdout.strip()
+
+    with file_lock(path):
+        assert other_process() == "timeout"
+    assert other_process() == "got"
+
+
+def test_fetch_lock_is_per_id_set_and_bounded(monkeypatch):
+    from utils.lock import file_lock
+
+    calls = []
+    monkeypatch.setattr(cg.requests, "get", _counting_get(calls))
+    monkeypatch.setattr(price_cache, "FETCH_LOCK_TIMEOUT_SEC", 0.1)
+    # another process is fetching bitcoin: ethereum is not held up, bitcoin waits only briefly
+    with file_lock(price_cache._fetch_lock_path("usd", ["bitcoin"])):
+        assert cg.get_prices(["ethereum"], "usd")["ethereum"]["usd"] == 101.0
+        assert cg.get_prices(["bitcoin"], "usd")["bitcoin"]["usd"] == 102.0
+    assert calls == [["ethereum"], ["bitcoin"]]
+
+
+def test_fallback_prices_are_not_cached(monkeypatch):
+    calls = []
+    monkeypatch.setattr(cg.requests, "get", _counting_get(calls))
+    price_cache.store(
+        {"bitcoin": {"usd": 1.0, "source": "html"}, "ethereum": {"usd": 2.0, "source": "coingecko"}},
+        "usd",
+    )
+    monkeypatch.setattr(price_cache, "_mem", {})  # the disk copy holds no fallback price either
+    data = cg.get_prices(["bitcoin", "ethereum"], "usd")
+    assert data["ethereum"] == {"usd": 2.0, "source": "coingecko"}
+    assert data["bitcoin"] == {"usd": 101.0, "source": "coingecko"}
+    assert calls == [["bitcoin"]]
@@ -0,0 +1,72 @@
+import json
+
+import storage.json_store as js
+
+FIELDS = [("ts",), ("total_value",), ("ts", "total_value"), ("ts", "total_value", "vs_currency")]
+
+
+def _full(raw, fields):
+    try:
+        row = json.loads(raw)
+    except Exception:
+        return None
+    return {f: row[f] for f in fields if f in row}
+
+
+def test_projection_matches_full_decode():
+    objs = [
+        {"ts": "2025-01-01T00:00:00+00:00", "total_value": 12.5, "vs_currency": "usd"},
+        {"ts": "2025-01-01T00:10:00+00:00", "total_value": 3, "prices": {"bitcoin": 1.0}},
+        {"ts": "t", "total_value": -1.5e-07, "vs_currency": "eur", "positions": [{"a": 1}]},
+        {"ts": "t", "total_value": float("nan")},
+        {"ts": 'quo"te', "total_value": 1.0},
+        {"total_value": 2.0},
+    ]
+    lines = [json.dumps(js._ordered_snapshot(o)).encode() + b"\n" for o in objs]
+    # legacy key order and torn lines
+    lines.append(json.dumps({"prices": {}, "ts": "z", "total_value": 2.0}).encode())
+    lines.append(b'{"ts": "x", "total_value": 1.0, "prices": {"a": 1}')
+    lines.append(b'{"ts": "x", "total_va')
+    for raw in lines:
+        for fields in FIELDS:
+            got, want = js.project_snapshot(raw, fields), _full(raw, fields)
+            assert repr(got) == repr(want), (raw, fields)
+            if got and "total_value" in got:
+                assert type(got["total_value"]) is type(want["total_value"])
+
+
+def test_append_writes_head_fields_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    js.append_snapshot_line(
+        {
+            "ts": "2025-01-01T00:00:00+00:00",
+            "prices": {"bitcoin": 1.0},
+            "total_value": 5.0,
+            "vs_currency": "usd",
+        }
+    )
+    raw = open(js.SNAPSHOTS_PATH, "rb").read()
+    assert raw.startswith(b'{"ts": "2025-01-01T00:00:00+00:00", "total_value": 5.0, "vs_currency"')
+    assert js._HEAD_RE.match(raw) is not None
+    assert list(js.iter_snapshot_fields(("total_value",))) == [{"total_value": 5.0}]
+
+
+def test_rollup_same_for_legacy_and_ordered_layout(tmp_path, monkeypatch):
+    rows = [
+        {
+            "ts": f"2025-02-0{1 + i // 5}T0{i % 5}:00:00+00:00",
+            "prices": {"b": i},
+            "total_value": 100.0 + i * 1.1,
+        }
+        for i in range(20)
+    ]
+    for name, order in (("legacy", lambda o: o), ("ordered", js._ordered_snapshot)):
+        path = tmp_path / f"{name}.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(order(r)) + "\n")
+    assert js._aggregate_daily_file(tmp_path / "legacy.jsonl") == js._aggregate_daily_file(
+        tmp_path / "ordered.jsonl"
+    )
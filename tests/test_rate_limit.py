@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+from services import coingecko_client as cg
+from services import rate_limit
+from services.rate_limit import RateLimited, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1_000_000.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, secs):
+        self.slept.append(secs)
+        self.now += secs
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "time", c.time)
+    monkeypatch.setattr(rate_limit.time, "sleep", c.sleep)
+    return c
+
+
+def test_bucket_spends_burst_then_queues(tmp_path, clock):
+    path = tmp_path / "rl"
+    bucket = TokenBucket(path, rate=0.5, burst=2)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.expected_wait() == pytest.approx(2.0)
+
+    # a second process sharing the file reserves the next slot, so the next one waits longer
+    other = TokenBucket(path, rate=0.5, burst=2)
+    with pytest.raises(RateLimited) as err:
+        other.acquire(max_wait=1.0)
+    assert err.value.wait == pytest.approx(2.0)
+    assert other.acquire() == pytest.approx(2.0)
+    assert clock.slept == [pytest.approx(2.0)]
+    assert bucket.expected_wait() == pytest.approx(2.0)
+
+
+def test_429_halves_rate_blocks_and_recovers(tmp_path, clock):
+    bucket = TokenBucket(tmp_path / "rl", rate=1.0, burst=1)
+    bucket.penalize(retry_after=5)
+    state = json.loads((tmp_path / "rl").read_text())
+    assert state["rate"] == 0.5
+    assert bucket.expected_wait() == pytest.approx(5.0)
+    clock.now += 5
+    assert bucket.expected_wait() == 0
+
+    for _ in range(3):
+        bucket.penalize()
+    assert json.loads((tmp_path / "rl").read_text())["rate"] == 1.0 / 8  # min_rate floor
+    for _ in range(20):
+        bucket.reward()
+    assert json.loads((tmp_path / "rl").read_text())["rate"] == 1.0
+
+
+def test_get_prices_draws_from_shared_bucket(monkeypatch, clock):
+    monkeypatch.setattr(cg, "_html_fallback", lambda ids, vs: None)
+    monkeypatch.setattr(
+        cg.http_session, "get", lambda url, **kw: _Resp(429, {"Retry-After": "60"})
+    )
+    with pytest.raises(RateLimited):
+        cg.get_prices(["bitcoin"], "usd")  # retry would wait 60s > coingecko_max_wait_sec
+    assert cg.expected_wait() == pytest.approx(60.0)
+
+
+class _Resp:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+
+def test_callers_queued_behind_retry_after_are_spaced_out(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(rate_limit.time, "sleep", clock.slept.append)  # reservations only
+    bucket = TokenBucket(tmp_path / "rl", rate=1.0, burst=3)
+    bucket.penalize(retry_after=60)  # rate halves to 0.5/s
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits == [pytest.approx(w) for w in (60.0, 62.0, 64.0, 66.0)]
+    clock.now += 70  # tokens accrue only for the 10 s after the block: -3 + 10 * 0.5
+    assert bucket.expected_wait() == 0
+    assert json.loads((tmp_path / "rl").read_text())["tokens"] == pytest.approx(2.0)
@@ -0,0 +1,153 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage.json_store as js
+
+START = datetime(2025, 10, 1, tzinfo=timezone.utc)
+POLICY = [{"after_days": 5, "every": "1h"}, {"after_days": 2, "every": "15m"}]
+
+
+def _redirect(tmp_path, monkeypatch, **cfg):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(
+        js, "read_config", lambda: {"segment_period": "day", "retention": POLICY, **cfg}
+    )
+    monkeypatch.setattr(js, "_backend_cache", {})
+
+
+def _rows(days=8):
+    out = []
+    for i in range(days * 144):  # every 10 minutes; each value held for 3 ticks
+        k = i // 3
+        out.append(
+            {
+                "ts": (START + timedelta(minutes=10 * i)).isoformat(),
+                "total_value": 100.0 + (k * 7) % 19 + k / 1000,
+                "vs_currency": "usd",
+                "prices": {"bitcoin": 60000.0 + (k * 11) % 23 + k / 7, "ethereum": 3000.0 + k % 5},
+            }
+        )
+    return out
+
+
+def _strip(rows):
+    return [{k: r[k] for k in ("date", "open", "close", "high", "low", "count")} for r in rows]
+
+
+# cutoffs fall between the ticks of one held value, so a repeat line outlives its base
+NOW = START + timedelta(days=8, minutes=5)
+
+
+def test_retention_downsamples_sealed_segments_only(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    daily = js.read_daily_all()
+    hourly = js.read_rollups("1h")
+    coins = {c: js.read_coin_daily(c) for c in js.rollup_coins()}
+    hot = open(js.SNAPSHOTS_PATH, "rb").read()
+
+    assert js.apply_retention(dry_run=True, now=NOW)["segments"] == 7
+    assert js.read_last_snapshots(len(rows)) == rows
+    res = js.apply_retention(now=NOW)
+    assert res["segments"] == 7
+    assert res["rows_before"] == 7 * 144  # day 8 is the hot file
+    assert res["rows_after"] < res["rows_before"] / 1.5
+    assert open(js.SNAPSHOTS_PATH, "rb").read() == hot
+    assert js.apply_retention(now=NOW)["segments"] == 0
+
+    # newer than both cutoffs: the raw rows, repeat lines expanded where needed
+    cut = (NOW - timedelta(days=2)).isoformat()
+    kept = [r for r in rows if r["ts"] >= cut]
+    assert js.read_snapshots_range(cut, None) == kept
+    merged = [s for s in js.read_last_snapshots(len(rows)) if "ds" in s]
+    assert {s["ds"]["every"] for s in merged} == {900, 3600}
+    assert sum(s["ds"]["count"] for s in merged) == len(rows) - len(kept)
+
+    # daily and per-coin rollups rebuild identically; other tiers keep their OHLC/counts
+    assert js.rebuild_daily_rollups()["snapshots"] == len(rows)
+    assert js.read_daily_all() == daily
+    assert {c: js.read_coin_daily(c) for c in js.rollup_coins()} == coins
+    js.rebuild_rollup_tiers()
+    assert _strip(js.read_rollups("1h")) == _strip(hourly)
+
+    # without the cached per-day state, the merged records still fold exactly
+    seg_dir = tmp_path / "segments"
+    for name in os.listdir(seg_dir):
+        if name.endswith(".days.json"):
+            os.remove(seg_dir / name)
+    js.rebuild_daily_rollups()
+    assert _strip(js.read_daily_all()) == _strip(daily)
+    assert js.read_daily_all()[0]["avg"] == pytest.approx(daily[0]["avg"])
+
+
+def test_coarser_step_merges_already_downsampled_records(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, segment_compression="gzip")
+    rows = _rows(days=4)
+    for r in rows:
+        js.append_snapshot_line(r)
+    js.compress_sealed_segments()
+    js.rebuild_daily_rollups()
+    daily = js.read_daily_all()
+
+    js.apply_retention(now=START + timedelta(days=4))  # days 1-2 at 15m, day 3 raw
+    js.apply_retention(now=START + timedelta(days=9))  # everything sealed reaches 1h
+    merged = [s for s in js.read_last_snapshots(len(rows)) if "ds" in s]
+    assert {s["ds"]["every"] for s in merged} == {3600}
+    assert len(merged) == 3 * 24
+    assert all(seg["downsampled"] == 3600 for seg in js.read_segment_manifest()["segments"])
+    js.rebuild_daily_rollups()
+    assert js.read_daily_all() == daily
+
+
+def test_retention_skips_a_segment_compacted_mid_run(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(days=3)
+    for r in rows:
+        js.append_snapshot_line(r)
+    real = js._downsample_segment
+
+    def compact_meanwhile(path, policy, now_ms, out):
+        res = real(path, policy, now_ms, out)
+        if out is not None and path.endswith("2025-10-01.jsonl"):
+            js.compact_segments("gzip")
+        return res
+
+    monkeypatch.setattr(js, "_downsample_segment", compact_meanwhile)
+    assert js.apply_retention(now=NOW)["segments"] == 0
+    segs = js.read_segment_manifest()["segments"]
+    assert [s["file"] for s in segs] == [
+        "snapshots-2025-10-01.jsonl.gz",
+        "snapshots-2025-10-02.jsonl.gz",
+    ]
+    assert not any("downsampled" in s for s in segs)
+    assert js.read_last_snapshots(len(rows)) == rows
+    assert not [n for n in os.listdir(tmp_path / "segments") if n.endswith(".tmp")]
+
+
+@pytest.mark.parametrize(
+    "policy",
+    [
+        {"after_days": 30, "every": "15m"},
+        [{"after_days": 30, "every": "7m"}],
+        [{"after_days": 30, "every": "15m"}, {"after_days": 90, "every": "20m"}],
+        [{"after_days": 0, "every": "1h"}],
+    ],
+)
+def test_invalid_policies_are_rejected(policy):
+    with pytest.raises(ValueError):
+        js.retention_policy({"retention": policy})
+
+
+def test_retention_requires_segments(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    with open(js.SNAPSHOTS_PATH, "w", encoding="utf-8") as f:
+        f.write('{"ts": "2025-08-01T00:00:00+00:00", "total_value": 1.0}\n')
+    with pytest.raises(ValueError):
+        js.apply_retention()
@@ -0,0 +1,95 @@
+import json
+from datetime import datetime, timezone
+
+import storage.json_store as js
+
+
+def _snap(total):
+    return {
+        "ts": datetime.now(timezone.utc).isoformat(),
+        "vs_currency": "usd",
+        "total_value": total,
+        "prices": {"bitcoin": total},
+    }
+
+
+def _redirect(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_BAD_PATH", tmp_path / "snaps_bad.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+
+
+def test_guard_seeds_once_and_keeps_window(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for t in [1000.0, 1020.0, 980.0, 1010.0]:
+        js.append_snapshot_line(_snap(t))
+
+    guard = js.OutlierGuard(window=4, threshold=0.80)
+
+    reads = {"n": 0}
+    real = js._read_last_totals
+
+    def counting(n):
+        reads["n"] += 1
+        return real(n)
+
+    monkeypatch.setattr(js, "_read_last_totals", counting)
+
+    assert guard.append(_snap(120.0)) is False
+    assert guard.append(_snap(1300.0)) is True
+    assert guard.append(_snap(1005.0)) is True
+    # seeded from the tail exactly once; later cycles are served from memory
+    assert reads["n"] == 1
+    # window slid: 980, 1010, 1300, 1005
+    assert guard.median() == (1005.0 + 1010.0) / 2
+
+    with open(js.SNAPSHOTS_PATH, "r", encoding="utf-8") as f:
+        assert sum(1 for ln in f if ln.strip()) == 6
+    with open(js.SNAPSHOTS_BAD_PATH, "r", encoding="utf-8") as f:
+        bad = [json.loads(ln) for ln in f if ln.strip()]
+    assert len(bad) == 1
+
+
+def test_guard_reseeds_after_external_append(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for t in [100.0, 100.0, 100.0]:
+        js.append_snapshot_line(_snap(t))
+
+    guard = js.OutlierGuard(window=3, threshold=0.5)
+    assert guard.append(_snap(110.0)) is True
+
+    # another process (e.g. `crypto track`) appends behind the daemon's back
+    for t in [1000.0, 1000.0, 1000.0]:
+        js.append_snapshot_line(_snap(t))
+
+    assert guard.append(_snap(1010.0)) is True
+    assert guard.median() == 1000.0
+
+
+def test_guarded_append_uses_guard(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    guard = js.OutlierGuard(window=3, threshold=0.5)
+    for t in [100.0, 101.0, 99.0]:
+        assert js.guarded_append_snapshot_line(_snap(t), guard=guard) is True
+    assert js.guarded_append_snapshot_line(_snap(10.0), guard=guard) is False
+
+
+def test_guard_reseeds_after_append_racing_its_own(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for t in [100.0, 100.0, 100.0]:
+        js.append_snapshot_line(_snap(t))
+    guard = js.OutlierGuard(window=3, threshold=0.5)
+    real = js._screen_outlier
+
+    def racing(*args):
+        # another process appends between the guard's sync and its own write
+        for t in [1000.0, 1000.0]:
+            js.append_snapshot_line(_snap(t))
+        return real(*args)
+
+    monkeypatch.setattr(js, "_screen_outlier", racing)
+    assert guard.append(_snap(110.0)) is True
+    monkeypatch.setattr(js, "_screen_outlier", real)
+    assert guard.append(_snap(1010.0)) is True
+    assert guard.median() == 1000.0
@@ -0,0 +1,169 @@
+import json
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch, **cfg):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: dict(cfg))
+
+
+def _rows(n, start=datetime(2025, 8, 25, tzinfo=timezone.utc), seed=3):
+    rnd = random.Random(seed)
+    return [
+        {
+            "ts": (start + timedelta(hours=5 * i)).isoformat(),
+            "total_value": rnd.uniform(90.0, 110.0) / 7.0,
+        }
+        for i in range(n)
+    ]
+
+
+def _full():
+    js.rebuild_daily_rollups()
+    return js.read_daily_all()
+
+
+def _no_full_rebuild(monkeypatch):
+    def boom(*a, **kw):
+        raise AssertionError("full rebuild")
+
+    monkeypatch.setattr(js, "_jsonl_rebuild_daily_rollups", boom)
+
+
+def test_refresh_folds_only_new_lines(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(60)
+    for r in rows[:40]:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    for r in rows[40:]:
+        js.append_snapshot_line(r)
+
+    with monkeypatch.context() as m:
+        _no_full_rebuild(m)
+        res = js.refresh_daily_rollups()
+        refreshed = js.read_daily_all()
+        assert res["incremental"] and res["snapshots"] == 60
+        # nothing new: still incremental and unchanged
+        assert js.refresh_daily_rollups()["snapshots"] == 60
+    assert refreshed == _full()
+    assert res["days"] == len(refreshed)
+
+
+@pytest.mark.parametrize("compression", ["none", "gzip"])
+def test_refresh_across_segment_seal(tmp_path, monkeypatch, compression):
+    _redirect(tmp_path, monkeypatch, segment_period="month", segment_compression=compression)
+    rows = _rows(120)  # late August into September
+    for r in rows[:20]:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    for r in rows[20:]:
+        js.append_snapshot_line(r)
+    js.compress_sealed_segments()
+    assert js.read_segment_manifest()["segments"]
+
+    with monkeypatch.context() as m:
+        _no_full_rebuild(m)
+        assert js.refresh_daily_rollups()["incremental"]
+        refreshed = js.read_daily_all()
+    assert refreshed == _full()
+
+
+def test_rebuild_and_refresh_cover_every_tier(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(90)
+    for r in rows[:40]:
+        js.append_snapshot_line(r)
+    for name in ("snapshots_hour.jsonl", "snapshots_week.jsonl", "snapshots_month.jsonl"):
+        os.remove(tmp_path / name)
+    js.rebuild_daily_rollups()
+    assert sum(r["count"] for r in js.read_rollups("1M")) == 40
+    with open(js.SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
+        for r in rows[40:]:  # written without the per-append upserts
+            f.write(json.dumps(r) + "\n")
+
+    with monkeypatch.context() as m:
+        _no_full_rebuild(m)
+        assert js.refresh_daily_rollups()["incremental"]
+        refreshed = {t: js.read_rollups(t) for t in js.ROLLUP_TIERS}
+    js.rebuild_daily_rollups()
+    assert refreshed == {t: js.read_rollups(t) for t in js.ROLLUP_TIERS}
+    assert sum(r["count"] for r in refreshed["1h"]) == len(rows)
+
+
+def test_truncation_forces_full_rebuild(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for r in _rows(30):
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    with open(js.SNAPSHOTS_PATH, "r+b") as f:
+        f.truncate(100)
+    res = js.refresh_daily_rollups()
+    assert res["incremental"] is False
+    assert js.read_daily_all() == _full()
+
+
+def test_out_of_order_day_forces_full_rebuild(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(30)
+    for r in rows:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    js.append_snapshot_line({"ts": rows[0]["ts"], "total_value": 1.0})
+    assert js.refresh_daily_rollups()["incremental"] is False
+    assert js.read_daily_all()[0]["count"] == 6  # 5 regular rows + the late one
+
+
+def test_in_flight_line_is_left_for_next_refresh(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(12)
+    for r in rows[:10]:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    line = json.dumps(rows[10]) + "\n"
+    with open(js.SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
+        f.write(line[:15])
+    assert js.refresh_daily_rollups()["snapshots"] == 10
+    with open(js.SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
+        f.write(line[15:])
+    res = js.refresh_daily_rollups()
+    assert res["incremental"] and res["snapshots"] == 11
+    assert js.read_daily_all() == _full()
+
+
+def test_refresh_folds_coin_prices(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(90)
+    for i, r in enumerate(rows):
+        # values held for three ticks are stored as v2 repeat lines; row 40 is one
+        r["total_value"] = rows[i - i % 3]["total_value"]
+        r["prices"] = {"bitcoin": 60000.0 + (i // 3) / 7.0}
+        if i >= 60:
+            r["prices"]["solana"] = 150.0 + (i // 3) / 3.0
+    for r in rows[:40]:
+        js.append_snapshot_line(r)
+    js.rebuild_daily_rollups()
+    with monkeypatch.context() as m:
+        m.setattr(js, "_upsert_coin_rollups", lambda snapshot, d: None)
+        js.append_snapshot_line(rows[40])
+        with open(js.SNAPSHOTS_PATH, "rb") as f:
+            assert f.read().rstrip().endswith(b', "rep": 1}')
+        for r in rows[41:]:  # coins_day/ not touched by these appends
+            js.append_snapshot_line(r)
+        _no_full_rebuild(m)
+        assert js.refresh_daily_rollups()["incremental"]
+        refreshed = {c: js.read_coin_daily(c) for c in js.rollup_coins()}
+        assert js.refresh_daily_rollups()["incremental"]  # nothing new
+        assert {c: js.read_coin_daily(c) for c in js.rollup_coins()} == refreshed
+    assert set(refreshed) == {"bitcoin", "solana"}
+    assert sum(r["count"] for r in refreshed["bitcoin"]) == len(rows)
+    js.rebuild_daily_rollups()
+    assert refreshed == {c: js.read_coin_daily(c) for c in js.rollup_coins()}
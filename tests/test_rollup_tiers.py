@@ -0,0 +1,181 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+from storage import rollup_tiers
+
+
+def _redirect(tmp_path, monkeypatch, backend="jsonl"):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {"storage_backend": backend})
+    monkeypatch.setattr(js, "_backend_cache", {})
+
+
+def _rows(n=120, start=datetime(2025, 9, 27, 22, tzinfo=timezone.utc)):
+    return [
+        {
+            "ts": (start + timedelta(minutes=50 * i)).isoformat(),
+            "total_value": 100.0 + (i * 7) % 13,
+            "vs_currency": "usd",
+            "prices": {"bitcoin": 60000.0 + i},
+        }
+        for i in range(n)
+    ]
+
+
+def _strip(rows):
+    return [{k: r[k] for k in ("date", "open", "close", "high", "low", "count")} for r in rows]
+
+
+def test_bucket_keys_and_pick_tier():
+    dt = datetime(2025, 10, 8, 15, 22, tzinfo=timezone.utc)  # a Wednesday
+    assert [rollup_tiers.bucket_key(t, dt) for t in rollup_tiers.ROLLUP_TIERS] == [
+        "2025-10-08T15:00",
+        "2025-10-08",
+        "2025-10-06",
+        "2025-10",
+    ]
+    day = 86_400_000
+    assert rollup_tiers.pick_tier(2 * day, 24) == "1h"
+    assert rollup_tiers.pick_tier(90 * day, 60) == "1d"
+    assert rollup_tiers.pick_tier(365 * day, 40) == "1w"
+    assert rollup_tiers.pick_tier(5 * 365 * day, 60) == "1M"
+    assert rollup_tiers.pick_tier(None, 10) == "1d"
+
+
+def test_history_and_stats_pick_rollup_tiers(tmp_path, monkeypatch, capsys):
+    import cli
+
+    _redirect(tmp_path, monkeypatch)
+    for r in _rows():
+        js.append_snapshot_line(r)
+    parser = cli.build_parser()
+
+    def run(*argv):
+        args = parser.parse_args(list(argv))
+        args.func(args)
+        return capsys.readouterr().out
+
+    short = ("2025-09-28T01:00Z", "2025-09-28T05:00Z")
+    assert js.pick_rollup_tier(*short, points=10, allow_raw=True) == "raw"
+    out = run("history", "--rollup", "auto", "--from", "2025-09-27", "--to", "2025-10-02")
+    assert out.startswith("Using 1h rollups.") and "Hourly rollups" in out
+    assert "Using" not in run("history", "--rollup", "auto", "--from", short[0], "--to", short[1])
+    # without --rollup a range stays raw snapshots, and --last still applies
+    out = run("history", "--last", "3", "--from", "2025-09-27", "--to", "2025-10-02")
+    assert out.startswith("Last 3 snapshots:") and out.count("total=") == 3
+    out = run("history", "--rollup", "1h", "--last", "4", "--from", "2025-09-27")
+    assert out.count("\n2025-") == 4
+    assert "Daily rollups" in run("history", "--daily", "--from", "2025-09-27")
+    assert "Using" not in run("history")  # a plain tail stays raw
+    assert "Per-coin stats use daily" not in run("stats", "--coin", "bitcoin")
+
+    # an explicit tier reads --last N of its buckets, not N days
+    seen = []
+    real = cli.read_last_rollups
+    monkeypatch.setattr(cli, "read_last_rollups", lambda t, n: seen.append((t, n)) or real(t, n))
+    run("stats", "--tier", "1h", "--last", "24")
+    assert seen == [("1h", 24)]
+
+
+def test_history_reports_bad_dates(tmp_path, monkeypatch, capsys):
+    import cli
+
+    _redirect(tmp_path, monkeypatch)
+    parser = cli.build_parser()
+    for argv in (["--at", "nope"], ["--from", "nope"], ["--daily", "--to", "2025-13-01"]):
+        args = parser.parse_args(["history", *argv])
+        assert args.func(args) == 1
+        assert capsys.readouterr().out.startswith("Invalid ")
+
+
+def test_stats_reports_bad_dates(tmp_path, monkeypatch, capsys):
+    import cli
+
+    _redirect(tmp_path, monkeypatch)
+    for r in _rows():
+        js.append_snapshot_line(r)
+    parser = cli.build_parser()
+    for argv in (["--from", "2024-13-45"], ["--to", "nope"], ["--tier", "1w", "--from", "x"]):
+        args = parser.parse_args(["stats", *argv])
+        assert args.func(args) == 1
+        assert capsys.readouterr().out.startswith("Invalid ")
+
+
+def test_range_reads_seek_to_the_first_bucket(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(400)
+    for r in rows:
+        js.append_snapshot_line(r)
+    with open(tmp_path / "snapshots_hour.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"date": "2025-10-1')  # torn last line
+    for tier in js.ROLLUP_TIERS:
+        every = js.read_rollups(tier)
+        keys = [r["date"] for r in every]
+        assert keys == sorted(keys)
+        for lo, hi in [(0, 5), (3, 3), (len(rows) // 2, None), (None, 40), (len(rows) - 1, None)]:
+            start = rows[lo]["ts"] if lo is not None else None
+            end = rows[hi]["ts"] if hi is not None else None
+            first = rollup_tiers.bucket_key(tier, rollup_tiers.parse_utc(start)) if start else ""
+            last = rollup_tiers.bucket_key(tier, rollup_tiers.parse_utc(end)) if end else "~"
+            want = [r for r in every if first <= r["date"] <= last]
+            assert js.read_rollups(tier, start, end) == want, (tier, lo, hi)
+
+
+def test_incremental_tiers_match_rebuild(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows:
+        js.append_snapshot_line(r)
+    live = {t: js.read_rollups(t) for t in js.ROLLUP_TIERS}
+    assert [r["date"] for r in live["1M"]] == ["2025-09", "2025-10"]
+    assert [r["date"] for r in live["1w"]] == ["2025-09-22", "2025-09-29"]
+    assert sum(r["count"] for r in live["1h"]) == len(rows)
+
+    res = js.rebuild_rollup_tiers()
+    assert res["snapshots"] == len(rows) and res["1M"] == 2
+    for tier in ("1h", "1w", "1M"):
+        assert _strip(js.read_rollups(tier)) == _strip(live[tier])
+
+    # ranges select overlapping buckets; last-n tails in order
+    assert [r["date"] for r in js.read_rollups("1h", "2025-09-28T01:30Z", "2025-09-28T03:00Z")] == [
+        "2025-09-28T01:00",
+        "2025-09-28T02:00",
+        "2025-09-28T03:00",
+    ]
+    assert js.read_last_rollups("1w", 1) == live["1w"][-1:]
+
+
+def test_tiers_built_lazily_for_older_history(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows[:-10]:
+        js.append_snapshot_line(r)
+    for name in ("snapshots_hour.jsonl", "snapshots_week.jsonl", "snapshots_month.jsonl"):
+        os.remove(tmp_path / name)  # as if written before the tiers existed
+    for r in rows[-10:]:
+        js.append_snapshot_line(r)
+    assert not os.path.exists(tmp_path / "snapshots_month.jsonl")
+    assert sum(r["count"] for r in js.read_rollups("1M")) == len(rows)
+
+
+def test_sqlite_tiers_match_jsonl(tmp_path, monkeypatch):
+    rows = _rows()
+    results = {}
+    for backend in ("jsonl", "sqlite"):
+        base = tmp_path / backend
+        base.mkdir()
+        _redirect(base, monkeypatch, backend)
+        for r in rows:
+            js.append_snapshot_line(r)
+        results[backend] = {t: _strip(js.read_rollups(t)) for t in js.ROLLUP_TIERS}
+        results[backend]["last"] = _strip(js.read_last_rollups("1h", 5))
+        if backend == "sqlite":
+            js.rebuild_rollup_tiers()
+            assert {t: _strip(js.read_rollups(t)) for t in js.ROLLUP_TIERS} == {
+                t: results["sqlite"][t] for t in js.ROLLUP_TIERS
+            }
+            js.get_backend().close()
+    assert results["jsonl"] == results["sqlite"]
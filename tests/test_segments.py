@@ -0,0 +1,155 @@
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {"segment_period": "month"})
+
+
+def _rows(days=75, per_day=4, start=datetime(2025, 8, 1, tzinfo=timezone.utc)):
+    out = []
+    for i in range(days * per_day):
+        ts = start + timedelta(hours=24 / per_day * i)
+        out.append({"ts": ts.isoformat(), "total_value": 100.0 + (i % 17), "vs_currency": "usd"})
+    return out
+
+
+def _daily_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(ln) for ln in f if ln.strip()]
+
+
+def test_fresh_install_seals_by_month(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    for r in rows:
+        js.append_snapshot_line(r)
+
+    manifest = js.read_segment_manifest()
+    assert [s["period"] for s in manifest["segments"]] == ["2025-08", "2025-09"]
+    aug = manifest["segments"][0]
+    assert aug["rows"] == 31 * 4
+    assert aug["start"].startswith("2025-08-01") and aug["end"].startswith("2025-08-31")
+    assert aug["high"] == 116.0 and aug["low"] == 100.0
+    # the hot file only holds the current month
+    first = js._first_json_record(js.SNAPSHOTS_PATH)
+    assert first["ts"].startswith("2025-10-01")
+
+    # readers see the whole history
+    tail = js.read_last_snapshots(len(rows))
+    assert [r["ts"] for r in tail] == [r["ts"] for r in rows]
+
+    # rebuild over segments matches the incrementally maintained daily file
+    incremental = _daily_file(js.SNAPSHOTS_DAY_PATH)
+    res = js.rebuild_daily_rollups()
+    assert res == {"days": 75, "snapshots": len(rows)}
+    assert _daily_file(js.SNAPSHOTS_DAY_PATH) == incremental
+
+
+def test_range_skips_segments_outside_window(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    for r in _rows():
+        js.append_snapshot_line(r)
+
+    opened = []
+    real = js._read_range_in_file
+
+    def spy(path, lo, hi):
+        opened.append(os.path.basename(str(path)))
+        return real(path, lo, hi)
+
+    monkeypatch.setattr(js, "_read_range_in_file", spy)
+    got = js.read_snapshots_range("2025-09-10", "2025-09-11")
+    assert len(got) == 8
+    assert opened == ["snapshots-2025-09.jsonl", "snaps.jsonl"]
+
+    at = js.snapshot_at("2025-08-15T07:00Z")
+    assert at["ts"].startswith("2025-08-15T06:00")
+
+
+def test_migrate_single_file_install(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows()
+    with open(js.SNAPSHOTS_PATH, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    before = js.rebuild_daily_rollups()
+    daily_before = _daily_file(js.SNAPSHOTS_DAY_PATH)
+
+    res = js.migrate_to_segments()
+    assert res == {"period": "month", "segments": 2, "rows": len(rows)}
+    assert js.read_last_snapshots(len(rows)) == rows
+    assert js.rebuild_daily_rollups() == before
+    assert _daily_file(js.SNAPSHOTS_DAY_PATH) == daily_before
+
+    # idempotence guard
+    try:
+        js.migrate_to_segments()
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("second migration should refuse")
+
+
+def test_sealing_waits_for_the_manifest_lock_and_rereads(tmp_path, monkeypatch):
+    import threading
+
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(days=40)
+    aug = [r for r in rows if r["ts"] < "2025-09"]
+    for r in aug:
+        js.append_snapshot_line(r)
+
+    worker = threading.Thread(target=js.append_snapshot_line, args=(rows[len(aug)],))
+    with js._manifest_lock():  # another process is mid-update
+        worker.start()
+        worker.join(0.3)
+        assert worker.is_alive()  # the seal waits instead of using a stale manifest
+        manifest = js.read_segment_manifest()
+        manifest["note"] = "written by the other process"
+        js.write_json(js._manifest_path(), manifest)
+    worker.join(5)
+
+    manifest = js.read_segment_manifest()
+    assert manifest["note"] == "written by the other process"
+    assert [s["period"] for s in manifest["segments"]] == ["2025-08"]
+
+
+def test_seal_recovers_from_crash_before_move(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    rows = _rows(days=40)
+    aug = [r for r in rows if r["ts"].startswith("2025-08")]
+    for r in aug:
+        js.append_snapshot_line(r)
+
+    real_replace = os.replace
+
+    def crash(src, dst):
+        if str(src) == str(js.SNAPSHOTS_PATH):
+            raise OSError("power cut")  # the manifest is written, the hot file not moved
+        real_replace(src, dst)
+
+    with js._manifest_lock():
+        manifest = js.read_segment_manifest()
+        monkeypatch.setattr(js.os, "replace", crash)
+        try:
+            js._seal_hot_file(manifest, "2025-08")
+        except OSError:
+            pass
+        monkeypatch.setattr(js.os, "replace", real_replace)
+    segs = js.read_segment_manifest()["segments"]
+    assert [s["file"] for s in segs] == ["snapshots-2025-08.jsonl"]
+    assert js.read_last_snapshots(len(rows))[0]["ts"] == rows[0]["ts"]  # dangling entry skipped
+
+    for r in rows[len(aug):]:
+        js.append_snapshot_line(r)
+    segs = js.read_segment_manifest()["segments"]
+    assert [s["file"] for s in segs] == ["snapshots-2025-08.jsonl"]
+    assert os.path.exists(os.path.join(js._segments_dir(), segs[0]["file"]))
+    assert [r["ts"] for r in js.read_last_snapshots(len(rows))] == [r["ts"] for r in rows]
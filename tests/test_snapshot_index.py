@@ -0,0 +1,68 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    # small stride so a few hundred rows produce many index entries
+    monkeypatch.setattr(js, "INDEX_STRIDE_BYTES", 512)
+
+
+def _append_hours(n, start=datetime(2025, 10, 7, tzinfo=timezone.utc)):
+    for i in range(n):
+        ts = (start + timedelta(hours=i)).isoformat()
+        js.append_snapshot_line({"ts": ts, "total_value": float(i), "vs_currency": "usd"})
+
+
+def test_index_maintained_on_append(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    _append_hours(200)
+
+    entries = js._load_index(js.SNAPSHOTS_PATH)
+    assert entries is not None and len(entries) > 10
+    data = js.SNAPSHOTS_PATH.read_bytes()
+    for ms, off in entries:
+        line = data[off:].split(b"\n", 1)[0]
+        assert js._ts_ms(json.loads(line)["ts"]) == ms
+
+
+def test_range_and_point_lookup(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    _append_hours(200)
+
+    rows = js.read_snapshots_range("2025-10-08T06:00Z", "2025-10-08T09:00Z")
+    assert [r["total_value"] for r in rows] == [30.0, 31.0, 32.0, 33.0]
+
+    # whole-day bounds
+    day = js.read_snapshots_range("2025-10-09", "2025-10-09")
+    assert len(day) == 24 and day[0]["total_value"] == 48.0
+
+    at = js.snapshot_at("2025-10-08T06:30Z")
+    assert at["total_value"] == 30.0
+    assert js.snapshot_at("2025-10-01T00:00Z") is None
+
+
+def test_stale_index_is_rebuilt(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    _append_hours(50)
+
+    # history written without index maintenance (older version / manual edit)
+    with open(js.SNAPSHOTS_PATH, "a", encoding="utf-8") as f:
+        start = datetime(2025, 10, 10, tzinfo=timezone.utc)
+        for i in range(100):
+            ts = (start + timedelta(hours=i)).isoformat()
+            f.write(json.dumps({"ts": ts, "total_value": 1000.0 + i}) + "\n")
+    assert js._load_index(js.SNAPSHOTS_PATH) is None
+
+    rows = js.read_snapshots_range("2025-10-12", "2025-10-12")
+    assert len(rows) == 24 and rows[0]["total_value"] == 1048.0
+    assert js._load_index(js.SNAPSHOTS_PATH) is not None
+
+    # truncation invalidates it again
+    with open(js.SNAPSHOTS_PATH, "r+b") as f:
+        f.truncate(100)
+    assert js._load_index(js.SNAPSHOTS_PATH) is None
@@ -0,0 +1,131 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import storage.json_store as js
+from core.portfolio import valuate
+
+PORT = {
+    "positions": [
+        {"id": "bitcoin", "symbol": "btc", "qty": 0.5, "cost_basis": 30000.0},
+        {"id": "ethereum", "symbol": "eth", "qty": 3.0, "cost_basis": 2000.0},
+    ]
+}
+
+
+def _redirect(tmp_path, monkeypatch, **cfg):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "PORTFOLIO_PATH", str(tmp_path / "portfolio.json"))
+    monkeypatch.setattr(js, "read_config", lambda: dict(cfg))
+    js.write_json(js.PORTFOLIO_PATH, PORT)
+
+
+def _snap(ts, btc, eth, port=PORT):
+    prices = {"bitcoin": {"usd": btc}, "ethereum": {"usd": eth}}
+    report = valuate(port, prices, "usd")
+    return {
+        "ts": ts.isoformat(),
+        "prices": {"bitcoin": btc, "ethereum": eth},
+        "total_value": report["total_value"],
+        "positions": report["positions"],
+        "vs_currency": "usd",
+    }
+
+
+def _ticks(n=60, start=datetime(2025, 8, 1, tzinfo=timezone.utc)):
+    # the price only moves every third tick, like a cached CoinGecko response
+    return [
+        _snap(start + timedelta(hours=4 * i), 60000.0 + (i // 3) * 10.5, 3000.0 + i // 3)
+        for i in range(n)
+    ]
+
+
+def _lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(ln) for ln in f if ln.strip()]
+
+
+def test_v2_roundtrip_and_size(tmp_path, monkeypatch):
+    rows = _ticks()
+    v1 = tmp_path / "v1"
+    v1.mkdir()
+    _redirect(v1, monkeypatch, snapshot_format=1)
+    for r in rows:
+        js.append_snapshot_line(r)
+
+    _redirect(tmp_path, monkeypatch)
+    for r in rows:
+        js.append_snapshot_line(r)
+
+    stored = _lines(js.SNAPSHOTS_PATH)
+    assert all(rec["v"] == 2 and "positions" not in rec for rec in stored)
+    assert sum(1 for rec in stored if rec.get("rep")) == 40
+    assert js.SNAPSHOTS_PATH.stat().st_size * 2 < (v1 / "snaps.jsonl").stat().st_size
+    assert len(_lines(tmp_path / "snapshot_portfolios.jsonl")) == 1
+
+    assert js.read_last_snapshots(len(rows)) == rows
+    assert js.read_last_snapshots(2) == rows[-2:]
+    assert js.read_snapshots_range("2025-09-02", "2025-09-03") == [
+        r for r in rows if r["ts"][:10] in ("2025-09-02", "2025-09-03")
+    ]
+    assert js.snapshot_at(rows[20]["ts"]) == rows[20]
+    assert js.snapshot_at(rows[22]["ts"]) == rows[22]
+    assert list(js.iter_snapshot_fields(("ts", "positions"))) == [
+        {"ts": r["ts"], "positions": r["positions"]} for r in rows
+    ]
+    daily = js.read_daily_all()
+    assert sum(d["count"] for d in daily) == len(rows)
+    js.rebuild_daily_rollups()
+    assert js.read_daily_all() == daily
+
+
+def test_portfolio_change_and_inline_fallback(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    t0 = datetime(2025, 9, 1, tzinfo=timezone.utc)
+    a = _snap(t0, 60000.0, 3000.0)
+    js.append_snapshot_line(a)
+    port2 = {"positions": PORT["positions"][:1]}
+    js.write_json(js.PORTFOLIO_PATH, port2)
+    b = _snap(t0 + timedelta(hours=1), 60000.0, 3000.0, port=port2)
+    js.append_snapshot_line(b)
+    c = _snap(t0 + timedelta(hours=2), 60000.0, 3000.0)  # stale portfolio: not derivable
+    js.append_snapshot_line(c)
+
+    stored = _lines(js.SNAPSHOTS_PATH)
+    assert "pf" in stored[0] and "pf" in stored[1] and stored[0]["pf"] != stored[1]["pf"]
+    assert "positions" in stored[2] and "pf" not in stored[2]
+    assert js.read_last_snapshots(3) == [a, b, c]
+
+
+def test_segments_and_columns_with_repeats(tmp_path, monkeypatch):
+    rows = _ticks(start=datetime(2025, 8, 30, 4, tzinfo=timezone.utc))
+    _redirect(tmp_path, monkeypatch, segment_period="month")
+    for r in rows:
+        js.append_snapshot_line(r)
+    manifest = js.read_segment_manifest()
+    assert [s["period"] for s in manifest["segments"]] == ["2025-08"]
+    assert not _lines(js.SNAPSHOTS_PATH)[0].get("rep")  # files never start with a repeat
+    assert js.read_last_snapshots(len(rows)) == rows
+
+    js.rebuild_columns()
+    points = js.read_last_snapshot_points(len(rows))
+    assert [p["prices"] for p in points] == [r["prices"] for r in rows]
+
+
+def test_migrate_expands_repeat_at_period_start(tmp_path, monkeypatch):
+    rows = _ticks(start=datetime(2025, 8, 30, 4, tzinfo=timezone.utc))
+    _redirect(tmp_path, monkeypatch)
+    # legacy single-file install (no manifest) that already holds v2 lines
+    with open(js.SNAPSHOTS_PATH, "w", encoding="utf-8") as f:
+        f.write(json.dumps(rows[0]) + "\n")
+    for r in rows[1:]:
+        js.append_snapshot_line(r)
+    assert js.read_segment_manifest() is None
+    stored = _lines(js.SNAPSHOTS_PATH)
+    first_sept = next(i for i, r in enumerate(rows) if r["ts"].startswith("2025-09"))
+    assert stored[first_sept].get("rep")
+
+    js.migrate_to_segments("month")
+    assert not _lines(js.SNAPSHOTS_PATH)[0].get("rep")
+    assert js.read_last_snapshots(len(rows)) == rows
@@ -0,0 +1,162 @@
+import json
+import os
+import signal
+from datetime import datetime, timedelta, timezone
+
+import scheduler.runner as runner
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch, **cfg):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_BAD_PATH", tmp_path / "snaps_bad.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: dict(cfg))
+
+
+def _rows(n, start=datetime(2025, 9, 29, tzinfo=timezone.utc), step_h=6):
+    return [
+        {
+            "ts": (start + timedelta(hours=step_h * i)).isoformat(),
+            "vs_currency": "usd",
+            "total_value": 1000.0 + i,
+            "prices": {"bitcoin": 60000.0 + i},
+        }
+        for i in range(n)
+    ]
+
+
+def _lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(ln) for ln in f if ln.strip()]
+
+
+def _count_fsyncs(monkeypatch):
+    calls = {"n": 0}
+    real = os.fsync
+
+    def counting(fd):
+        calls["n"] += 1
+        return real(fd)
+
+    monkeypatch.setattr(js.os, "fsync", counting)
+    return calls
+
+
+def test_writer_flushes_by_count_and_matches_one_by_one(tmp_path, monkeypatch):
+    rows = _rows(10)
+    ref = tmp_path / "ref"
+    ref.mkdir()
+    _redirect(ref, monkeypatch)
+    for r in rows:
+        js.append_snapshot_line(r)
+
+    _redirect(tmp_path, monkeypatch)
+    handles = []
+    real_handle = js._HotFileAppender.handle
+
+    def counting(self):
+        f = real_handle(self)
+        if not any(h is f for h in handles):
+            handles.append(f)
+        return f
+
+    monkeypatch.setattr(js._HotFileAppender, "handle", counting)
+    writer = js.SnapshotWriter(batch_size=4, flush_sec=3600, durability="none")
+    for r in rows[:4]:
+        writer.append(r)
+    assert len(_lines(js.SNAPSHOTS_PATH)) == 4
+    for r in rows[4:]:
+        writer.append(r)
+    assert len(writer.pending) == 2
+    assert len(_lines(js.SNAPSHOTS_PATH)) == 8
+    writer.close()
+
+    assert js.read_last_snapshots(10) == rows
+    with open(js.SNAPSHOTS_DAY_PATH, "rb") as a, open(ref / "snaps_day.jsonl", "rb") as b:
+        assert a.read() == b.read()
+    # one handle per hot file: the 2025-10 row sealed September mid-stream
+    assert [s["period"] for s in js.read_segment_manifest()["segments"]] == ["2025-09"]
+    assert len(handles) == 2
+
+
+def test_writer_flushes_by_age(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    now = {"t": 100.0}
+    monkeypatch.setattr(js.time, "monotonic", lambda: now["t"])
+    writer = js.SnapshotWriter(batch_size=100, flush_sec=5, durability="none")
+    a, b = _rows(2)
+    writer.append(a)
+    writer.flush_if_due()
+    assert not os.path.exists(js.SNAPSHOTS_PATH)
+    now["t"] += 6
+    writer.flush_if_due()
+    assert js.read_last_snapshots(5) == [a]
+    writer.append(b)
+    assert len(writer.pending) == 1
+    writer.close()
+    assert js.read_last_snapshots(5) == [a, b]
+
+
+def test_durability_policies(tmp_path, monkeypatch):
+    for policy, expected in (("none", 0), ("batch", 1), ("line", 3)):
+        sub = tmp_path / policy
+        sub.mkdir()
+        _redirect(sub, monkeypatch)
+        calls = _count_fsyncs(monkeypatch)
+        with js.SnapshotWriter(batch_size=3, durability=policy) as writer:
+            for r in _rows(3, step_h=1):
+                writer.append(r)
+        assert calls["n"] == expected, policy
+
+    # one-shot appends follow the configured policy too
+    _redirect(tmp_path, monkeypatch, snapshot_durability="line")
+    calls = _count_fsyncs(monkeypatch)
+    js.append_snapshot_line(_rows(1)[0])
+    assert calls["n"] == 1
+
+
+def test_guard_with_writer_keeps_pending_in_window(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    writer = js.SnapshotWriter(batch_size=100, flush_sec=3600, durability="none")
+    guard = js.OutlierGuard(window=4, threshold=0.80, writer=writer)
+    for r in _rows(3):
+        assert guard.append(r) is True
+    js.append_snapshot_line(_rows(1)[0])  # another process writes: forces a re-seed
+    bad = dict(_rows(1)[0], total_value=100.0)
+    assert guard.append(bad) is False
+    assert len(guard._ring) == 4
+    writer.close()
+    assert len(_lines(js.SNAPSHOTS_PATH)) == 4
+
+
+def test_guard_does_not_reseed_after_its_own_flushes(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    seeds = []
+    real = js._read_last_totals
+    monkeypatch.setattr(js, "_read_last_totals", lambda n: seeds.append(n) or real(n))
+    writer = js.SnapshotWriter(batch_size=100, flush_sec=3600, durability="none")
+    guard = js.OutlierGuard(window=4, threshold=0.80, writer=writer)
+    rows = _rows(7)
+    for r in rows[:6]:
+        assert guard.append(r) is True
+        writer.flush()  # as the daemon's tick does between cycles
+    assert len(_lines(js.SNAPSHOTS_PATH)) == 6
+    assert len(seeds) == 1
+
+    js.append_snapshot_line(rows[6])  # another process still forces a re-seed
+    guard.append(dict(rows[6], ts=_rows(8)[7]["ts"]))
+    assert len(seeds) == 2
+    writer.close()
+
+
+def test_sigterm_flushes_registered_writer(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch)
+    writer = js.SnapshotWriter(batch_size=100, flush_sec=3600, durability="none")
+    writer.append(_rows(1)[0])
+    monkeypatch.setattr(runner._StopFlag, "stop", False)
+    monkeypatch.setattr(runner._StopFlag, "flush_fn", writer.flush)
+    runner._handle_sig(signal.SIGTERM, None)
+    assert runner._StopFlag.stop is True
+    assert len(_lines(js.SNAPSHOTS_PATH)) == 1
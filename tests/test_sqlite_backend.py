@@ -0,0 +1,120 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import storage.json_store as js
+
+
+def _redirect(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", tmp_path / "snaps.jsonl")
+    monkeypatch.setattr(js, "SNAPSHOTS_DAY_PATH", tmp_path / "snaps_day.jsonl")
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "read_config", lambda: {"storage_backend": backend})
+    monkeypatch.setattr(js, "_backend_cache", {})
+
+
+def _rows(n=40, start=datetime(2025, 10, 1, tzinfo=timezone.utc)):
+    out = []
+    for i in range(n):
+        ts = start + timedelta(hours=6 * i)
+        out.append(
+            {
+                "ts": ts.isoformat(),
+                "total_value": 100.0 + (i % 7),
+                "vs_currency": "usd",
+                "prices": {"bitcoin": 60000.0 + i},
+            }
+        )
+    return out
+
+
+def _strip(rows):
+    return [{k: r[k] for k in ("date", "open", "close", "high", "low", "count")} for r in rows]
+
+
+def test_sqlite_matches_jsonl_reads(tmp_path, monkeypatch):
+    rows = _rows()
+    results = {}
+    for backend in ("jsonl", "sqlite"):
+        base = tmp_path / backend
+        base.mkdir()
+        _redirect(base, monkeypatch, backend)
+        for r in rows:
+            js.append_snapshot_line(r)
+        results[backend] = {
+            "tail": js.read_last_snapshots(5),
+            "range": js.read_snapshots_range("2025-10-03", "2025-10-04"),
+            "at": js.snapshot_at("2025-10-05T13:00:00+00:00"),
+            "daily": _strip(js.read_daily_all()),
+            "last_daily": _strip(js.read_last_daily(3)),
+            "totals": js._read_last_totals(4),
+        }
+        assert js.get_backend().name == backend
+
+    assert (tmp_path / "sqlite" / "snapshots.db").exists()
+    assert not (tmp_path / "sqlite" / "snaps.jsonl").exists()
+    assert results["sqlite"] == results["jsonl"]
+    assert len(results["sqlite"]["range"]) == 8
+    assert results["sqlite"]["at"]["ts"] == "2025-10-05T12:00:00+00:00"
+
+
+def test_sqlite_rebuild_and_avg(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, "sqlite")
+    for r in _rows(8):
+        js.append_snapshot_line(r)
+    incremental = js.read_daily_all()
+    assert js.rebuild_daily_rollups() == {"days": 2, "snapshots": 8}
+    rebuilt = js.read_daily_all()
+    assert rebuilt == incremental
+    assert rebuilt[0]["open"] == 100.0 and rebuilt[0]["close"] == 103.0
+    assert abs(rebuilt[0]["avg"] - 101.5) < 1e-9
+
+
+def test_import_jsonl_is_idempotent(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, "jsonl")
+    rows = _rows()
+    for r in rows[:30]:
+        js.append_snapshot_line(r)
+
+    assert js.import_jsonl_into_sqlite()["imported"] == 30
+    for r in rows[30:]:
+        js.append_snapshot_line(r)
+    res = js.import_jsonl_into_sqlite()
+    assert res["imported"] == 10 and res["skipped"] == 30
+
+    monkeypatch.setattr(js, "read_config", lambda: {"storage_backend": "sqlite"})
+    assert js.read_last_snapshots(len(rows)) == rows
+    assert js.read_daily_all()[-1]["count"] == 4
+
+
+def test_guard_reseeds_from_sqlite(tmp_path, monkeypatch):
+    _redirect(tmp_path, monkeypatch, "sqlite")
+    guard = js.OutlierGuard(window=5, threshold=0.5)
+    for r in _rows(6):
+        assert guard.append(r)
+    # another process appends behind the guard's back
+    js.append_snapshot_line({"ts": "2025-10-03T00:00:00+00:00", "total_value": 500.0})
+    guard._sync()
+    assert 500.0 in guard._ring
+
+
+def test_write_config_keeps_extra_keys(tmp_path, monkeypatch):
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    monkeypatch.setattr(js, "CONFIG_PATH", str(tmp_path / "config.json"))
+    js.write_config({**js.DEFAULT_CONFIG, "storage_backend": "sqlite", "outlier_window": 20})
+    with open(tmp_path / "config.json", encoding="utf-8") as f:
+        cfg = json.load(f)
+    assert cfg["storage_backend"] == "sqlite" and cfg["outlier_window"] == 20
+
+
+def test_backends_must_implement_the_interface():
+    from storage.backend import SnapshotBackend
+
+    class Partial(SnapshotBackend):
+        def append_snapshots(self, objs):
+            pass
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert not SnapshotBackend.__abstractmethods__ - set(vars(js.JsonlBackend))
@@ -0,0 +1,50 @@
+import json
+
+import storage.json_store as js
+
+
+def _write_rows(path, n, torn=False):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"ts": f"t{i}", "total_value": float(i)}) + "\n")
+        if torn:
+            f.write('{"ts": "t-torn", "total_va')
+
+
+def test_tail_reads_last_n_across_blocks(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    _write_rows(path, 500)
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", path)
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    # tiny blocks force lines to straddle block boundaries
+    monkeypatch.setattr(js, "TAIL_BLOCK_SIZE", 7)
+
+    rows = js.read_last_snapshots(10)
+    assert [r["ts"] for r in rows] == [f"t{i}" for i in range(490, 500)]
+    assert js._read_last_totals(3) == [497.0, 498.0, 499.0]
+
+
+def test_tail_skips_torn_final_line(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    _write_rows(path, 5, torn=True)
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", path)
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+
+    rows = js.read_last_snapshots(2)
+    assert [r["ts"] for r in rows] == ["t3", "t4"]
+
+
+def test_tail_offsets_point_at_line_starts(tmp_path):
+    path = tmp_path / "snaps.jsonl"
+    _write_rows(path, 20)
+    data = path.read_bytes()
+    for off, raw in js._iter_lines_reversed(path, block_size=16):
+        assert data[off : off + len(raw)] == raw
+
+
+def test_tail_more_than_available(tmp_path, monkeypatch):
+    path = tmp_path / "snaps.jsonl"
+    _write_rows(path, 3)
+    monkeypatch.setattr(js, "SNAPSHOTS_PATH", path)
+    monkeypatch.setattr(js, "HOME_DIR", str(tmp_path))
+    assert len(js.read_last_snapshots(10)) == 3
@@ -1,6 +1,19 @@
 # utils/lock.py
+from __future__ import annotations
+
 import atexit
 import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:  # POSIX
+    msvcrt = None
 
 LOCK_DIR = os.path.expanduser("~/.crypto_tracker")
 LOCK_PATH = os.path.join(LOCK_DIR, "daemon.lock")
@@ -31,3 +44,47 @@ class SingleInstanceLock:
             except FileNotFoundError:
                 pass
             self._acquired = False
+
+
+def _try_lock(f) -> bool:
+    """One non-blocking attempt at an exclusive lock on the open file `f`."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        elif msvcrt is not None:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)  # first byte, may be past EOF
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(f) -> None:
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path: str, timeout: float | None = None):
+    """
+    Hold an exclusive lock on `path` (created if needed) across processes:
+    flock on POSIX, msvcrt.locking on Windows. Waits at most `timeout`
+    seconds (None: as long as it takes), then raises TimeoutError.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a+", encoding="utf-8") as f:
+        if fcntl is not None and timeout is None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not _try_lock(f):
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"timed out waiting for lock {path}")
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            _unlock(f)